@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Customer
+from .models import Customer, CustomerStats
 
 # Register your models here.
-admin.site.register(Customer)
\ No newline at end of file
+admin.site.register(Customer)
+admin.site.register(CustomerStats)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CustomersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customers'
+
+    def ready(self):
+        from orders.signals import orders_created
+        from customers.stats import update_customer_stats
+
+        orders_created.connect(update_customer_stats, dispatch_uid='customers-update-stats')
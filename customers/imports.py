@@ -0,0 +1,160 @@
+import csv
+import json
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from customers.lookup import normalize_phone
+from customers.models import Customer
+
+FIELDS = ['first_name', 'last_name', 'email', 'phone', 'address']
+UPDATE_FIELDS = ['first_name', 'last_name', 'phone', 'address', 'deleted_at']
+PHONE = re.compile(r'\d{10}')
+
+
+class InvalidRow:
+    """Stands in for a line that couldn't be parsed at all."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def parse_ndjson(lines):
+    """One JSON object per line of text; blank lines are skipped."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield InvalidRow(f"Invalid JSON: {exc}")
+            continue
+        yield row if isinstance(row, dict) else InvalidRow("Expected a JSON object.")
+
+
+def parse_csv(lines):
+    """Lines of CSV text with a header row naming the columns."""
+    yield from csv.DictReader(lines)
+
+
+def validate_rows(rows):
+    """
+    Check a chunk of rows column by column: each rule is one pass over one
+    column with a precompiled pattern, instead of a ``full_clean()`` (and a
+    uniqueness query) per row. Returns ``{index: Customer}`` for valid rows
+    and ``{index: errors}`` for the others. Later rows repeating an email are
+    rejected, since one statement can't upsert the same key twice. Values
+    must be strings (phone numbers may also be integers).
+    """
+    errors = {}
+
+    def fail(index, field, message):
+        errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    parsed = {}
+    for index, row in enumerate(rows):
+        if isinstance(row, InvalidRow):
+            fail(index, 'non_field_errors', row.message)
+        elif not isinstance(row, dict):
+            fail(index, 'non_field_errors', "Expected a JSON object.")
+        else:
+            parsed[index] = row
+
+    # Values of the wrong type are left out of the columns, so no other rule
+    # reports on them.
+    columns = {field: {} for field in FIELDS}
+    for index, row in parsed.items():
+        for field in FIELDS:
+            value = row.get(field)
+            if value is None:
+                value = ''
+            elif field == 'phone' and isinstance(value, int) and not isinstance(value, bool):
+                value = str(value)
+            elif not isinstance(value, str):
+                fail(index, field, "Must be a string.")
+                continue
+            columns[field][index] = value.strip()
+    columns['phone'] = {index: normalize_phone(value) for index, value in columns['phone'].items()}
+    columns['email'] = {index: value.lower() for index, value in columns['email'].items()}
+
+    for field in FIELDS:
+        for index, value in columns[field].items():
+            if not value:
+                fail(index, field, "This field is required.")
+    for field in ('first_name', 'last_name'):
+        for index, value in columns[field].items():
+            if value and not 2 <= len(value) <= 100:
+                fail(index, field, "Must be 2 to 100 characters long.")
+    for index, value in columns['phone'].items():
+        if value and not PHONE.fullmatch(value):
+            fail(index, 'phone', "Phone number must be exactly 10 digits.")
+    seen = set()
+    for index, value in columns['email'].items():
+        if not value:
+            continue
+        try:
+            validate_email(value)
+        except ValidationError:
+            fail(index, 'email', "Enter a valid email address.")
+            continue
+        if value in seen:
+            fail(index, 'email', "Appears more than once in this import.")
+        seen.add(value)
+
+    customers = {
+        index: Customer(**{field: columns[field][index] for field in FIELDS})
+        for index in parsed if index not in errors
+    }
+    return customers, errors
+
+
+def upsert_customers(rows, batch_size=1000):
+    """
+    Insert or update customers matched on email, ``batch_size`` rows per
+    transaction, with one ``INSERT ... ON CONFLICT (email) DO UPDATE`` per
+    chunk. Deleted customers that reappear are restored. Invalid rows don't
+    stop the import; they are listed in the returned report with their
+    1-based row number.
+    """
+    report = {'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    chunk = []
+    offset = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == batch_size:
+            _upsert_chunk(chunk, offset, report)
+            offset += len(chunk)
+            chunk = []
+    if chunk:
+        _upsert_chunk(chunk, offset, report)
+    return report
+
+
+def _upsert_chunk(rows, offset, report):
+    customers, errors = validate_rows(rows)
+    for index, row_errors in sorted(errors.items()):
+        report['errors'].append({'row': offset + index + 1, 'errors': row_errors})
+    report['failed'] += len(errors)
+    if not customers:
+        return
+
+    # Match existing customers whatever the case of their stored email
+    # (one lookup on the LOWER(email) index), and keep that spelling so the
+    # conflict on the email column is detected.
+    existing = dict(
+        Customer.all_objects.annotate(email_lower=Lower('email'))
+        .filter(email_lower__in=[customer.email for customer in customers.values()])
+        .values_list('email_lower', 'email')
+    )
+    for customer in customers.values():
+        customer.email = existing.get(customer.email, customer.email)
+
+    with transaction.atomic():
+        Customer.all_objects.bulk_create(
+            customers.values(), update_conflicts=True, unique_fields=['email'], update_fields=UPDATE_FIELDS,
+        )
+    report['updated'] += len(existing)
+    report['created'] += len(customers) - len(existing)
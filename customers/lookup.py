@@ -0,0 +1,46 @@
+import re
+
+from django.db.models.functions import Lower
+
+
+def normalize_phone(value):
+    """Digits only, as phones are stored: ``0999 999-999`` -> ``0999999999``."""
+    return re.sub(r'\D', '', value)
+
+
+def normalize_email(value):
+    return value.strip().lower()
+
+
+def prefix_upper_bound(prefix):
+    """
+    Smallest string greater than every string starting with ``prefix``, so a
+    prefix match can be written as ``prefix <= value < bound``, a range the
+    index answers directly. (Django's ``startswith`` is a ``LIKE ... ESCAPE``,
+    which SQLite never serves from an index.)
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def lookup(queryset, phone=None, email=None):
+    """Exact match on normalized phone or case-insensitive email, both indexed."""
+    if phone is not None:
+        return queryset.filter(phone=normalize_phone(phone))
+    return queryset.alias(email_lower=Lower('email')).filter(email_lower=normalize_email(email))
+
+
+def typeahead(queryset, term, limit):
+    """
+    Customers whose phone (for digit input) or last name starts with
+    ``term``, at most ``limit``, read in index order: the cost depends on
+    ``limit``, not on the number of customers.
+    """
+    digits = normalize_phone(term)
+    if digits and not re.search(r'[^\d\s()+.-]', term):
+        return queryset.filter(phone__gte=digits, phone__lt=prefix_upper_bound(digits)).order_by('phone', 'id')[:limit]
+    prefix = term.strip().lower()
+    return (
+        queryset.alias(last_name_lower=Lower('last_name'))
+        .filter(last_name_lower__gte=prefix, last_name_lower__lt=prefix_upper_bound(prefix))
+        .order_by('last_name_lower', 'id')[:limit]
+    )
@@ -0,0 +1,81 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from customers.lookup import lookup, typeahead
+from customers.models import Customer
+from restaurant.db import scratch_database
+
+SYLLABLES = 'ba ka ma ra sa ta la na da fa ri ki mi lo to so zu ne ve shi al ha di mo'.split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare customer lookup and typeahead latency of the indexed paths against "
+        "plain iexact/istartswith lookups, on synthetic customers in a scratch SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000000, help='Customers to create.')
+        parser.add_argument('--queries', type=int, default=200, help='Lookups per method.')
+        parser.add_argument('--limit', type=int, default=10, help='Typeahead results.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with scratch_database():
+            emails, phones, last_names = self._seed(options['customers'], rng)
+            count = options['queries']
+            sample_emails = [email.upper() for email in rng.sample(emails, count)]
+            prefixes = [name[:rng.randint(2, 4)] for name in rng.sample(last_names, count)]
+            phone_prefixes = [phone[:rng.randint(4, 7)] for phone in rng.sample(phones, count)]
+            limit = options['limit']
+            customers = Customer.objects.all()
+
+            self._report('email, iexact', sample_emails, lambda email: customers.filter(email__iexact=email))
+            self._report('email, LOWER(email) index', sample_emails, lambda email: lookup(customers, email=email))
+            self._report(
+                'last name typeahead, istartswith', prefixes,
+                lambda prefix: customers.filter(last_name__istartswith=prefix).order_by('last_name', 'id')[:limit]
+            )
+            self._report(
+                'last name typeahead, LOWER(last_name) range', prefixes,
+                lambda prefix: typeahead(customers, prefix, limit)
+            )
+            self._report(
+                'phone typeahead, startswith', phone_prefixes,
+                lambda prefix: customers.filter(phone__startswith=prefix).order_by('phone', 'id')[:limit]
+            )
+            self._report('phone typeahead, range', phone_prefixes, lambda prefix: typeahead(customers, prefix, limit))
+
+    def _seed(self, count, rng):
+        emails, phones, last_names = [], [], []
+        batch = []
+        for index in range(count):
+            first = ''.join(rng.choices(SYLLABLES, k=2)).title()
+            last = ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).title()
+            email = f'{first}.{last}.{index}@example.com'
+            phone = f'09{rng.randrange(10 ** 8):08d}'
+            emails.append(email)
+            phones.append(phone)
+            last_names.append(last)
+            batch.append(Customer(first_name=first, last_name=last, email=email, phone=phone, address='Synthetic'))
+            if len(batch) == 10000:
+                Customer.objects.bulk_create(batch)
+                batch = []
+        Customer.objects.bulk_create(batch)
+        return emails, phones, last_names
+
+    def _report(self, label, terms, query):
+        latencies = []
+        # First pass warms the page cache; time the second.
+        for term in terms + terms:
+            started = time.perf_counter()
+            list(query(term))
+            latencies.append(time.perf_counter() - started)
+        latencies = sorted(latencies[len(terms):])
+        self.stdout.write(
+            f"{label}: p50 {statistics.median(latencies) * 1000:.2f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms"
+        )
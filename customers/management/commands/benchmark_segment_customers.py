@@ -0,0 +1,108 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Max, Sum
+
+from customers.models import Customer, CustomerStats
+from customers.rfm import OrderHistory, score, write_scores
+from orders.models import Order
+from restaurant.db import scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the RFM segmentation job (streaming, scoring, writing) on synthetic orders in a "
+        "scratch SQLite database, against per-customer ORM aggregates extrapolated from a sample."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000000, help='Orders to create.')
+        parser.add_argument('--customers', type=int, default=200000, help='Customers to create.')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Orders read per fetch.')
+        parser.add_argument('--sample', type=int, default=500, help='Customers timed through the ORM.')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self._seed(options['customers'], options['orders'])
+            self.stdout.write(f"{options['orders']} orders, {options['customers']} customers")
+
+            rss_before = self._reset_peak_rss()
+            started = time.perf_counter()
+            history = OrderHistory.load(options['chunk_size'])
+            loaded = time.perf_counter()
+            scores = score(history)
+            scored = time.perf_counter()
+            write_scores(*scores)
+            written = time.perf_counter()
+            rss_after = self._peak_rss()
+
+            self.stdout.write(
+                f"stream {loaded - started:.1f} s ({options['orders'] / (loaded - started):,.0f} orders/s), "
+                f"score {(scored - loaded) * 1000:.0f} ms, write {written - scored:.1f} s"
+            )
+            arrays = sum(array.nbytes for array in (
+                history.customer_ids, history.counts, history.spend, history.last_order
+            ))
+            growth = "n/a" if rss_before is None else f"{(rss_after - rss_before) / 1024:.0f} MB"
+            self.stdout.write(f"per-customer arrays {arrays / 2 ** 20:.1f} MB, peak RSS growth {growth}")
+
+            sample = list(Customer.objects.order_by('?').values_list('id', flat=True)[:options['sample']])
+            started = time.perf_counter()
+            for customer_id in sample:
+                Order.objects.filter(customer_id=customer_id).aggregate(
+                    count=Count('id'), spend=Sum('total_amount'), last=Max('order_date')
+                )
+            per_customer = (time.perf_counter() - started) / max(len(sample), 1)
+            self.stdout.write(
+                f"per-customer ORM aggregates: {per_customer * 1000:.2f} ms each, "
+                f"~{per_customer * options['customers']:.0f} s for all customers (before scoring)"
+            )
+
+    def _seed(self, customer_count, order_count):
+        batch = []
+        for index in range(customer_count):
+            batch.append(Customer(
+                first_name='Bench', last_name='Mark', email=f'bench{index}@example.com',
+                phone='0900000000', address='Benchmark'
+            ))
+            if len(batch) == 10000:
+                Customer.objects.bulk_create(batch)
+                batch = []
+        Customer.objects.bulk_create(batch)
+        CustomerStats.objects.bulk_create(
+            [CustomerStats(customer_id=customer_id) for customer_id in Customer.objects.values_list('id', flat=True)],
+            batch_size=10000,
+        )
+
+        # Generated in SQL: building 10M rows in Python would dominate the run.
+        # Dates spread over two years, in the format Django stores on SQLite.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s) "
+                "INSERT INTO orders_order (customer_id, order_date, total_amount, status, notes) "
+                "SELECT abs(random()) %% %s + 1, "
+                "strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now', '-' || (abs(random()) %% 63072000) || ' seconds'), "
+                "round(5 + (abs(random()) %% 9500) / 100.0, 2), 'Delivered', NULL FROM seq",
+                [order_count, customer_count]
+            )
+
+    def _reset_peak_rss(self):
+        # Seeding already pushed the peak up; Linux lets us reset it to the
+        # current RSS so the job's own growth shows. Returns KB, or None.
+        try:
+            with open('/proc/self/clear_refs', 'w') as clear_refs:
+                clear_refs.write('5')
+        except OSError:
+            return None
+        return self._peak_rss()
+
+    def _peak_rss(self):
+        try:
+            with open('/proc/self/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return None
@@ -0,0 +1,43 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.imports import parse_csv, parse_ndjson, upsert_customers
+
+PARSERS = {'ndjson': parse_ndjson, 'csv': parse_csv}
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert or update customers from an NDJSON or CSV file, matched on email. "
+        "Invalid rows are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import; '.csv' files are read as CSV, others as NDJSON.")
+        parser.add_argument('--format', choices=sorted(PARSERS), help="Override the format guessed from the name.")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Rows written per transaction (default: 1000)."
+        )
+        parser.add_argument('--errors', help="Write rejected rows here as NDJSON instead of to stderr.")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"No such file: {path}")
+        file_format = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'ndjson')
+
+        with path.open(encoding='utf-8-sig', newline='') as lines:
+            report = upsert_customers(PARSERS[file_format](lines), batch_size=options['batch_size'])
+
+        errors = (json.dumps(error) for error in report['errors'])
+        if options['errors']:
+            Path(options['errors']).write_text(''.join(f"{line}\n" for line in errors))
+        else:
+            for line in errors:
+                self.stderr.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} created, {report['updated']} updated, {report['failed']} rejected"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from customers.stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild every customer's lifetime stats (orders, spend, last order, favorite product) from the order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help="Number of orders aggregated per transaction (default: 5000)."
+        )
+
+    def handle(self, *args, **options):
+        processed = rebuild_customer_stats(chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt customer stats from {processed} orders"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from customers.models import SEGMENT_CHOICES
+from customers.rfm import segment_customers
+
+
+class Command(BaseCommand):
+    help = (
+        "Score every customer with orders by recency, frequency and monetary quintile "
+        "and store their RFM segment on their stats."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=50000,
+            help="Orders read per fetch; bounds memory together with the number of customers (default: 50000)."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=900,
+            help="Customers updated per statement (default: 900)."
+        )
+
+    def handle(self, *args, **options):
+        counts = segment_customers(chunk_size=options['chunk_size'], batch_size=options['batch_size'])
+        for segment, label in SEGMENT_CHOICES:
+            self.stdout.write(f"{label}: {counts.get(segment, 0)}")
+        self.stdout.write(self.style.SUCCESS(f"Segmented {sum(counts.values())} customers"))
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:47
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['phone', 'id'], name='customer_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('email'), condition=models.Q(('deleted_at__isnull', True)), name='customer_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), models.F('id'), condition=models.Q(('deleted_at__isnull', True)), name='customer_last_name_idx'),
+        ),
+    ]
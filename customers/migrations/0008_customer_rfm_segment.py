@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0007_customer_stats'),
+        ('products', '0007_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerstats',
+            name='frequency_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerstats',
+            name='monetary_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerstats',
+            name='recency_score',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerstats',
+            name='segment',
+            field=models.CharField(blank=True, choices=[('champions', 'Champions'), ('loyal', 'Loyal'), ('new', 'New'), ('promising', 'Promising'), ('cant_lose', "Can't lose"), ('at_risk', 'At risk'), ('hibernating', 'Hibernating'), ('lost', 'Lost')], db_default='', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['segment'], name='customer_stats_segment_idx'),
+        ),
+    ]
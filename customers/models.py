@@ -1,6 +1,9 @@
 from django.db import models
 from django.core.validators import RegexValidator, EmailValidator
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Lower
+from products.models import Product
+from restaurant.softdelete import SoftDeleteModel, dead_index, live_index
 
 
 phone_validator = RegexValidator(
@@ -11,9 +14,11 @@ phone_validator = RegexValidator(
 email_validator = EmailValidator( message="Enter a valid email address.")
 
 
-class Customer(models.Model):
+class Customer(SoftDeleteModel):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
+    # Unique among deleted customers too: the email keeps identifying the
+    # person (e.g. for imports) until the row is purged.
     email = models.EmailField(
         unique=True,
         validators=[email_validator]
@@ -27,10 +32,34 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            live_index(fields=['id'], name='customer_live_idx'),
+            # Lookups and typeahead (customers/lookup.py), over live customers only.
+            live_index(fields=['phone', 'id'], name='customer_phone_idx'),
+            # All rows: imports match deleted customers by email too.
+            models.Index(Lower('email'), name='customer_email_lower_idx'),
+            live_index(Lower('last_name'), 'id', name='customer_last_name_idx'),
+            dead_index('customer_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    def validate_unique(self, exclude=None):
+        # The default manager hides deleted customers, whose emails the unique
+        # index still holds: check the email against every row, in one query.
+        exclude = set(exclude or ())
+        super().validate_unique(exclude=exclude | {'email'})
+        if 'email' in exclude or not self.email:
+            return
+        taken = Customer.all_objects.filter(email=self.email).exclude(pk=self.pk)
+        match = taken.values_list('deleted_at').first()
+        if match is None:
+            return
+        if match[0] is not None:
+            raise ValidationError({'email': "A deleted customer has this email address."})
+        raise ValidationError({'email': self.unique_error_message(Customer, ['email'])})
+
     def clean(self):
         if len(self.first_name) < 2:
             raise ValidationError("First name must be at least 2 characters long.")
@@ -38,8 +67,69 @@ class Customer(models.Model):
         if len(self.last_name) < 2:
             raise ValidationError("Last name must be at least 2 characters long.")
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
+    def save(self, *args, validate=True, **kwargs):
+        # validate=False for callers that already ran full_clean() or write trusted data.
+        if validate:
+            self.full_clean()
         super().save(*args, **kwargs)
 
 
+SEGMENT_CHOICES = [
+    ('champions', 'Champions'),
+    ('loyal', 'Loyal'),
+    ('new', 'New'),
+    ('promising', 'Promising'),
+    ('cant_lose', "Can't lose"),
+    ('at_risk', 'At risk'),
+    ('hibernating', 'Hibernating'),
+    ('lost', 'Lost'),
+]
+
+
+class CustomerStats(models.Model):
+    """
+    Lifetime totals of one customer, added to as orders are created
+    (customers/stats.py) so reading them never aggregates the order history.
+    """
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+    favorite_product = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    # Recency/frequency/monetary quintiles (5 is best) and the segment they
+    # map to, written by the segment_customers command (customers/rfm.py).
+    recency_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    frequency_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    monetary_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    segment = models.CharField(max_length=20, choices=SEGMENT_CHOICES, blank=True, db_default='')
+
+    class Meta:
+        verbose_name_plural = 'customer stats'
+        indexes = [
+            models.Index(fields=['segment'], name='customer_stats_segment_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id}: {self.order_count} orders, {self.lifetime_spend}"
+
+
+class CustomerProductStats(models.Model):
+    """Units of a product a customer has ordered; the largest is their favorite."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='product_stats')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    units = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'customer product stats'
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'product'], name='unique_customer_product_stats'),
+        ]
+        indexes = [
+            # Favorite product: first row per customer.
+            models.Index(fields=['customer', '-units', 'product'], name='customer_favorite_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id} x {self.product_id}: {self.units}"
@@ -0,0 +1,29 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from customers.imports import parse_csv, parse_ndjson
+
+
+def _lines(stream, parser_context):
+    encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+    try:
+        return stream.read().decode(encoding).lstrip('\ufeff').splitlines()
+    except UnicodeDecodeError as exc:
+        raise ParseError(f"Could not decode the upload as {encoding}: {exc}")
+
+
+class NDJSONParser(BaseParser):
+    """Newline-delimited JSON objects, parsed into a lazy sequence of rows."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return parse_ndjson(_lines(stream, parser_context))
+
+
+class CSVParser(BaseParser):
+    """CSV with a header row, parsed into a lazy sequence of rows."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return parse_csv(_lines(stream, parser_context))
@@ -0,0 +1,133 @@
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from customers.models import Customer, CustomerStats
+from orders.models import ArchivedOrder, Order
+
+QUINTILES = [0.2, 0.4, 0.6, 0.8]
+
+
+class OrderHistory:
+    """
+    Per-customer order count, spend and last order time (epoch seconds) as
+    parallel arrays indexed like ``customer_ids`` (sorted). Memory grows with
+    the number of customers only: orders are folded in a chunk at a time.
+    """
+
+    def __init__(self, customer_ids):
+        self.customer_ids = customer_ids
+        self.counts = np.zeros(len(customer_ids), dtype=np.int64)
+        self.spend = np.zeros(len(customer_ids), dtype=np.float64)
+        self.last_order = np.full(len(customer_ids), -np.inf)
+
+    @classmethod
+    def load(cls, chunk_size=50000):
+        """Stream live and archived orders into a new history."""
+        ids = Customer.all_objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size)
+        history = cls(np.fromiter(ids, dtype=np.int64))
+        for model in (ArchivedOrder, Order):
+            rows = model.objects.values_list('customer_id', 'order_date', 'total_amount').iterator(
+                chunk_size=chunk_size
+            )
+            while chunk := list(islice(rows, chunk_size)):
+                history.add(chunk)
+        return history
+
+    def add(self, rows):
+        """
+        Fold ``(customer_id, order_date, total_amount)`` rows in. Orders of
+        customers missing from ``customer_ids`` (created after it was taken)
+        are skipped; they are scored on the next run.
+        """
+        if not len(self.customer_ids):
+            return
+        count = len(rows)
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        positions = np.minimum(np.searchsorted(self.customer_ids, ids), len(self.customer_ids) - 1)
+        known = self.customer_ids[positions] == ids
+        positions = positions[known]
+        np.add.at(self.counts, positions, 1)
+        spend = np.fromiter((row[2] for row in rows), dtype=np.float64, count=count)
+        np.add.at(self.spend, positions, spend[known])
+        last_order = np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=count)
+        np.maximum.at(self.last_order, positions, last_order[known])
+
+
+def quintile_scores(values):
+    """Score 1-5 by quintile of ``values``; values on a boundary get the lower score."""
+    return np.searchsorted(np.quantile(values, QUINTILES), values, side='left') + 1
+
+
+def segments(recency, frequency, monetary):
+    """Segment name for each customer from their R, F and M scores; first matching rule wins."""
+    return np.select(
+        [
+            (recency >= 4) & (frequency >= 4),
+            (recency >= 4) & (frequency == 1),
+            (recency >= 3) & (frequency >= 3),
+            recency >= 3,
+            (recency <= 2) & (frequency >= 4) & (monetary >= 4),
+            (recency <= 2) & (frequency >= 3),
+            recency == 2,
+        ],
+        ['champions', 'new', 'loyal', 'promising', 'cant_lose', 'at_risk', 'hibernating'],
+        default='lost',
+    )
+
+
+def score(history, now=None):
+    """
+    Return ``(customer_ids, recency, frequency, monetary, segment)`` arrays for
+    the customers with at least one order.
+    """
+    now = (now or timezone.now()).timestamp()
+    ordered = history.counts > 0
+    if not ordered.any():
+        nothing = np.zeros(0, dtype=np.int64)
+        return nothing, nothing, nothing, nothing, np.zeros(0, dtype=str)
+    recency = 6 - quintile_scores(now - history.last_order[ordered])
+    frequency = quintile_scores(history.counts[ordered])
+    monetary = quintile_scores(history.spend[ordered])
+    return history.customer_ids[ordered], recency, frequency, monetary, segments(recency, frequency, monetary)
+
+
+def write_scores(customer_ids, recency, frequency, monetary, segment, batch_size=900):
+    """
+    Store the scores on ``CustomerStats``. Customers are grouped by score
+    combination (at most 125), so each UPDATE sets constants on up to
+    ``batch_size`` ids (keep it under SQLite's 999 parameters). Returns
+    ``{segment: rows updated}``; customers without a stats row aren't counted.
+    """
+    codes = recency * 100 + frequency * 10 + monetary
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    updated = {}
+    with transaction.atomic():
+        for group in np.split(order, bounds):
+            if not len(group):
+                continue
+            first = group[0]
+            values = {
+                'recency_score': int(recency[first]), 'frequency_score': int(frequency[first]),
+                'monetary_score': int(monetary[first]), 'segment': str(segment[first]),
+            }
+            ids = customer_ids[group].tolist()
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                rows = CustomerStats.objects.filter(customer_id__in=batch).update(**values)
+                updated[values['segment']] = updated.get(values['segment'], 0) + rows
+    return updated
+
+
+def segment_customers(chunk_size=50000, batch_size=900, now=None):
+    """
+    Score every customer with orders by recency, frequency and monetary
+    quintile and store their segment. Returns ``{segment: customers updated}``.
+    Customers without a stats row are skipped and not counted (see
+    rebuild_customer_stats).
+    """
+    customer_ids, recency, frequency, monetary, segment = score(OrderHistory.load(chunk_size), now=now)
+    return write_scores(customer_ids, recency, frequency, monetary, segment, batch_size=batch_size)
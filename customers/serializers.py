@@ -1,21 +1,46 @@
+from django.conf import settings
 from rest_framework import serializers
-from django.core.exceptions import ValidationError as DjangoValidationError
-from .models import Customer
+from restaurant.fieldsets import SparseFieldsMixin
+from restaurant.serializers import ModelValidationMixin
+from .models import Customer, CustomerStats
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, ModelValidationMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = ['id','first_name','last_name','email','phone','address','registration_date']
         read_only_fields = ['registration_date']
 
-    def validate(self, data):
 
-        customer = Customer(**data)
+class CustomerSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """What staff see of a customer when looking up a caller: no contact details."""
+
+    class Meta:
+        model = Customer
+        fields = ['id', 'first_name', 'last_name']
+
+
+class CustomerStatsSerializer(serializers.ModelSerializer):
+    favorite_product_name = serializers.CharField(source='favorite_product.name', read_only=True, default=None)
+
+    class Meta:
+        model = CustomerStats
+        fields = ['order_count', 'lifetime_spend', 'last_order_date', 'favorite_product', 'favorite_product_name']
+
+
+class CustomerLookupSerializer(serializers.Serializer):
+    phone = serializers.CharField(required=False, help_text="Any formatting; only the digits are compared.")
+    email = serializers.CharField(required=False, help_text="Compared case-insensitively.")
+
+    def validate(self, attrs):
+        if len(attrs) != 1:
+            raise serializers.ValidationError("Give either phone or email.")
+        return attrs
 
-        try:
-            customer.clean()
-        except DjangoValidationError as e:
-            raise serializers.ValidationError(e.message_dict if hasattr(e, 'message_dict') else e.messages)
 
-        return data
+class CustomerSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(min_length=2, help_text="Start of a last name or phone number.")
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.CUSTOMER_TYPEAHEAD_MAX_LIMIT,
+        default=settings.CUSTOMER_TYPEAHEAD_LIMIT,
+    )
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+
+from customers.models import CustomerProductStats, CustomerStats
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from restaurant.db import upsert_increment
+
+TOTALS = ['order_count', 'lifetime_spend']
+LATEST = ['last_order_date']
+
+
+def record_orders(orders, items):
+    """Add freshly created orders to their customers' lifetime stats."""
+    customers = {order.id: order.customer_id for order in orders}
+    totals = defaultdict(lambda: [0, Decimal(0), None])
+    units = defaultdict(int)
+
+    for order in orders:
+        row = totals[(order.customer_id,)]
+        row[0] += 1
+        row[1] += order.total_amount
+        row[2] = order.order_date if row[2] is None else max(row[2], order.order_date)
+    for item in items:
+        units[(customers[item.order_id], item.product_id)] += item.quantity
+
+    _apply(totals, {key: (count,) for key, count in units.items()})
+    update_favorites(customer_id__in=[key[0] for key in totals])
+
+
+def _apply(totals, units):
+    # Sorted keys: concurrent transactions lock shared rows in the same order.
+    upsert_increment(CustomerStats, ['customer_id'], TOTALS, dict(sorted(
+        (key, tuple(values)) for key, values in totals.items()
+    )), latest_fields=LATEST)
+    upsert_increment(CustomerProductStats, ['customer_id', 'product_id'], ['units'], dict(sorted(units.items())))
+
+
+def update_favorites(**filters):
+    """
+    Point ``favorite_product`` of the matching stats rows at the product the
+    customer ordered most units of (lowest id on ties), in one UPDATE that
+    reads the first entry of each customer in ``customer_favorite_idx``.
+    """
+    favorite = CustomerProductStats.objects.filter(customer=OuterRef('customer')).order_by('-units', 'product')
+    CustomerStats.objects.filter(**filters).update(
+        favorite_product=Subquery(favorite.values('product')[:1])
+    )
+
+
+def update_customer_stats(sender, orders, items, **kwargs):
+    # Runs inside the transaction that created the orders.
+    record_orders(orders, items)
+
+
+def rebuild_customer_stats(chunk_size=5000, stdout=None):
+    """
+    Recompute every customer's stats from the order history (live and
+    archived orders), ``chunk_size`` orders per transaction, then their
+    favorites. Orders created while this runs are counted by the live update
+    path: the reset and the snapshot of the last order id happen in the same
+    transaction.
+    """
+    with transaction.atomic():
+        CustomerProductStats.objects.all().delete()
+        CustomerStats.objects.all().delete()
+        last_archived_id = ArchivedOrder.objects.aggregate(last=Max('id'))['last'] or 0
+        last_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+
+    processed = _rebuild_from(ArchivedOrder, ArchivedOrderItem, last_archived_id, chunk_size, stdout, 0)
+    processed = _rebuild_from(Order, OrderItem, last_id, chunk_size, stdout, processed)
+
+    low = 0
+    while True:
+        ids = list(
+            CustomerStats.objects.filter(customer_id__gt=low).order_by('customer_id')
+            .values_list('customer_id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        update_favorites(customer_id__gt=low, customer_id__lte=ids[-1])
+        low = ids[-1]
+    return processed
+
+
+def _rebuild_from(order_model, item_model, last_id, chunk_size, stdout, processed):
+    low = 0
+    while low < last_id:
+        ids = list(
+            order_model.objects.filter(id__gt=low, id__lte=last_id)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        high = ids[-1]
+        totals = {
+            (row['customer_id'],): (row['order_count'], row['spend'], row['last_order_date'])
+            for row in order_model.objects.filter(id__gt=low, id__lte=high).values('customer_id').annotate(
+                order_count=Count('id'), spend=Sum('total_amount'), last_order_date=Max('order_date')
+            )
+        }
+        units = {
+            (row['order__customer_id'], row['product_id']): (row['units'],)
+            for row in item_model.objects.filter(order_id__gt=low, order_id__lte=high)
+            .values('order__customer_id', 'product_id').annotate(units=Sum('quantity'))
+        }
+
+        with transaction.atomic():
+            _apply(totals, units)
+
+        processed += len(ids)
+        low = high
+        if stdout is not None:
+            stdout.write(f"{processed} orders counted")
+    return processed
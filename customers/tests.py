@@ -1,8 +1,28 @@
 
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from customers.models import Customer
+from customers.imports import upsert_customers, validate_rows
+from customers.lookup import lookup, typeahead
+from customers.rfm import OrderHistory, quintile_scores
+from customers.models import Customer, CustomerProductStats, CustomerStats
+from orders.models import Order
+from products.models import Category, Product
+from customers.views import CustomerViewSet
+from restaurant.testing import QueryBudgetMixin
 from django.urls import reverse
 
 
@@ -70,6 +90,20 @@ class CustomerAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
+    def test_delete_customer_with_orders_is_soft(self):
+        customer = Customer.objects.create(**self.customer_data)
+        order = Order.objects.create(customer=customer)
+        self.client.force_authenticate(user=self.admin)
+
+        response = self.client.delete(f"{self.url}{customer.id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.client.get(f"{self.url}{customer.id}/").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Customer.objects.exists())
+        self.assertIsNotNone(Customer.all_objects.get(pk=customer.pk).deleted_at)
+        order.refresh_from_db()
+        self.assertEqual(order.customer.email, "sara@test.com")
+
     def test_first_name_min_length_validation(self):
         self.client.force_authenticate(user=self.admin)
         invalid_data = self.customer_data.copy()
@@ -77,3 +111,442 @@ class CustomerAPITest(APITestCase):
         response = self.client.post(self.url, invalid_data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+
+class CustomerQueryBudgetTest(QueryBudgetMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager', password='manager12345', role='manager')
+        for i in range(7):
+            cls.customer = Customer.objects.create(
+                first_name="Sara", last_name="Ali", email=f"sara{i}@test.com",
+                phone="0999999999", address="Damascus"
+            )
+
+    def test_endpoints_within_budget(self):
+        self.client.force_authenticate(user=self.manager)
+        response = self.assertWithinQueryBudget(CustomerViewSet, 'list', "/api/customers/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.assertWithinQueryBudget(
+            CustomerViewSet, 'retrieve', f"/api/customers/{self.customer.id}/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_sparse_fields(self):
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(f"/api/customers/{self.customer.id}/", {"fields": "id,email"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"id": self.customer.id, "email": self.customer.email})
+
+class CustomerValidationQueryTest(APITestCase):
+    """
+    Model validation runs once per write: one unique-email check, then the
+    write (inside a savepoint here, since each test runs in a transaction).
+    """
+
+    def setUp(self):
+        self.client.force_authenticate(
+            user=User.objects.create_user(username='admin', password='admin12345', role='admin')
+        )
+        self.existing = Customer.objects.create(
+            first_name="Omar", last_name="Haddad", email="omar@test.com",
+            phone="0988888888", address="Aleppo"
+        )
+        self.data = {
+            "first_name": "Sara", "last_name": "Ali", "email": "sara@test.com",
+            "phone": "0999999999", "address": "Damascus"
+        }
+
+    def test_create_validates_once(self):
+        with self.assertNumQueries(4):
+            response = self.client.post("/api/customers/", self.data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_keeping_email_validates_once(self):
+        data = dict(self.data, email="omar@test.com")
+        with self.assertNumQueries(5):
+            response = self.client.put(f"/api/customers/{self.existing.id}/", data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["first_name"], "Sara")
+
+    def test_duplicate_email_rejected(self):
+        data = dict(self.data, email="omar@test.com")
+        response = self.client.post("/api/customers/", data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", response.data)
+
+    def test_deleted_customers_email_rejected(self):
+        self.existing.delete()
+        response = self.client.post("/api/customers/", dict(self.data, email="omar@test.com"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["email"], ["A deleted customer has this email address."])
+
+        customer = Customer.objects.create(**self.data)
+        response = self.client.put(f"/api/customers/{customer.id}/", dict(self.data, email="omar@test.com"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("email", response.data)
+
+    def test_integrity_error_is_a_400(self):
+        # A concurrent write that slips past the uniqueness check.
+        with mock.patch.object(Customer, 'validate_unique'):
+            response = self.client.post("/api/customers/", dict(self.data, email="omar@test.com"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["email"], ["Customer with this Email already exists."])
+
+
+class CustomerLookupTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='staff12345', role='staff')
+        people = [
+            ("Sara", "Ali", "Sara.Ali@Test.com", "0999999999"),
+            ("Omar", "Alhaddad", "omar@test.com", "0988888888"),
+            ("Lina", "alwan", "lina@test.com", "0999111222"),
+            ("Rami", "Haddad", "rami@test.com", "0911222333"),
+        ]
+        cls.customers = [
+            Customer.objects.create(first_name=first, last_name=last, email=email, phone=phone, address="Damascus")
+            for first, last, email, phone in people
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.staff)
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [customer['id'] for customer in response.data]
+
+    def test_lookup_by_phone_or_email(self):
+        sara = self.customers[0]
+        response = self.client.get("/api/customers/lookup/", {"phone": "0999 999-999"})
+        self.assertEqual(self.ids(response), [sara.id])
+        response = self.client.get("/api/customers/lookup/", {"email": " sara.ali@test.COM"})
+        self.assertEqual(self.ids(response), [sara.id])
+
+        sara.delete()
+        response = self.client.get("/api/customers/lookup/", {"phone": "0999999999"})
+        self.assertEqual(self.ids(response), [])
+
+        response = self.client.get("/api/customers/lookup/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_typeahead(self):
+        sara, omar, lina, _ = self.customers
+        response = self.client.get("/api/customers/search/", {"q": "AL"})
+        self.assertEqual(self.ids(response), [omar.id, sara.id, lina.id])
+        response = self.client.get("/api/customers/search/", {"q": "al", "limit": 2, "fields": "id,last_name"})
+        self.assertEqual(response.data, [{"id": omar.id, "last_name": "Alhaddad"}, {"id": sara.id, "last_name": "Ali"}])
+        response = self.client.get("/api/customers/search/", {"q": "0999 "})
+        self.assertEqual(self.ids(response), [lina.id, sara.id])
+
+        response = self.client.get("/api/customers/search/", {"q": "a"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_get_names_only(self):
+        sara = self.customers[0]
+        response = self.client.get("/api/customers/lookup/", {"phone": "0999999999"})
+        self.assertEqual(response.data, [{"id": sara.id, "first_name": "Sara", "last_name": "Ali"}])
+        response = self.client.get("/api/customers/search/", {"q": "al", "fields": "id,email"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        manager = User.objects.create_user(username='manager', password='manager12345', role='manager')
+        self.client.force_authenticate(user=manager)
+        response = self.client.get("/api/customers/lookup/", {"phone": "0999999999"})
+        self.assertEqual(response.data[0]["email"], "Sara.Ali@Test.com")
+
+    @skipUnless(connection.vendor == 'sqlite', "checks SQLite query plans")
+    def test_lookups_use_indexes(self):
+        queryset = Customer.objects.all()
+        for query, index in [
+            (lookup(queryset, email="omar@test.com"), 'customer_email_lower_idx'),
+            (lookup(queryset, phone="0988888888"), 'customer_phone_idx'),
+            (typeahead(queryset, "had", 10), 'customer_last_name_idx'),
+            (typeahead(queryset, "0999", 10), 'customer_phone_idx'),
+        ]:
+            with self.subTest(index=index):
+                self.assertIn(index, query.explain())
+
+
+class CustomerImportTest(APITestCase):
+    url = "/api/customers/import/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='admin12345', role='admin')
+        cls.sara = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="Sara.Ali@Test.com", phone="0999999999", address="Damascus"
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.admin)
+
+    def row(self, email, **overrides):
+        return {"first_name": "Omar", "last_name": "Haddad", "email": email,
+                "phone": "0988888888", "address": "Homs", **overrides}
+
+    def post_ndjson(self, rows):
+        body = "\n".join(json.dumps(row) for row in rows)
+        return self.client.post(self.url, body, content_type="application/x-ndjson")
+
+    def test_ndjson_upsert_matches_email_case_insensitively(self):
+        response = self.post_ndjson([
+            self.row("omar@test.com"),
+            self.row(" SARA.ALI@test.com", first_name="Sarah", phone="0999 111-222"),
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data, {"created": 1, "updated": 1, "failed": 0, "errors": []})
+
+        self.sara.refresh_from_db()
+        self.assertEqual((self.sara.first_name, self.sara.phone), ("Sarah", "0999111222"))
+        self.assertEqual(self.sara.email, "Sara.Ali@Test.com")
+        self.assertEqual(Customer.objects.get(email="omar@test.com").address, "Homs")
+
+    def test_csv_import_restores_deleted_customers(self):
+        self.sara.delete()
+        body = (
+            "\ufefffirst_name,last_name,email,phone,address\r\n"
+            "Sara,Ali,sara.ali@test.com,0999999999,Aleppo\r\n"
+        )
+        response = self.client.post(self.url, body, content_type="text/csv")
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(Customer.objects.get().address, "Aleppo")
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        body = "\n".join([
+            json.dumps(self.row("omar@test.com")),
+            "{not json",
+            json.dumps(self.row("bad-email", phone="123")),
+            json.dumps(self.row("OMAR@test.com")),
+        ])
+        response = self.client.post(self.url, body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [2, 3, 4])
+        self.assertEqual(set(response.data["errors"][1]["errors"]), {"email", "phone"})
+
+        response = self.client.post(self.url, [self.row("")], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["failed"], 1)
+
+    def test_body_must_be_rows(self):
+        for body in ('{"email": "omar@test.com"}', '42', 'null', '"omar@test.com"', 'true'):
+            with self.subTest(body=body):
+                response = self.client.post(self.url, body, content_type="application/json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(
+                    response.data, {"detail": "Expected NDJSON, CSV or a JSON array of customers."}
+                )
+        self.assertEqual(Customer.all_objects.count(), 1)
+
+    def test_non_object_elements_are_rejected(self):
+        customers, errors = validate_rows([1, "x", None])
+        self.assertEqual(customers, {})
+        self.assertEqual(
+            errors, {index: {"non_field_errors": ["Expected a JSON object."]} for index in range(3)}
+        )
+
+        response = self.client.post(self.url, [self.row("omar@test.com"), 1], format="json")
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data["errors"], [{"row": 2, "errors": {"non_field_errors": ["Expected a JSON object."]}}])
+
+    def test_non_string_values_are_rejected(self):
+        customers, errors = validate_rows([
+            self.row("omar@test.com", first_name=["Omar"]),
+            self.row("lina@test.com", last_name=123, address={"city": "Homs"}),
+            self.row("rami@test.com", phone=True),
+        ])
+        self.assertEqual(errors[0], {"first_name": ["Must be a string."]})
+        self.assertEqual(errors[1], {"last_name": ["Must be a string."], "address": ["Must be a string."]})
+        self.assertEqual(errors[2], {"phone": ["Must be a string."]})
+
+        customers, errors = validate_rows([self.row("omar@test.com", phone=9988888888)])
+        self.assertEqual(errors, {})
+        self.assertEqual(customers[0].phone, "9988888888")
+
+    def test_one_upsert_per_chunk(self):
+        rows = [self.row(f"guest{index}@test.com") for index in range(10)]
+        with CaptureQueriesContext(connection) as queries:
+            report = upsert_customers(rows, batch_size=5)
+        self.assertEqual(report["created"], 10)
+        inserts = [query for query in queries.captured_queries if query["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 2)
+        self.assertIn("ON CONFLICT", inserts[0]["sql"])
+
+    def test_staff_cannot_import(self):
+        staff = User.objects.create_user(username='staff', password='staff12345', role='staff')
+        self.client.force_authenticate(user=staff)
+        response = self.post_ndjson([self.row("omar@test.com")])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "customers.csv"
+            path.write_text(
+                "first_name,last_name,email,phone,address\n"
+                "Omar,Haddad,omar@test.com,0988888888,Homs\n"
+                "Lina,Alwan,lina@test.com,12,Homs\n"
+            )
+            out, err = StringIO(), StringIO()
+            call_command("import_customers", str(path), "--batch-size=1", stdout=out, stderr=err)
+        self.assertIn("1 created, 0 updated, 1 rejected", out.getvalue())
+        self.assertEqual(json.loads(err.getvalue())["row"], 2)
+
+
+class CustomerStatsTest(QueryBudgetMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager', password='manager12345', role='manager')
+        cls.staff = User.objects.create_user(username='staff', password='staff12345', role='staff')
+        cls.sara, cls.omar = [
+            Customer.objects.create(first_name=first, last_name="Ali", email=email, phone="0999999999", address="Damascus")
+            for first, email in (("Sara", "sara@test.com"), ("Omar", "omar@test.com"))
+        ]
+        pizza = Category.objects.create(name="Pizza", description="Pizza category")
+        cls.margherita = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10, category=pizza, preparation_time=15
+        )
+        cls.cola = Product.objects.create(
+            name="Cola", description="Cold cola", price=2, category=pizza, preparation_time=1
+        )
+
+    def place_orders(self):
+        self.client.force_authenticate(user=self.staff)
+        orders = [
+            {"customer": self.sara.id, "items": [{"product": self.margherita.id, "quantity": 1},
+                                                 {"product": self.cola.id, "quantity": 2}]},
+            {"customer": self.omar.id, "items": [{"product": self.cola.id, "quantity": 1}]},
+            {"customer": self.sara.id, "items": [{"product": self.cola.id, "quantity": 1}]},
+        ]
+        response = self.client.post("/api/orders/batch/", {"orders": orders[:2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post("/api/orders/", orders[2], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def snapshot(self):
+        return (
+            sorted(CustomerStats.objects.values_list(
+                'customer_id', 'order_count', 'lifetime_spend', 'last_order_date', 'favorite_product_id'
+            )),
+            sorted(CustomerProductStats.objects.values_list('customer_id', 'product_id', 'units')),
+        )
+
+    def test_orders_update_stats(self):
+        self.place_orders()
+        stats = CustomerStats.objects.get(customer=self.sara)
+        self.assertEqual((stats.order_count, stats.lifetime_spend), (2, Decimal('16.00')))
+        self.assertEqual(stats.last_order_date, self.sara.orders.latest('order_date').order_date)
+        self.assertEqual(stats.favorite_product, self.cola)
+        self.assertEqual(CustomerStats.objects.get(customer=self.omar).order_count, 1)
+
+    def test_order_history(self):
+        self.place_orders()
+        self.client.force_authenticate(user=self.manager)
+        url = f"/api/customers/{self.sara.id}/orders/?cursor="
+        response = self.assertWithinQueryBudget(CustomerViewSet, 'orders', url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        newest = self.sara.orders.order_by('-order_date', '-id')
+        self.assertEqual([order["id"] for order in response.data["results"]], [order.id for order in newest])
+        self.assertEqual(response.data["stats"]["order_count"], 2)
+        self.assertEqual(response.data["stats"]["favorite_product_name"], "Cola")
+
+        newcomer = Customer.objects.create(
+            first_name="Lina", last_name="Alwan", email="lina@test.com", phone="0999999999", address="Homs"
+        )
+        response = self.client.get(f"/api/customers/{newcomer.id}/orders/")
+        self.assertEqual(response.data["count"], 0)
+        self.assertEqual(response.data["stats"]["order_count"], 0)
+
+        for pk in ("abc", "999999"):
+            response = self.client.get(f"/api/customers/{pk}/orders/")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(f"/api/customers/{self.sara.id}/orders/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rebuild_matches_incremental_stats(self):
+        self.place_orders()
+        incremental = self.snapshot()
+
+        CustomerStats.objects.update(order_count=0, favorite_product=None)
+        CustomerProductStats.objects.all().delete()
+        call_command('rebuild_customer_stats', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+        # Archived orders still count.
+        Order.objects.update(status='Delivered', order_date=timezone.now() - timedelta(days=60))
+        call_command('rebuild_customer_stats', stdout=StringIO())
+        before = self.snapshot()
+        call_command('archive_orders', older_than_days=30, stdout=StringIO())
+        call_command('rebuild_customer_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+
+
+class CustomerSegmentTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.customers = []
+        # Customer i: i + 1 orders of 10 * (i + 1), the last one 10 * (10 - i) days ago.
+        for index in range(10):
+            customer = Customer.objects.create(
+                first_name="Guest", last_name=f"Number{index}", email=f"guest{index}@test.com",
+                phone="0999999999", address="Damascus"
+            )
+            for _ in range(index + 1):
+                order = Order.objects.create(customer=customer, total_amount=10 * (index + 1))
+                Order.objects.filter(pk=order.pk).update(order_date=now - timedelta(days=10 * (10 - index)))
+            cls.customers.append(customer)
+        Customer.objects.create(
+            first_name="Lina", last_name="Alwan", email="lina@test.com", phone="0999999999", address="Homs"
+        )
+        call_command('rebuild_customer_stats', stdout=StringIO())
+
+    def test_quintile_scores(self):
+        self.assertEqual(quintile_scores(np.arange(1, 11)).tolist(), [1, 1, 2, 2, 3, 3, 4, 4, 5, 5])
+        self.assertEqual(quintile_scores(np.array([1, 1, 1, 1, 2])).tolist(), [1, 1, 1, 1, 5])
+
+    def test_orders_of_customers_created_after_snapshot_are_skipped(self):
+        first, middle = self.customers[0], self.customers[5]
+        history = OrderHistory(np.array([first.id, self.customers[9].id], dtype=np.int64))
+        late = Customer.objects.create(
+            first_name="Rami", last_name="Saleh", email="rami@test.com", phone="0999999999", address="Homs"
+        )
+        Order.objects.create(customer=late, total_amount=500)
+
+        # Past the last snapshot id, and between two snapshot ids.
+        history.add(list(Order.objects.filter(customer__in=[first, middle, late]).values_list(
+            'customer_id', 'order_date', 'total_amount'
+        )))
+        self.assertEqual(history.counts.tolist(), [1, 0])
+        self.assertEqual(history.spend.tolist(), [10.0, 0.0])
+
+    def test_segment_command(self):
+        out = StringIO()
+        call_command('segment_customers', chunk_size=3, stdout=out)
+        self.assertIn("Segmented 10 customers", out.getvalue())
+
+        stats = {row.customer_id: row for row in CustomerStats.objects.all()}
+        best, worst = stats[self.customers[-1].id], stats[self.customers[0].id]
+        self.assertEqual((best.recency_score, best.frequency_score, best.monetary_score), (5, 5, 5))
+        self.assertEqual(best.segment, 'champions')
+        self.assertEqual((worst.recency_score, worst.frequency_score, worst.segment), (1, 1, 'lost'))
+        self.assertEqual(len(stats), 10)
+
+        # Chunking doesn't change the result.
+        snapshot = sorted(CustomerStats.objects.values_list('customer_id', 'segment'))
+        CustomerStats.objects.update(segment='')
+        call_command('segment_customers', chunk_size=50000, stdout=StringIO())
+        self.assertEqual(sorted(CustomerStats.objects.values_list('customer_id', 'segment')), snapshot)
+
+    def test_customers_without_stats_row_are_not_counted(self):
+        CustomerStats.objects.filter(customer=self.customers[0]).delete()
+        out = StringIO()
+        call_command('segment_customers', stdout=out)
+        self.assertIn("Segmented 9 customers", out.getvalue())
+        self.assertEqual(CustomerStats.objects.exclude(segment='').count(), 9)
@@ -1,20 +1,43 @@
+from collections.abc import Iterator
+from itertools import islice
+
+from django.conf import settings
+from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from users.permissions import IsAdmin, IsManager, IsStaff
-from customers.models import Customer
-from customers.serializers import CustomerSerializer
+from customers.imports import upsert_customers
+from customers.lookup import lookup, typeahead
+from customers.models import Customer, CustomerStats
+from customers.parsers import CSVParser, NDJSONParser
+from customers.serializers import (
+    CustomerLookupSerializer, CustomerSearchSerializer, CustomerSerializer, CustomerStatsSerializer,
+    CustomerSummarySerializer,
+)
+from orders.serializers import OrderSerializer
+from orders.views import OrderViewSet
+from restaurant.fieldsets import SparseFieldsetMixin, fieldset_parameters
+from restaurant.pagination import KeysetPagination
 
 
 @extend_schema_view(
     list=extend_schema(
         summary="List all customers",
         description="Retrieve a list of all customers in our restaurant.",
+        parameters=fieldset_parameters,
         responses={200: CustomerSerializer(many=True)},
     ),
     retrieve=extend_schema(
         summary="Get customer details",
         description="Retrieve details of a specific customer by ID.",
+        parameters=fieldset_parameters,
     ),
     create=extend_schema(
         summary="Create a new customer",
@@ -26,10 +49,10 @@ from customers.serializers import CustomerSerializer
     ),
     destroy=extend_schema(
         summary="Delete a customer",
-        description="Remove a customer from the restaurant.",
+        description="Remove a customer from the restaurant. The row is kept (soft-deleted) for order history.",
     ),
 )
-class CustomerViewSet(ModelViewSet):
+class CustomerViewSet(SparseFieldsetMixin, ModelViewSet):
     """
     Customer Management API
 
@@ -47,10 +70,119 @@ class CustomerViewSet(ModelViewSet):
     """
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
     permission_classes = [IsAuthenticated]
+    # orders: customer, stats, count, page, items
+    query_budget = {'list': 2, 'retrieve': 1, 'orders': 5}
 
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'orders']:
             return [IsManager()]
-        return [IsAdmin()]
\ No newline at end of file
+        if self.action in ['lookup', 'search']:
+            # Hosts look callers up to take their orders.
+            return [(IsManager | IsStaff)()]
+        return [IsAdmin()]
+
+    def get_serializer_class(self):
+        # Only managers read customer records; staff get names to pick the caller.
+        if self.action in ['lookup', 'search'] and not IsManager().has_permission(self.request, self):
+            return CustomerSummarySerializer
+        return super().get_serializer_class()
+
+    @extend_schema(
+        summary="Look up a customer",
+        description=(
+            "Exact match on `phone` (formatting ignored) or `email` (case-insensitive), "
+            "served from an index. Staff get only `id`, `first_name` and `last_name`."
+        ),
+        parameters=[CustomerLookupSerializer] + fieldset_parameters,
+        responses={200: CustomerSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'], url_path='lookup', pagination_class=None)
+    def lookup(self, request):
+        query = CustomerLookupSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        customers = lookup(self.get_queryset(), **query.validated_data).order_by('id')
+        return Response(self.get_serializer(customers, many=True).data)
+
+    @extend_schema(
+        summary="Customer typeahead",
+        description=(
+            "Up to `limit` customers whose last name (or, for digits, phone) starts with `q`, "
+            "read in index order so the cost doesn't grow with the customer table. Staff get "
+            "only `id`, `first_name` and `last_name`."
+        ),
+        parameters=[CustomerSearchSerializer] + fieldset_parameters,
+        responses={200: CustomerSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'], url_path='search', pagination_class=None)
+    def search(self, request):
+        query = CustomerSearchSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        customers = typeahead(self.get_queryset(), query.validated_data['q'], query.validated_data['limit'])
+        return Response(self.get_serializer(customers, many=True).data)
+
+    @extend_schema(
+        summary="Customer order history",
+        description=(
+            "The customer's orders, newest first, paginated like `/api/orders/` (keyset with "
+            "`cursor`), with their lifetime `stats`: order count, spend, last order date and "
+            "favorite product. Stats are kept up to date as orders are created; archived orders "
+            "count toward them but are listed under `/api/orders/archive/?customer=`."
+        ),
+        responses={200: OrderSerializer(many=True)},
+    )
+    @action(
+        detail=True, methods=['get'], url_path='orders',
+        serializer_class=OrderSerializer, keyset_ordering=('-order_date', '-id'),
+    )
+    def orders(self, request, pk=None):
+        customer = get_object_or_404(Customer.objects.all(), pk=pk)
+        stats = CustomerStats.objects.select_related('favorite_product').filter(customer=customer).first()
+        orders = OrderViewSet.queryset.filter(customer=customer)
+
+        page = self.paginate_queryset(orders)
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['stats'] = CustomerStatsSerializer(stats or CustomerStats(customer=customer)).data
+        return response
+
+    @extend_schema(
+        summary="Import customers",
+        description=(
+            "Insert or update customers matched on email, from NDJSON (`application/x-ndjson`), "
+            "CSV with a header row (`text/csv`) or a JSON array. Rows are validated together and "
+            "written in chunks with one upsert each; deleted customers that reappear are restored. "
+            "Invalid rows are skipped and listed in `errors` with their row number."
+        ),
+        request={
+            'application/x-ndjson': OpenApiTypes.STR,
+            'text/csv': OpenApiTypes.STR,
+            'application/json': CustomerSerializer(many=True),
+        },
+        responses={200: OpenApiTypes.OBJECT, 207: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    )
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        parser_classes=[NDJSONParser, CSVParser, JSONParser],
+    )
+    def import_customers(self, request):
+        rows = request.data
+        # A JSON array, or the lazy rows of the NDJSON/CSV parsers; not an
+        # object, a string (iterable by character) or another scalar.
+        if not isinstance(rows, (list, Iterator)):
+            raise ValidationError({"detail": "Expected NDJSON, CSV or a JSON array of customers."})
+        limit = settings.CUSTOMER_IMPORT_MAX_ROWS
+        rows = list(islice(rows, limit + 1))
+        if len(rows) > limit:
+            raise ValidationError({"detail": f"At most {limit} rows per request; use the import_customers command."})
+
+        report = upsert_customers(rows, batch_size=settings.CUSTOMER_IMPORT_BATCH_SIZE)
+        if not report['failed']:
+            response_status = status.HTTP_200_OK
+        elif report['created'] or report['updated']:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(report, status=response_status)
@@ -2,4 +2,10 @@ from django.apps import AppConfig
 
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'orders'
\ No newline at end of file
+    name = 'orders'
+
+    def ready(self):
+        from orders import events, signals
+
+        signals.orders_created.connect(events.publish_created_orders, dispatch_uid='order-events-created')
+        signals.order_status_changed.connect(events.publish_status_changes, dispatch_uid='order-events-status')
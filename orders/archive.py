@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ORDER_FIELDS = ['id', 'customer_id', 'order_date', 'total_amount', 'status', 'notes']
+ITEM_FIELDS = ['id', 'order_id', 'product_id', 'quantity', 'price_at_order']
+
+
+def archive_delivered_orders(older_than_days, batch_size=1000, max_batches=None, stdout=None):
+    """
+    Move delivered orders placed more than ``older_than_days`` ago, with their
+    items, into the archive tables. Each batch of ``batch_size`` orders is
+    copied and deleted in its own short transaction so the live tables are
+    never locked for long. Returns the number of orders archived.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            ids = list(
+                Order.objects.filter(status='Delivered', order_date__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            ArchivedOrder.objects.bulk_create([
+                ArchivedOrder(**row) for row in Order.objects.filter(id__in=ids).values(*ORDER_FIELDS)
+            ])
+            ArchivedOrderItem.objects.bulk_create([
+                ArchivedOrderItem(**row) for row in OrderItem.objects.filter(order_id__in=ids).values(*ITEM_FIELDS)
+            ])
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(id__in=ids).delete()
+
+        archived += len(ids)
+        batches += 1
+        if stdout is not None:
+            stdout.write(f"{archived} orders archived")
+    return archived
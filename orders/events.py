@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import json
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+
+class Subscription:
+    """One connected listener: a bounded queue living on the listener's event loop."""
+
+    def __init__(self, loop, statuses, queue_size):
+        self.loop = loop
+        self.statuses = statuses
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def accepts(self, statuses):
+        return self.statuses is None or not self.statuses.isdisjoint(statuses)
+
+    def put(self, frame):
+        # Runs on the subscriber's loop. A listener that can't keep up is cut
+        # off (None sentinel) so it reconnects and resyncs instead of growing
+        # the queue without bound.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class OrderEventHub:
+    """
+    In-process fan-out of order events to server-sent event listeners.
+
+    ``publish`` may be called from any thread (sync views run in a thread pool
+    under ASGI). Each event is encoded to an SSE frame once and then handed to
+    every matching subscriber's queue on that subscriber's own event loop, so
+    idle listeners cost a queue each rather than a thread.
+
+    The hub only reaches listeners connected to the same process.
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or settings.ORDER_EVENTS_QUEUE_SIZE
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, statuses=None):
+        subscription = Subscription(asyncio.get_running_loop(), statuses, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data, statuses):
+        """Send ``data`` as an ``event`` frame to listeners following any of ``statuses``."""
+        with self._lock:
+            subscribers = [sub for sub in self._subscribers if sub.accepts(statuses)]
+        if not subscribers:
+            return
+
+        payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+        frame = f"id: {next(self._ids)}\nevent: {event}\ndata: {payload}\n\n".encode()
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, frame)
+            except RuntimeError:
+                # The listener's loop is gone.
+                self.unsubscribe(subscription)
+
+
+hub = OrderEventHub()
+
+STREAM_TOKEN_SALT = 'orders.events.stream'
+
+
+def stream_token(user):
+    """
+    Signed token letting ``user`` open the event stream with ``?token=`` for
+    ORDER_EVENTS_TOKEN_TTL seconds. Browsers' EventSource can't send an
+    Authorization header, and this token grants nothing but the stream.
+    """
+    return signing.dumps({'user': user.pk}, salt=STREAM_TOKEN_SALT)
+
+
+def stream_token_user(token):
+    """The active user ``token`` was issued to, or None if it's invalid or expired."""
+    try:
+        data = signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=settings.ORDER_EVENTS_TOKEN_TTL)
+    except signing.BadSignature:
+        return None
+    return get_user_model().objects.filter(pk=data['user'], is_active=True).first()
+
+
+def publish_created_orders(sender, orders, items, **kwargs):
+    lines = {}
+    for item in items:
+        lines.setdefault(item.order_id, []).append({
+            "product": item.product_id,
+            "product_name": item.product.name,
+            "quantity": item.quantity,
+        })
+    events = [
+        {
+            "id": order.id,
+            "customer": order.customer_id,
+            "status": order.status,
+            "order_date": order.order_date,
+            "total_amount": order.total_amount,
+            "notes": order.notes,
+            "items": lines.get(order.id, []),
+        }
+        for order in orders
+    ]
+
+    def publish():
+        for event in events:
+            hub.publish("order.created", event, {event["status"]})
+
+    transaction.on_commit(publish)
+
+
+def publish_status_changes(sender, order_ids, status, previous, **kwargs):
+    def publish():
+        for order_id in order_ids:
+            hub.publish(
+                "order.status",
+                {"id": order_id, "status": status, "previous_status": previous},
+                {status, previous},
+            )
+
+    transaction.on_commit(publish)
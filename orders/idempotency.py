@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+idempotency_key_parameter = OpenApiParameter(
+    IDEMPOTENCY_HEADER,
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    required=False,
+    description=(
+        "Client-generated unique key. Retrying with the same key returns the original "
+        "response instead of repeating the write."
+    ),
+)
+
+
+class _Entry:
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response = None
+        self.expires_at = None
+
+
+class IdempotencyStore:
+    """
+    Bounded in-process store of responses keyed by idempotency key.
+
+    The first request with a key runs the handler while later requests with the
+    same key block until it finishes, then get its stored response. Responses
+    expire ``ttl`` seconds after they are stored, and once ``max_entries`` keys
+    are held the least recently used finished entry is evicted. Responses are
+    only stored when the handler returns one below 500; if it raises, the key
+    is released and a waiting retry runs the handler itself.
+
+    Keys are only shared by requests served by the same process.
+    """
+
+    def __init__(self, max_entries, ttl, wait_timeout, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def run(self, key, fingerprint, handler):
+        """Return ``(response, replayed)`` for ``key``, calling ``handler`` at most once."""
+        while True:
+            entry, owner = self._claim(key, fingerprint)
+            if owner:
+                return self._execute(key, entry, handler), False
+            if entry.fingerprint != fingerprint:
+                return Response(
+                    {"detail": f"{IDEMPOTENCY_HEADER} was already used with a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                ), False
+            if not entry.done.wait(self.wait_timeout):
+                return Response(
+                    {"detail": f"A request with this {IDEMPOTENCY_HEADER} is still being processed."},
+                    status=status.HTTP_409_CONFLICT
+                ), False
+            if entry.response is not None:
+                status_code, data = entry.response
+                return Response(data, status=status_code), True
+
+    def _claim(self, key, fingerprint):
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry, False
+
+            entry = _Entry(fingerprint)
+            self._entries[key] = entry
+            self._evict(now)
+            return entry, True
+
+    def _evict(self, now):
+        expired = [key for key, entry in self._entries.items()
+                   if entry.expires_at is not None and entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        # Least recently used first; keys still being processed are never evicted.
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._entries[key].done.is_set():
+                del self._entries[key]
+
+    def _execute(self, key, entry, handler):
+        try:
+            response = handler()
+        except BaseException:
+            self._release(key, entry)
+            raise
+        if response.status_code >= 500:
+            self._release(key, entry)
+            return response
+
+        with self._lock:
+            entry.response = (response.status_code, response.data)
+            entry.expires_at = self.clock() + self.ttl
+        entry.done.set()
+        return response
+
+    def _release(self, key, entry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        entry.done.set()
+
+
+store = IdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+    ttl=settings.IDEMPOTENCY_TTL,
+    wait_timeout=settings.IDEMPOTENCY_WAIT_TIMEOUT,
+)
+
+
+def idempotent(view_method):
+    """
+    Make a DRF view method honour the ``Idempotency-Key`` header.
+
+    Keys are scoped to the user and the endpoint, and bound to the request
+    payload: reusing a key with a different payload is rejected with 422.
+    Replayed responses carry ``Idempotent-Replayed: true``.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} must be at most 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = (request.user.pk, request.method, request.path, key)
+        payload = json.dumps(request.data, sort_keys=True, default=str)
+        fingerprint = hashlib.sha256(payload.encode()).hexdigest()
+
+        response, replayed = store.run(
+            scope, fingerprint, lambda: view_method(self, request, *args, **kwargs)
+        )
+        if replayed:
+            response['Idempotent-Replayed'] = 'true'
+        return response
+
+    return wrapper
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.archive import archive_delivered_orders
+
+
+class Command(BaseCommand):
+    help = "Move old delivered orders out of the live order tables into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help="Archive delivered orders placed more than this many days ago "
+                 "(default: ORDER_ARCHIVE_AFTER_DAYS)."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Orders moved per transaction (default: 1000)."
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help="Stop after this many batches (default: until nothing is left)."
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_delivered_orders(
+            options['older_than_days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} orders"))
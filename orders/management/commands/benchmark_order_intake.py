@@ -0,0 +1,102 @@
+import statistics
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from customers.models import Customer
+from orders.services import create_orders
+from orders.writer import GroupCommitWriter
+from products.models import Category, Product
+from restaurant.db import scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare order intake throughput and latency of one transaction per order "
+        "against the group-commit writer, on a scratch SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='Orders written per mode.')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent request threads.')
+        parser.add_argument('--items', type=int, default=3, help='Items per order.')
+        parser.add_argument('--max-batch', type=int, default=100)
+        parser.add_argument('--max-wait', type=float, default=0.005)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            customer, products = self._seed(options['items'])
+            orders_data = [
+                {'customer': customer, 'items': [{'product': product, 'quantity': 1} for product in products]}
+                for _ in range(options['orders'])
+            ]
+
+            def direct(order_data):
+                return create_orders([order_data])[0]
+
+            self._report('one transaction per order', self._run(direct, orders_data, options['threads']))
+
+            writer = GroupCommitWriter(options['max_batch'], options['max_wait'])
+            try:
+                self._report('group commit', self._run(writer.submit, orders_data, options['threads']))
+            finally:
+                writer.stop()
+
+    def _seed(self, item_count):
+        customer = Customer.objects.create(
+            first_name='Bench', last_name='Mark', email='bench@example.com',
+            phone='0900000000', address='Benchmark'
+        )
+        category = Category.objects.create(name='Benchmark', description='Benchmark')
+        products = [
+            Product.objects.create(
+                name=f'Benchmark {index}', description='Benchmark', price=Decimal('9.50'),
+                category=category, preparation_time=10
+            )
+            for index in range(item_count)
+        ]
+        return customer, products
+
+    def _run(self, write, orders_data, thread_count):
+        pending = list(orders_data)
+        lock = threading.Lock()
+        latencies = []
+        errors = []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        order_data = pending.pop()
+                    started = time.perf_counter()
+                    try:
+                        write(order_data)
+                    except OperationalError as exc:
+                        errors.append(exc)
+                        continue
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, latencies, errors
+
+    def _report(self, label, result):
+        elapsed, latencies, errors = result
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+        self.stdout.write(
+            f"{label}: {len(latencies) / elapsed:.0f} orders/s, "
+            f"p50 {statistics.median(latencies or [0]) * 1000:.1f} ms, "
+            f"p99 {p99 * 1000:.1f} ms, {len(errors)} failed (database is locked)"
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_alter_customer_options'),
+        ('orders', '0002_alter_order_customer'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-order_date', '-id'], name='order_date_id_idx'),
+        ),
+    ]
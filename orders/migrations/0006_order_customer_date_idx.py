@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0007_customer_stats'),
+        ('orders', '0005_protect_ordered_products'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', '-order_date', '-id'], name='order_customer_date_idx'),
+        ),
+    ]
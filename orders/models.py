@@ -1,7 +1,50 @@
-from django.db import models
+from django.db import connection, models, transaction
 from products.models import Product 
 from customers.models import Customer
 from django.core.exceptions import ValidationError
+from restaurant.db import supports_update_returning
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def advance(self, new_status):
+        """
+        Move the orders of this queryset that sit one step before ``new_status``
+        to it with a single compare-and-set UPDATE
+        (``... AND status = <previous step>``). Returns the number of rows moved.
+        """
+        return self.filter(status=Order.previous_status(new_status)).update(status=new_status)
+
+    def advance_ids(self, ids, new_status):
+        """
+        Like ``advance`` for an explicit list of ids, but returns the ids that
+        moved. Uses ``UPDATE ... RETURNING`` where available so it stays a single
+        statement.
+        """
+        ids = list(ids)
+        expected = Order.previous_status(new_status)
+        if not ids or expected is None:
+            return []
+
+        if supports_update_returning():
+            quote = connection.ops.quote_name
+            table, pk, status = quote(self.model._meta.db_table), quote('id'), quote('status')
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET {status} = %s "
+                    f"WHERE {pk} IN ({placeholders}) AND {status} = %s RETURNING {pk}",
+                    [new_status, *ids, expected]
+                )
+                return sorted(row[0] for row in cursor.fetchall())
+
+        with transaction.atomic():
+            moved = list(
+                self.select_for_update().filter(pk__in=ids, status=expected).values_list('pk', flat=True)
+            )
+            self.filter(pk__in=moved).update(status=new_status)
+        return sorted(moved)
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -10,6 +53,7 @@ class Order(models.Model):
         ('Ready', 'Ready'),
         ('Delivered', 'Delivered'),
     ]
+    STATUS_FLOW = ['New', 'Preparing', 'Ready', 'Delivered']
 
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='orders')
     order_date = models.DateTimeField(auto_now_add=True)
@@ -17,11 +61,27 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='New')
     notes = models.TextField(blank=True, null=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination over ('-order_date', '-id').
+            models.Index(fields=['-order_date', '-id'], name='order_date_id_idx'),
+            # A customer's order history, newest first (/api/customers/{id}/orders/).
+            models.Index(fields=['customer', '-order_date', '-id'], name='order_customer_date_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.customer.first_name}"
 
+    @classmethod
+    def previous_status(cls, status):
+        """The status an order must be in to move to ``status`` (None for the first step)."""
+        index = cls.STATUS_FLOW.index(status)
+        return cls.STATUS_FLOW[index - 1] if index else None
+
     def can_change_status(self, new_status):
-        order_flow = ['New', 'Preparing', 'Ready', 'Delivered']
+        order_flow = self.STATUS_FLOW
         current_index = order_flow.index(self.status)
         try:
             new_index = order_flow.index(new_status)
@@ -34,9 +94,40 @@ class Order(models.Model):
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField(default=1)
     price_at_order = models.DecimalField(max_digits=10, decimal_places=2) 
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
+
+
+class ArchivedOrder(models.Model):
+    """Delivered order moved out of the live tables by the archive_orders command."""
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='archived_orders')
+    order_date = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    notes = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-order_date', '-id'], name='archived_order_date_id_idx'),
+            models.Index(fields=['customer', '-order_date'], name='archived_order_customer_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='+')
+    quantity = models.PositiveIntegerField()
+    price_at_order = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.product.name} x {self.quantity}"
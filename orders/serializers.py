@@ -1,9 +1,80 @@
+from collections.abc import Mapping
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from .services import create_orders
+from customers.models import Customer
+from customers.serializers import CustomerSerializer
+from products.availability import get_product_index
 from products.models import Product
+from restaurant.fieldsets import SparseFieldsMixin
+
+
+def _as_pk(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def collect_customer_ids(orders_data):
+    """Return every well-formed customer id referenced by the raw order payloads."""
+    ids = {_as_pk(data.get('customer')) for data in orders_data if isinstance(data, Mapping)}
+    ids.discard(None)
+    return ids
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves the pk from an ``{id: instance}`` map stored in the serializer
+    context under ``context_key``, so nested items don't query one by one.
+    Falls back to the regular queryset lookup when nothing was preloaded.
+    """
+
+    def __init__(self, context_key, **kwargs):
+        self.context_key = context_key
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get(self.context_key)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in preloaded:
+            self.fail('does_not_exist', pk_value=data)
+        return preloaded[pk]
+
+
+class IndexedProductField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves product ids against the in-process product index instead of the
+    database; the returned products carry id, name, price, category id,
+    availability and preparation time.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        product = get_product_index().product(pk)
+        if product is None:
+            self.fail('does_not_exist', pk_value=data)
+        return product
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    product = IndexedProductField(queryset=Product.objects.all())
     product_name = serializers.CharField(source='product.name', read_only=True)
 
     class Meta:
@@ -11,33 +82,65 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['product' , 'product_name',  'quantity']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    customer = PreloadedPrimaryKeyRelatedField('customers', queryset=Customer.objects.all())
     items = OrderItemSerializer(many=True)
     total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = Order
         fields = ['id', 'customer','order_date' , 'status', 'total_amount', 'notes', 'items']
+        expandable_fields = {'customer': CustomerSerializer}
 
     def validate_items(self, value):
+        quantities = {}
         for item in value:
-            if not item['product'].is_available:
-                raise serializers.ValidationError(f"{item['product'].name} unavailable")
+            product = item['product']
+            if not product.is_available:
+                raise serializers.ValidationError(f"{product.name} unavailable")
+            quantities[product.pk] = quantities.get(product.pk, 0) + item['quantity']
+            # Stock only goes down between index rebuilds, so this can't reject a
+            # valid order; the final check is the UPDATE in create_orders().
+            if product.stock_quantity is not None and product.stock_quantity < quantities[product.pk]:
+                raise serializers.ValidationError(f"Not enough stock for {product.name}")
         return value
 
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-        total = 0
-        for item in items_data:
-            product = item['product']
-            OrderItem.objects.create(order=order, product=product, quantity=item['quantity'],
-                                     price_at_order=product.price)
-            total += product.price * item['quantity']
+        return create_orders([validated_data])[0]
 
-        order.total_amount = total
-        order.save()
-        return order
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ['product', 'product_name', 'quantity']
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['id', 'customer', 'order_date', 'status', 'total_amount', 'notes', 'items', 'archived_at']
+        read_only_fields = fields
+
+
+class OrderBatchSerializer(serializers.Serializer):
+    orders = serializers.ListField(
+        child=serializers.JSONField(),
+        allow_empty=False,
+        max_length=settings.ORDER_BATCH_MAX_SIZE,
+    )
+
+
+class OrderAdvanceSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.ORDER_BATCH_MAX_SIZE,
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_FLOW[1:])
 
 
 class OrderStatusSerializer(serializers.ModelSerializer):
@@ -46,7 +149,7 @@ class OrderStatusSerializer(serializers.ModelSerializer):
         fields = ['status']
 
     def validate_status(self, value):
-        allowed = ['New', 'Preparing', 'Ready', 'Delivered']
+        allowed = Order.STATUS_FLOW
         if value not in allowed:
             raise serializers.ValidationError(
                 f"Status must be one of {allowed}"
@@ -62,4 +165,4 @@ class OrderStatusSerializer(serializers.ModelSerializer):
                     f"Status must progress step by step: {order.status} → {value}"
                 )
 
-        return value
\ No newline at end of file
+        return value
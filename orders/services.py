@@ -0,0 +1,64 @@
+from django.db import connection, transaction
+
+from orders.models import Order, OrderItem
+from orders.signals import orders_created
+from products.cache import menu_cache
+from products.models import Product
+
+
+def create_orders(orders_data):
+    """
+    Insert already validated orders and their items in one transaction.
+
+    Totals are computed up front so each order is written once, and both
+    orders and items go through ``bulk_create``. Stock of stock-tracked
+    products is taken for the whole call in one conditional UPDATE; if any is
+    short, ``OutOfStock`` is raised and nothing is written. Returns the orders
+    with the created items attached as if prefetched, so serializing them runs
+    no further queries.
+    """
+    if not orders_data:
+        return []
+
+    orders = []
+    lines = []
+    quantities = {}
+    for data in orders_data:
+        data = dict(data)
+        items = data.pop('items')
+        total = sum(item['product'].price * item['quantity'] for item in items)
+        orders.append(Order(total_amount=total, **data))
+        lines.append(items)
+        for item in items:
+            product = item['product']
+            if product.stock_quantity is not None:
+                quantities[product.pk] = quantities.get(product.pk, 0) + item['quantity']
+
+    with transaction.atomic():
+        sold_out = Product.objects.take_stock(quantities)
+        if sold_out:
+            # Availability changed: refresh menu responses and the product index.
+            menu_cache.bump_on_commit()
+        if connection.features.can_return_rows_from_bulk_insert:
+            Order.objects.bulk_create(orders)
+        else:
+            for order in orders:
+                order.save()
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item['product'], quantity=item['quantity'],
+                      price_at_order=item['product'].price)
+            for order, order_lines in zip(orders, lines)
+            for item in order_lines
+        ])
+        orders_created.send(sender=Order, orders=orders, items=items)
+
+    items_by_order = {order.pk: [] for order in orders}
+    for item in items:
+        items_by_order[item.order_id].append(item)
+    for order in orders:
+        # Same shape prefetch_related('items') leaves behind.
+        order_items = order.items.all()
+        order_items._result_cache = items_by_order[order.pk]
+        order_items._prefetch_done = True
+        order._prefetched_objects_cache = {'items': order_items}
+    return orders
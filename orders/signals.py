@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent inside the creating transaction, once per call to
+# orders.services.create_orders, with ``orders`` (saved Order instances) and
+# ``items`` (the OrderItem instances inserted for them, products attached).
+orders_created = Signal()
+
+# Sent after orders moved to a new status, with ``order_ids``, ``status``
+# (the new status) and ``previous`` (the status they moved from).
+order_status_changed = Signal()
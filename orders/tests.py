@@ -1,11 +1,33 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.response import Response
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
 
 from customers.models import Customer
-from products.models import Category, Product
-from orders.models import Order, OrderItem
+from products.availability import get_product_index
+from products.models import Category, OutOfStock, Product
+from orders.events import OrderEventHub, hub, stream_token
+from orders.idempotency import IdempotencyStore, store
+from orders.writer import GroupCommitWriter, writer
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from orders.services import create_orders
+from orders.views import ArchivedOrderViewSet, OrderViewSet
+from restaurant.testing import QueryBudgetMixin
+from rest_framework_simplejwt.tokens import RefreshToken
 
 User = get_user_model()
 
@@ -178,3 +200,826 @@ class OrderAPITest(APITestCase):
         response = self.client.put(url, {"status": "Ready"}, format='json')
         self.assertEqual(response.status_code, 400)
         self.assertIn("progress step by step", str(response.data))
+
+    def _order_payload(self, line_count, prefix):
+        products = [
+            Product.objects.create(
+                name=f"{prefix} {i}",
+                description="Test pizza",
+                price=5 + i,
+                category=self.category,
+                is_available=True,
+                preparation_time=10
+            )
+            for i in range(line_count)
+        ]
+        return {
+            "customer": self.customer.id,
+            "items": [{"product": product.id, "quantity": 2} for product in products],
+        }
+
+    def test_create_order_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.staff)
+        small = self._order_payload(1, "Small")
+        large = self._order_payload(12, "Large")
+        get_product_index()
+
+        # customer, savepoint, order insert, items insert, 2 customer stats
+        # upserts and the favorite update, 3 sales rollup upserts, release;
+        # products come from the in-process index
+        with self.assertNumQueries(11):
+            response = self.client.post(self.orders_url, small, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(11):
+            response = self.client.post(self.orders_url, large, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.items.count(), 12)
+        self.assertEqual(order.total_amount, sum(2 * (5 + i) for i in range(12)))
+        self.assertEqual(len(response.data['items']), 12)
+
+    def test_order_uses_current_price_and_availability(self):
+        self.client.force_authenticate(user=self.staff)
+        payload = {"customer": self.customer.id, "items": [{"product": self.product1.id, "quantity": 2}]}
+        self.client.post(self.orders_url, payload, format='json')
+
+        self.product1.price = 7
+        self.product1.save()
+        response = self.client.post(self.orders_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("14.00"))
+        self.assertEqual(response.data["items"][0]["product_name"], self.product1.name)
+
+        self.product1.is_available = False
+        self.product1.save()
+        response = self.client.post(self.orders_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_takes_stock(self):
+        self.client.force_authenticate(user=self.staff)
+        self.product1.stock_quantity = 3
+        self.product1.save()
+        payload = {"customer": self.customer.id, "items": [{"product": self.product1.id, "quantity": 2}]}
+        get_product_index()
+
+        # The one extra query is the conditional stock UPDATE.
+        with self.assertNumQueries(12):
+            response = self.client.post(self.orders_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.stock_quantity, 1)
+
+        # The product index still says 3 left; the UPDATE catches the oversell.
+        response = self.client.post(self.orders_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Not enough stock for Margherita", str(response.data["items"]))
+        self.assertEqual(Order.objects.count(), 1)
+
+        payload["items"][0]["quantity"] = 1
+        response = self.client.post(self.orders_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.product1.refresh_from_db()
+        self.assertEqual((self.product1.stock_quantity, self.product1.is_available), (0, False))
+        self.assertFalse(get_product_index().is_available(self.product1.id))
+
+    def test_batch_orders_past_stock_fail_individually(self):
+        self.client.force_authenticate(user=self.staff)
+        self.product1.stock_quantity = 2
+        self.product1.save()
+        order = {"customer": self.customer.id, "items": [{"product": self.product1.id, "quantity": 1}]}
+
+        response = self.client.post(f"{self.orders_url}batch/", {"orders": [order] * 3}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((response.data["created"], response.data["failed"]), (2, 1))
+        self.assertEqual([result["status"] for result in response.data["results"]], ["created", "created", "failed"])
+        self.assertIn("Not enough stock", str(response.data["results"][2]["errors"]))
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.stock_quantity, 0)
+
+    def test_create_order_unknown_product_rejected(self):
+        self.client.force_authenticate(user=self.staff)
+
+        payload = {
+            "customer": self.customer.id,
+            "items": [{"product": 999999, "quantity": 1}]
+        }
+
+        response = self.client.post(self.orders_url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('items', response.data)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_batch_create_orders(self):
+        self.client.force_authenticate(user=self.staff)
+
+        payload = {
+            "orders": [
+                {"customer": self.customer.id, "items": [{"product": self.product1.id, "quantity": 1}]},
+                {"customer": self.customer.id, "items": [{"product": self.product2.id, "quantity": 2}]},
+            ]
+        }
+
+        response = self.client.post(f"{self.orders_url}batch/", payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertEqual(response.data['results'][1]['order']['total_amount'], '30.00')
+
+    def test_batch_reports_partial_failures(self):
+        self.client.force_authenticate(user=self.staff)
+
+        payload = {
+            "orders": [
+                {"customer": self.customer.id, "items": [{"product": self.product1.id, "quantity": 1}]},
+                {"customer": self.customer.id, "items": [{"product": self.unavailable_product.id, "quantity": 1}]},
+                {"customer": 999999, "items": [{"product": self.product1.id, "quantity": 1}]},
+                {"customer": self.customer.id, "items": [{"product": self.product2.id, "quantity": 1}]},
+            ]
+        }
+
+        response = self.client.post(f"{self.orders_url}batch/", payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created', 'failed', 'failed', 'created']
+        )
+        self.assertIn('items', response.data['results'][1]['errors'])
+        self.assertIn('customer', response.data['results'][2]['errors'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_batch_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.staff)
+        order = {"customer": self.customer.id, "items": [
+            {"product": self.product1.id, "quantity": 1},
+            {"product": self.product2.id, "quantity": 1},
+        ]}
+
+        get_product_index()
+
+        # customers, savepoint, orders insert, items insert, 2 customer stats
+        # upserts and the favorite update, 3 sales rollup upserts, release
+        with self.assertNumQueries(11):
+            response = self.client.post(f"{self.orders_url}batch/", {"orders": [order]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(11):
+            response = self.client.post(f"{self.orders_url}batch/", {"orders": [order] * 50}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 51)
+        self.assertEqual(OrderItem.objects.count(), 102)
+
+    def test_batch_rejects_empty_payload(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(f"{self.orders_url}batch/", {"orders": []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_status_update_is_single_statement(self):
+        order = Order.objects.create(customer=self.customer)
+        self.client.force_authenticate(user=self.admin)
+
+        with self.assertNumQueries(1):
+            response = self.client.put(f"/api/orders/{order.id}/status/", {"status": "Preparing"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['order'], {"status": "Preparing"})
+
+    def test_concurrent_status_bump_conflicts(self):
+        order = Order.objects.create(customer=self.customer)
+        self.client.force_authenticate(user=self.admin)
+        url = f"/api/orders/{order.id}/status/"
+
+        first = self.client.put(url, {"status": "Preparing"}, format='json')
+        second = self.client.put(url, {"status": "Preparing"}, format='json')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(second.data['current_status'], "Preparing")
+
+    def test_status_update_unknown_order(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.put("/api/orders/999999/status/", {"status": "Preparing"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_advance_reports_moved_ids(self):
+        new_orders = [Order.objects.create(customer=self.customer) for _ in range(3)]
+        preparing = Order.objects.create(customer=self.customer, status='Preparing')
+        self.client.force_authenticate(user=self.admin)
+        ids = [order.id for order in new_orders] + [preparing.id, 999999]
+
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                f"{self.orders_url}advance/", {"ids": ids, "status": "Preparing"}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], sorted(order.id for order in new_orders))
+        self.assertEqual(response.data['not_updated'], sorted([preparing.id, 999999]))
+        self.assertEqual(Order.objects.filter(status='Preparing').count(), 4)
+
+    def test_bulk_advance_without_update_returning(self):
+        new_order = Order.objects.create(customer=self.customer)
+        ready = Order.objects.create(customer=self.customer, status='Ready')
+
+        with mock.patch('orders.models.supports_update_returning', return_value=False):
+            moved = Order.objects.advance_ids([new_order.id, ready.id], 'Preparing')
+
+        self.assertEqual(moved, [new_order.id])
+        ready.refresh_from_db()
+        self.assertEqual(ready.status, 'Ready')
+
+    def test_staff_cannot_bulk_advance(self):
+        order = Order.objects.create(customer=self.customer)
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(
+            f"{self.orders_url}advance/", {"ids": [order.id], "status": "Preparing"}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class OrderQueryBudgetTest(QueryBudgetMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='staff123', role='staff')
+        customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com",
+            phone="0999999999", address="Damascus"
+        )
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        products = [
+            Product.objects.create(
+                name=f"Pizza {i}", description="Pizza", price=10 + i,
+                category=category, preparation_time=10
+            )
+            for i in range(3)
+        ]
+        for i in range(8):
+            order = Order.objects.create(customer=customer, status='Preparing' if i % 2 else 'New')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price_at_order=product.price)
+                for product in products
+            ])
+        cls.order = order
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.staff)
+
+    def test_list_within_budget(self):
+        response = self.assertWithinQueryBudget(OrderViewSet, 'list', "/api/orders/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+
+    def test_filtered_list_within_budget(self):
+        response = self.assertWithinQueryBudget(OrderViewSet, 'list', "/api/orders/?status=Preparing")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+
+    def test_sparse_list_skips_items(self):
+        # count, page: no items or products prefetch
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/orders/", {"fields": "id,status,total_amount"})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'total_amount'})
+
+    def test_expand_customer(self):
+        manager = User.objects.create_user(username='manager', password='manager123', role='manager')
+        self.client.force_authenticate(user=manager)
+        response = self.client.get(f"/api/orders/{self.order.id}/", {"fields": "id,customer", "expand": "customer"})
+        self.assertEqual(response.data['customer']['email'], "sara@test.com")
+        response = self.client.get(f"/api/orders/{self.order.id}/", {"expand": "customer"})
+        self.assertEqual(response.data['customer']['first_name'], "Sara")
+        self.assertEqual(len(response.data['items']), 3)
+
+    def test_staff_cannot_expand_customer(self):
+        # Staff can't read customers, so they can't page through them via orders either.
+        response = self.client.get("/api/orders/", {"expand": "customer"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(f"/api/orders/{self.order.id}/", {"fields": "id,customer", "expand": "customer"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_retrieve_within_budget(self):
+        response = self.assertWithinQueryBudget(OrderViewSet, 'retrieve', f"/api/orders/{self.order.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['items'][0]['product_name'], "Pizza 0")
+
+    def test_keyset_pagination_walks_all_orders(self):
+        seen = []
+        url = "/api/orders/?cursor=&page_size=3"
+        while url:
+            # orders page + items prefetch, no COUNT(*)
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(order['id'] for order in response.data['results'])
+            last_page = response.data
+            url = response.data['next']
+
+        expected = list(Order.objects.order_by('-order_date', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        previous = self.client.get(last_page['previous'])
+        self.assertEqual([order['id'] for order in previous.data['results']], expected[3:6])
+
+    def test_keyset_page_size_is_capped(self):
+        response = self.client.get("/api/orders/?cursor=&page_size=1000")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor_rejected(self):
+        response = self.client.get("/api/orders/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_accepts_page_size(self):
+        response = self.client.get("/api/orders/?page=2&page_size=3")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 8)
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class OrderEventStreamTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='staff123', role='staff')
+        cls.token = str(RefreshToken.for_user(cls.staff).access_token)
+        cls.customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com",
+            phone="0999999999", address="Damascus"
+        )
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        cls.product = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10,
+            category=category, preparation_time=15
+        )
+
+    async def test_hub_fans_out_to_matching_subscribers(self):
+        event_hub = OrderEventHub(queue_size=10)
+        everything = event_hub.subscribe()
+        kitchen = event_hub.subscribe({'Preparing'})
+        pickup = event_hub.subscribe({'Ready'})
+
+        # Publishers run in worker threads under ASGI.
+        await asyncio.to_thread(event_hub.publish, "order.status", {"id": 1}, {'New', 'Preparing'})
+        await asyncio.sleep(0)
+
+        frame = await asyncio.wait_for(everything.get(), 1)
+        self.assertIn(b'event: order.status', frame)
+        self.assertEqual(await asyncio.wait_for(kitchen.get(), 1), frame)
+        self.assertTrue(pickup.queue.empty())
+
+    async def test_slow_subscriber_is_dropped(self):
+        event_hub = OrderEventHub(queue_size=2)
+        listener = event_hub.subscribe()
+        for i in range(5):
+            event_hub.publish("order.created", {"id": i}, {'New'})
+        await asyncio.sleep(0)
+
+        self.assertIsNotNone(await listener.get())
+        self.assertIsNone(await listener.get())
+
+    async def test_stream_requires_authentication(self):
+        response = await self.async_client.get("/api/orders/stream/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_stream_delivers_events(self):
+        response = await self.async_client.get(
+            "/api/orders/stream/?status=New",
+            headers={"Authorization": f"Bearer {self.token}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        frames = asyncio.Queue()
+
+        async def consume():
+            async for frame in response.streaming_content:
+                await frames.put(frame)
+
+        # A client disconnect cancels the task consuming the stream.
+        listener = asyncio.ensure_future(consume())
+        self.assertTrue((await asyncio.wait_for(frames.get(), 1)).startswith(b'retry:'))
+
+        await asyncio.to_thread(hub.publish, "order.created", {"id": 42}, {'New'})
+        frame = await asyncio.wait_for(frames.get(), 1)
+        self.assertIn(b'data: {"id":42}', frame)
+
+        listener.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await listener
+        self.assertEqual(hub.subscriber_count(), 0)
+
+    async def test_stream_accepts_stream_token(self):
+        # EventSource can't set headers, so browsers pass a short-lived ?token=.
+        response = await self.async_client.post(
+            "/api/orders/stream-token/", headers={"Authorization": f"Bearer {self.token}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = response.json()["token"]
+
+        response = await self.async_client.get(f"/api/orders/stream/?token={token}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        frames = asyncio.Queue()
+
+        async def consume():
+            async for frame in response.streaming_content:
+                await frames.put(frame)
+
+        listener = asyncio.ensure_future(consume())
+        self.assertTrue((await asyncio.wait_for(frames.get(), 1)).startswith(b'retry:'))
+        listener.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await listener
+        self.assertEqual(hub.subscriber_count(), 0)
+
+    async def test_stream_rejects_bad_or_expired_stream_token(self):
+        response = await self.async_client.get(f"/api/orders/stream/?token={self.token}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        token = await sync_to_async(stream_token)(self.staff)
+        with override_settings(ORDER_EVENTS_TOKEN_TTL=-1):
+            response = await self.async_client.get(f"/api/orders/stream/?token={token}")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_order_creation_and_status_change_are_published(self):
+        self.client.force_authenticate(user=self.staff)
+        payload = {"customer": self.customer.id, "items": [{"product": self.product.id, "quantity": 2}]}
+
+        with mock.patch.object(hub, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/orders/", payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+            event, data, statuses = publish.call_args.args
+            self.assertEqual(event, "order.created")
+            self.assertEqual(data["id"], response.data["id"])
+            self.assertEqual(data["items"][0]["product_name"], "Margherita")
+            self.assertEqual(statuses, {'New'})
+
+            admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+            self.client.force_authenticate(user=admin)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(f"/api/orders/{data['id']}/status/", {"status": "Preparing"}, format='json')
+            publish.assert_called_with(
+                "order.status",
+                {"id": data["id"], "status": "Preparing", "previous_status": "New"},
+                {"Preparing", "New"},
+            )
+
+
+class OrderArchiveTest(QueryBudgetMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='staff123', role='staff')
+        cls.customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com",
+            phone="0999999999", address="Damascus"
+        )
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        cls.product = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10,
+            category=category, preparation_time=15
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.staff)
+        self.old_delivered = [self._order('Delivered', days_ago=40) for _ in range(3)]
+        self.recent_delivered = self._order('Delivered', days_ago=1)
+        self.old_pending = self._order('Ready', days_ago=40)
+
+    def _order(self, order_status, days_ago):
+        order = Order.objects.create(customer=self.customer, status=order_status, total_amount=20)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price_at_order=10)
+        Order.objects.filter(pk=order.pk).update(order_date=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_archive_moves_old_delivered_orders_in_batches(self):
+        out = StringIO()
+        call_command('archive_orders', older_than_days=30, batch_size=2, stdout=out)
+
+        archived_ids = {order.id for order in self.old_delivered}
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), archived_ids)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 3)
+        self.assertFalse(Order.objects.filter(id__in=archived_ids).exists())
+        self.assertFalse(OrderItem.objects.filter(order_id__in=archived_ids).exists())
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertIn("Archived 3 orders", out.getvalue())
+
+    def test_archive_respects_max_batches(self):
+        call_command('archive_orders', older_than_days=30, batch_size=1, max_batches=2, stdout=StringIO())
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+
+    def test_retrieve_falls_back_to_archive(self):
+        call_command('archive_orders', older_than_days=30, stdout=StringIO())
+        order = self.old_delivered[0]
+
+        response = self.assertWithinQueryBudget(OrderViewSet, 'retrieve', f"/api/orders/{order.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], order.id)
+        self.assertEqual(response.data['items'][0]['product_name'], "Margherita")
+        self.assertIn('archived_at', response.data)
+
+        response = self.client.get("/api/orders/999999/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_archive_endpoint(self):
+        call_command('archive_orders', older_than_days=30, stdout=StringIO())
+
+        response = self.assertWithinQueryBudget(
+            ArchivedOrderViewSet, 'list', f"/api/orders/archive/?customer={self.customer.id}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+
+        response = self.client.get("/api/orders/")
+        self.assertEqual(response.data['count'], 2)
+
+
+class IdempotencyKeyTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='admin123', role='admin')
+        cls.customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com",
+            phone="0999999999", address="Damascus"
+        )
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        cls.product = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10,
+            category=category, preparation_time=15
+        )
+
+    def setUp(self):
+        store.clear()
+        self.client.force_authenticate(user=self.admin)
+        self.payload = {"customer": self.customer.id, "items": [{"product": self.product.id, "quantity": 1}]}
+
+    def test_retried_create_returns_original_response(self):
+        headers = {"Idempotency-Key": "terminal-7-0001"}
+        first = self.client.post("/api/orders/", self.payload, format='json', headers=headers)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(0):
+            retry = self.client.post("/api/orders/", self.payload, format='json', headers=headers)
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_other_payload_rejected(self):
+        headers = {"Idempotency-Key": "terminal-7-0002"}
+        self.client.post("/api/orders/", self.payload, format='json', headers=headers)
+        other = dict(self.payload, notes="No onions")
+
+        response = self.client.post("/api/orders/", other, format='json', headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_is_not_stored(self):
+        headers = {"Idempotency-Key": "terminal-7-0003"}
+        invalid = {"customer": self.customer.id, "items": [{"product": 999999, "quantity": 1}]}
+        self.assertEqual(
+            self.client.post("/api/orders/", invalid, format='json', headers=headers).status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+        self.assertEqual(len(store), 0)
+
+    def test_status_and_batch_endpoints_are_idempotent(self):
+        order = Order.objects.create(customer=self.customer)
+        headers = {"Idempotency-Key": "expo-1"}
+        url = f"/api/orders/{order.id}/status/"
+        first = self.client.put(url, {"status": "Preparing"}, format='json', headers=headers)
+        retry = self.client.put(url, {"status": "Preparing"}, format='json', headers=headers)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+
+        headers = {"Idempotency-Key": "terminal-7-batch-1"}
+        batch = {"orders": [self.payload, self.payload]}
+        self.client.post("/api/orders/batch/", batch, format='json', headers=headers)
+        self.client.post("/api/orders/batch/", batch, format='json', headers=headers)
+        self.assertEqual(Order.objects.count(), 3)
+
+
+class IdempotencyStoreTest(SimpleTestCase):
+
+    def test_concurrent_duplicates_wait_for_first_request(self):
+        idempotency = IdempotencyStore(max_entries=10, ttl=60, wait_timeout=5)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def handler():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return Response({"id": 1}, status=201)
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(idempotency.run('k', 'f', handler)))
+        first.start()
+        started.wait(5)
+        duplicate = threading.Thread(target=lambda: results.append(idempotency.run('k', 'f', handler)))
+        duplicate.start()
+        release.set()
+        first.join(5)
+        duplicate.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(replayed for _, replayed in results), [False, True])
+        self.assertTrue(all(response.data == {"id": 1} for response, _ in results))
+
+    def test_entries_expire_and_are_bounded(self):
+        now = [0]
+        idempotency = IdempotencyStore(max_entries=2, ttl=10, wait_timeout=1, clock=lambda: now[0])
+
+        def handler():
+            return Response({}, status=200)
+
+        for key in ('a', 'b', 'c'):
+            idempotency.run(key, 'f', handler)
+        self.assertEqual(len(idempotency), 2)
+        self.assertFalse(idempotency.run('a', 'f', handler)[1])
+
+        now[0] = 11
+        self.assertFalse(idempotency.run('b', 'f', handler)[1])
+        self.assertEqual(len(idempotency), 1)
+
+
+class GroupCommitWriterTest(SimpleTestCase):
+
+    def test_concurrent_orders_share_one_commit(self):
+        commits = []
+
+        def commit(orders_data):
+            commits.append(list(orders_data))
+            return [f"order-{data}" for data in orders_data]
+
+        group = GroupCommitWriter(max_batch=10, max_wait=0.5, commit=commit)
+        results = {}
+        threads = [
+            threading.Thread(target=lambda n=n: results.__setitem__(n, group.submit(n, timeout=5)))
+            for n in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        group.stop()
+
+        self.assertEqual(results, {n: f"order-{n}" for n in range(5)})
+        self.assertLess(len(commits), 5)
+        self.assertEqual(sorted(n for batch in commits for n in batch), list(range(5)))
+
+    def test_failed_group_only_fails_the_bad_order(self):
+        def commit(orders_data):
+            if "bad" in orders_data:
+                raise ValueError("bad order")
+            return orders_data
+
+        group = GroupCommitWriter(max_batch=10, max_wait=0.5, commit=commit)
+        outcomes = {}
+
+        def submit(data):
+            try:
+                outcomes[data] = group.submit(data, timeout=5)
+            except ValueError as exc:
+                outcomes[data] = exc
+
+        threads = [threading.Thread(target=submit, args=(data,)) for data in ("a", "bad", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        group.stop()
+
+        self.assertEqual(outcomes["a"], "a")
+        self.assertEqual(outcomes["b"], "b")
+        self.assertIsInstance(outcomes["bad"], ValueError)
+
+    def test_timed_out_order_is_never_written(self):
+        release = threading.Event()
+        commits = []
+
+        def commit(orders_data):
+            release.wait(5)
+            commits.append(list(orders_data))
+            return orders_data
+
+        group = GroupCommitWriter(max_batch=1, max_wait=0, commit=commit)
+        first = threading.Thread(target=group.submit, args=("a",), kwargs={"timeout": 5})
+        first.start()
+        # "b" queues behind the stuck group, gives up, and must not be written later.
+        with self.assertRaises(TimeoutError):
+            group.submit("b", timeout=0.1)
+        release.set()
+        first.join(5)
+        group.stop()
+
+        self.assertEqual(commits, [["a"]])
+
+    def test_order_already_being_written_is_waited_for(self):
+        def commit(orders_data):
+            time.sleep(0.3)
+            return orders_data
+
+        group = GroupCommitWriter(max_batch=1, max_wait=0, commit=commit)
+        # The writer took it before the timeout, so it may commit; the request must not give up.
+        self.assertEqual(group.submit("a", timeout=0.1), "a")
+        group.stop()
+
+
+class GroupCommitIntakeTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='staff', password='staff123', role='staff')
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com",
+            phone="0999999999", address="Damascus"
+        )
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        self.product = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10,
+            category=category, preparation_time=15
+        )
+
+    @override_settings(ORDER_INTAKE_MODE='group_commit')
+    def test_create_goes_through_writer(self):
+        # The writer thread has its own connection, which can't see this test's
+        # transaction, so commit on the request thread instead.
+        with mock.patch.object(writer, 'submit', side_effect=lambda data, timeout: create_orders([data])[0]) as submit:
+            response = self.client.post("/api/orders/", {
+                "customer": self.customer.id,
+                "items": [{"product": self.product.id, "quantity": 2}]
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        submit.assert_called_once()
+        self.assertEqual(response.data["id"], Order.objects.get().id)
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("20.00"))
+
+    @override_settings(ORDER_INTAKE_MODE='group_commit')
+    def test_timed_out_create_is_503_and_retryable(self):
+        store.clear()
+        payload = {"customer": self.customer.id, "items": [{"product": self.product.id, "quantity": 2}]}
+        with mock.patch.object(writer, 'submit', side_effect=TimeoutError):
+            response = self.client.post("/api/orders/", payload, format='json', headers={"Idempotency-Key": "k1"})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # The timed-out order was dropped, so the retry with the same key places it once.
+        with mock.patch.object(writer, 'submit', side_effect=lambda data, timeout: create_orders([data])[0]):
+            response = self.client.post("/api/orders/", payload, format='json', headers={"Idempotency-Key": "k1"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class StockContentionTest(TransactionTestCase):
+
+    def test_concurrent_orders_never_oversell(self):
+        customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com",
+            phone="0999999999", address="Damascus"
+        )
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        product = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10,
+            category=category, preparation_time=15, stock_quantity=20
+        )
+        order_data = {"customer": customer, "items": [{"product": product, "quantity": 1}]}
+        created = []
+        rejected = []
+
+        def worker():
+            try:
+                for _ in range(5):
+                    while True:
+                        try:
+                            created.extend(create_orders([order_data]))
+                        except OutOfStock:
+                            rejected.append(1)
+                        except OperationalError:
+                            # The shared in-memory test database locks whole tables.
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual((len(created), len(rejected)), (20, 20))
+        self.assertEqual((product.stock_quantity, product.is_available), (0, False))
+        self.assertEqual(OrderItem.objects.count(), 20)
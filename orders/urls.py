@@ -1,9 +1,12 @@
 from django.urls import path ,include
 from rest_framework.routers import DefaultRouter
-from orders.views import OrderViewSet
+from orders.views import ArchivedOrderViewSet, OrderViewSet, order_event_stream
 
 router = DefaultRouter()
+# Registered first so 'archive/' isn't read as an order id.
+router.register(r'archive', ArchivedOrderViewSet, basename='archived-order')
 router.register(r'', OrderViewSet)
 urlpatterns = [
+    path('stream/', order_event_stream, name='order-stream'),
     path('', include(router.urls)),
 ]
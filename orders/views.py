@@ -1,25 +1,57 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotFound, ValidationError
 from rest_framework.response import Response
-from orders.models import Order
-from orders.serializers import OrderSerializer, OrderStatusSerializer
+from customers.models import Customer
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from orders.serializers import (
+    ArchivedOrderSerializer, OrderAdvanceSerializer, OrderBatchSerializer, OrderSerializer,
+    OrderStatusSerializer,
+    collect_customer_ids,
+)
+from orders.events import hub, stream_token, stream_token_user
+from orders.idempotency import idempotency_key_parameter, idempotent
+from orders.services import create_orders
+from orders.signals import order_status_changed
+from orders.writer import writer
+from products.models import OutOfStock
+from restaurant.fieldsets import SparseFieldsetMixin, fieldset_parameters
+from restaurant.pagination import KeysetPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from users.permissions import IsAdmin, IsManager, IsStaff, IsAdminOrManager
+from django.db.models import Prefetch
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, extend_schema_view
 
+
+class OrderIntakeUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The order could not be written in time and was not placed. Try again."
+    default_code = 'order_intake_timeout'
+
+
 @extend_schema_view(
     list=extend_schema(
         summary="List all orders",
         description="Retrieve a list of all orders of all customers.",
+        parameters=fieldset_parameters,
         responses={200: OrderSerializer(many=True)},
     ),
     retrieve=extend_schema(
         summary="Get order details",
-        description="Retrieve details of a specific order by ID.",
+        description="Retrieve details of a specific order by ID, including archived orders.",
+        parameters=fieldset_parameters,
     ),
     create=extend_schema(
         summary="Create a new order",
         description="Make a new order with delicious products that our restaurant offers.",
+        parameters=[idempotency_key_parameter],
     ),
     update=extend_schema(
         summary="Update an order",
@@ -31,28 +63,299 @@ from drf_spectacular.utils import extend_schema, extend_schema_view
     ),
 )
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by('-order_date')
+class OrderViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    ).order_by('-order_date', '-id')
     serializer_class = OrderSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-order_date', '-id')
     filterset_fields = ['customer', 'status']
     permission_classes = [IsAuthenticated]
     http_method_names = ['get', 'post', 'put']
+    query_budget = {'list': 3, 'retrieve': 3}
+    sparse_prefetches = {
+        'items': Prefetch('items', queryset=OrderItem.objects.select_related('product')),
+    }
+    # Same roles that may read customers (see CustomerViewSet).
+    expand_permissions = {'customer': [IsAdminOrManager]}
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        try:
+            if settings.ORDER_INTAKE_MODE == 'group_commit':
+                serializer.instance = writer.submit(
+                    serializer.validated_data, timeout=settings.ORDER_GROUP_COMMIT_TIMEOUT
+                )
+            else:
+                serializer.save()
+        except OutOfStock as exc:
+            raise ValidationError({"items": [str(exc)]})
+        except TimeoutError:
+            raise OrderIntakeUnavailable()
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            # Old delivered orders live in the archive tables.
+            archived = ArchivedOrderViewSet.queryset.filter(pk=self._order_pk(kwargs['pk'])).first()
+            if archived is None:
+                raise
+            return Response(ArchivedOrderSerializer(archived).data)
+
+    @extend_schema(
+        summary="Create orders in batch",
+        description=(
+            "Validate and insert many orders in one request. Orders are validated "
+            "independently; valid ones are created even if others fail (including "
+            "running out of stock part-way), and every entry of `results` reports "
+            "the outcome for the order at that index."
+        ),
+        request=OrderBatchSerializer,
+        parameters=[idempotency_key_parameter],
+    )
+    @action(detail=False, methods=['post'], url_path='batch')
+    @idempotent
+    def batch(self, request):
+        batch = OrderBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        orders_data = batch.validated_data['orders']
+
+        # One lookup for all customers of the batch; products come from the product index.
+        context = self.get_serializer_context()
+        context['customers'] = Customer.objects.in_bulk(collect_customer_ids(orders_data))
+        serializer = self.get_serializer(context=context)
+
+        results = []
+        valid = []
+        for index, data in enumerate(orders_data):
+            try:
+                valid.append((index, serializer.run_validation(data)))
+            except ValidationError as exc:
+                results.append({"index": index, "status": "failed", "errors": exc.detail})
 
+        try:
+            orders = create_orders([data for _, data in valid])
+        except OutOfStock:
+            # Not enough stock for the whole batch: write the orders one at a
+            # time, so those placed before stock ran out still go through.
+            orders, written = [], []
+            for index, data in valid:
+                try:
+                    orders.extend(create_orders([data]))
+                except OutOfStock as exc:
+                    results.append({"index": index, "status": "failed", "errors": {"items": [str(exc)]}})
+                else:
+                    written.append((index, data))
+            valid = written
+        created = OrderSerializer(orders, many=True, context=context).data
+        for (index, _), order in zip(valid, created):
+            results.append({"index": index, "status": "created", "order": order})
+        results.sort(key=lambda result: result["index"])
+
+        if not valid:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(valid) < len(orders_data):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(
+            {
+                "created": len(valid),
+                "failed": len(orders_data) - len(valid),
+                "results": results,
+            },
+            status=response_status
+        )
+
+    @extend_schema(parameters=[idempotency_key_parameter])
     @action(
         detail=True,
         methods=['put'],
         permission_classes=[IsAdminOrManager],
         url_path='status'
     )
+    @idempotent
     def status(self, request, pk=None):
-        order = self.get_object()
-        serializer = OrderStatusSerializer(order, data=request.data)
+        serializer = OrderStatusSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        new_status = serializer.validated_data['status']
+        previous = Order.previous_status(new_status)
+        order_pk = self._order_pk(pk)
+        orders = Order.objects.filter(pk=order_pk)
+
+        # Compare-and-set: only moves the order if it still sits one step before.
+        if previous is not None and orders.advance(new_status):
+            order_status_changed.send(
+                sender=Order, order_ids=[order_pk], status=new_status, previous=previous
+            )
+            return Response(
+                {
+                    "message": "Order status updated successfully",
+                    "order": serializer.data
+                },
+                status=status.HTTP_200_OK
+            )
+
+        current = orders.values_list('status', flat=True).first()
+        if current is None:
+            raise NotFound()
+        if Order.STATUS_FLOW.index(current) >= Order.STATUS_FLOW.index(new_status):
+            return Response(
+                {
+                    "status": [f"Order is already {current}"],
+                    "current_status": current
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        raise ValidationError({"status": [f"Status must progress step by step: {current} → {new_status}"]})
+
+    @extend_schema(
+        summary="Advance many orders",
+        description=(
+            "Move every listed order that is one step before `status` to it in a single "
+            "statement, e.g. mark a whole station Ready. `updated` lists the ids that moved; "
+            "the others were in a different status."
+        ),
+        request=OrderAdvanceSerializer,
+        parameters=[idempotency_key_parameter],
+    )
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[IsAdminOrManager],
+        url_path='advance'
+    )
+    @idempotent
+    def advance(self, request):
+        serializer = OrderAdvanceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        new_status = serializer.validated_data['status']
+
+        moved = Order.objects.advance_ids(ids, new_status)
+        if moved:
+            order_status_changed.send(
+                sender=Order, order_ids=moved, status=new_status,
+                previous=Order.previous_status(new_status)
+            )
+        moved_set = set(moved)
         return Response(
             {
-                "message": "Order status updated successfully",
-                "order": serializer.data
+                "status": new_status,
+                "updated": moved,
+                "not_updated": sorted(set(ids) - moved_set),
             },
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+    @extend_schema(
+        summary="Get an order stream token",
+        description=(
+            "Short-lived token for `GET /api/orders/stream/?token=`, for browser screens using "
+            "`EventSource`, which can't send an Authorization header. Valid for `expires_in` "
+            "seconds to open a connection; fetch a new one before reconnecting after that."
+        ),
+        request=None,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=['post'], url_path='stream-token')
+    def stream_token(self, request):
+        return Response({"token": stream_token(request.user), "expires_in": settings.ORDER_EVENTS_TOKEN_TTL})
+
+    @staticmethod
+    def _order_pk(pk):
+        try:
+            return int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+
+
+@extend_schema_view(
+    list=extend_schema(
+        summary="List archived orders",
+        description="Delivered orders moved out of the live tables, newest first.",
+    ),
+    retrieve=extend_schema(
+        summary="Get archived order details",
+        description="Retrieve an archived order by ID.",
+    ),
+)
+class ArchivedOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ArchivedOrder.objects.prefetch_related(
+        Prefetch('items', queryset=ArchivedOrderItem.objects.select_related('product'))
+    ).order_by('-order_date', '-id')
+    serializer_class = ArchivedOrderSerializer
+    filterset_fields = {'customer': ['exact'], 'order_date': ['gte', 'lt']}
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-order_date', '-id')
+    # list: customer filter lookup, count, page, items
+    query_budget = {'list': 4, 'retrieve': 2}
+
+
+async def order_event_stream(request):
+    """
+    Server-sent events stream of order creations and status changes.
+
+    ``?status=Preparing,Ready`` limits the stream to events entering or leaving
+    those statuses. Requires a JWT in the Authorization header, or (for
+    EventSource, which can't set headers) ``?token=`` from
+    ``POST /api/orders/stream-token/``, and an ASGI server (see
+    restaurant/asgi.py); every listener is a coroutine waiting on its queue, so
+    idle screens don't hold a thread.
+    """
+    if request.GET.get('token'):
+        if await sync_to_async(stream_token_user)(request.GET['token']) is None:
+            return JsonResponse(
+                {"detail": "Stream token is invalid or expired."},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        authenticated = True
+    else:
+        try:
+            authenticated = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as exc:
+            return JsonResponse({"detail": exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+    if authenticated is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    statuses = None
+    if request.GET.get('status'):
+        statuses = set(request.GET['status'].split(','))
+        allowed = {choice for choice, _ in Order.STATUS_CHOICES}
+        if not statuses <= allowed:
+            return JsonResponse(
+                {"status": f"Status must be one of {sorted(allowed)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    subscription = hub.subscribe(statuses)
+
+    async def stream():
+        try:
+            yield f"retry: {settings.ORDER_EVENTS_RETRY_MS}\n\n".encode()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(
+                        subscription.get(), timeout=settings.ORDER_EVENTS_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    frame = b": keep-alive\n\n"
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
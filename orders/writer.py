@@ -0,0 +1,117 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from orders.services import create_orders
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Single background thread that writes validated orders in groups.
+
+    Request threads ``submit()`` an order and block until the transaction
+    holding it commits. The writer takes the first queued order, keeps
+    collecting until it has ``max_batch`` orders or ``max_wait`` seconds have
+    passed, and inserts them all with one ``create_orders`` call, so SQLite
+    sees one writer and one commit per group instead of one per request.
+
+    If a group fails, its orders are retried one by one so a bad order only
+    fails its own request. An order whose request gave up waiting is dropped
+    before its group is written.
+    """
+
+    def __init__(self, max_batch, max_wait, commit=create_orders):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.commit = commit
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, order_data, timeout=None):
+        """
+        Queue one validated order and return it once its group has committed.
+        Raises ``TimeoutError`` if it wasn't written within ``timeout`` seconds,
+        in which case it never will be.
+        """
+        future = Future()
+        self._ensure_started()
+        self._queue.put((order_data, future))
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise
+            # The writer already took it, so it may commit: wait for the outcome.
+            return future.result()
+
+    def stop(self):
+        """Write what is already queued, then stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='order-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                batch, stop = self._collect()
+                batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+                if batch:
+                    self._write(batch)
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _write(self, batch):
+        close_old_connections()
+        try:
+            orders = self.commit([order_data for order_data, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                batch[0][1].set_exception(exc)
+                return
+            for entry in batch:
+                self._write([entry])
+            return
+        for (_, future), order in zip(batch, orders):
+            future.set_result(order)
+
+
+writer = GroupCommitWriter(
+    max_batch=settings.ORDER_GROUP_COMMIT_MAX_BATCH,
+    max_wait=settings.ORDER_GROUP_COMMIT_MAX_WAIT,
+)
+atexit.register(writer.stop)
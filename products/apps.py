@@ -2,4 +2,25 @@ from django.apps import AppConfig
 
 
 class ProductsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.models.signals import post_delete, post_save
+        from products import search
+        from products.cache import check_version_cache, invalidate_menu
+        from products.models import Category, Product
+        from restaurant.softdelete import soft_deleted
+
+        checks.register(check_version_cache, checks.Tags.caches)
+        for model in (Category, Product):
+            post_save.connect(invalidate_menu, sender=model, dispatch_uid=f'menu-cache-save-{model.__name__}')
+            post_delete.connect(invalidate_menu, sender=model, dispatch_uid=f'menu-cache-delete-{model.__name__}')
+            soft_deleted.connect(invalidate_menu, sender=model, dispatch_uid=f'menu-cache-soft-delete-{model.__name__}')
+
+        # Soft-deleting a category soft-deletes its products, which removes their index rows.
+        post_save.connect(search.sync_product, sender=Product, dispatch_uid='product-search-save')
+        post_delete.connect(search.unindex_product, sender=Product, dispatch_uid='product-search-delete')
+        soft_deleted.connect(search.unindex_deleted, sender=Product, dispatch_uid='product-search-soft-delete')
+        post_save.connect(search.sync_category, sender=Category, dispatch_uid='product-search-category')
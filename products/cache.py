@@ -0,0 +1,151 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache, caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'menu:version'
+VERSION_CACHE = 'versions'
+# Backends whose entries only the writing process can see.
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+class MenuCache:
+    """
+    Serialized menu responses, invalidated by bumping a single version number.
+
+    Every product or category write bumps the version, which changes both the
+    cache keys and the ETags of all menu responses at once. Stock counts are
+    kept out of cached responses (see ``MenuProductSerializer``), so orders
+    only bump the version when a product sells out.
+
+    Responses may be cached per process, but the version lives in the
+    ``versions`` cache, which every worker process must share (see
+    ``check_version_cache``): a process that missed a bump would keep serving
+    the old menu and pricing orders from its old product index. The hit/miss
+    counters are per process.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def version(self):
+        versions = caches[VERSION_CACHE]
+        version = versions.get(VERSION_KEY)
+        if version is None:
+            # Start from the clock so ETags handed out before a cache restart
+            # can't match a later version.
+            versions.add(VERSION_KEY, time.time_ns(), timeout=None)
+            version = versions.get(VERSION_KEY)
+        return version
+
+    def bump(self):
+        # A new clock value rather than incr(), which shared backends like
+        # FileBasedCache don't do atomically: two processes bumping at once
+        # both leave a version no earlier response was cached under.
+        caches[VERSION_CACHE].set(VERSION_KEY, max(time.time_ns(), self.version() + 1), timeout=None)
+
+    def bump_on_commit(self):
+        # Bump now so reads inside this transaction miss, and again after commit
+        # so nothing cached from the pre-commit state survives.
+        self.bump()
+        transaction.on_commit(self.bump)
+
+    def etag(self, version, request):
+        url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()[:16]
+        return f'"{version}-{url}"'
+
+    def key(self, version, request):
+        # Absolute URI: paginated responses embed absolute next/previous links.
+        return f'menu:{version}:{request.build_absolute_uri()}'
+
+    def record(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        served = stats['hits'] + stats['misses'] + stats['not_modified']
+        stats['hit_ratio'] = round((stats['hits'] + stats['not_modified']) / served, 4) if served else None
+        stats['version'] = self.version()
+        return stats
+
+
+menu_cache = MenuCache(timeout=settings.MENU_CACHE_TIMEOUT)
+
+
+def check_version_cache(app_configs, **kwargs):
+    """Refuse to start with menu versions in a cache only one process can see."""
+    backend = settings.CACHES.get(VERSION_CACHE, {}).get('BACKEND')
+    if backend is None:
+        return [checks.Error(
+            f"CACHES has no '{VERSION_CACHE}' alias for the menu version.",
+            hint="Point it at a cache every worker shares (FileBasedCache on one host, Redis or Memcached).",
+            id='products.E001',
+        )]
+    if backend in PROCESS_LOCAL_BACKENDS:
+        return [checks.Error(
+            f"CACHES['{VERSION_CACHE}'] uses {backend.rsplit('.', 1)[-1]}, which other worker processes "
+            "can't see, so they would keep serving stale menus and prices.",
+            hint="Use FileBasedCache (workers on one host), Redis or Memcached.",
+            id='products.E002',
+        )]
+    return []
+
+
+def invalidate_menu(sender, **kwargs):
+    menu_cache.bump_on_commit()
+
+
+def menu_cached(view_method):
+    """
+    Serve a read-only menu view from ``menu_cache`` with an ETag.
+
+    A request whose ``If-None-Match`` matches the current ETag gets 304
+    without touching the database; otherwise the serialized data is served
+    from the cache, or rendered and stored on a miss.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        version = menu_cache.version()
+        etag = menu_cache.etag(version, request)
+        if etag in _parse_etags(request.headers.get('If-None-Match', '')):
+            menu_cache.record('not_modified')
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = menu_cache.key(version, request)
+            data = cache.get(key)
+            if data is None:
+                menu_cache.record('misses')
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, menu_cache.timeout)
+            else:
+                menu_cache.record('hits')
+                response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
+
+
+def _parse_etags(header):
+    return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
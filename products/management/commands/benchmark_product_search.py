@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework import filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.models import Category, Product
+from products.search import ProductSearchFilter, rebuild_index
+from products.views import ProductViewSet
+from restaurant.db import scratch_database
+
+DISHES = (
+    'margherita pepperoni hawaiian veggie chicken beef lamb falafel shawarma halloumi '
+    'spicy smoky garlic lemon mint basil cheese truffle mushroom olive tomato pesto '
+    'crispy grilled roasted fried wrap burger salad soup pizza pasta rice bowl plate'
+).split()
+SYLLABLES = 'ba ka ma ra sa ta la na da fa ri ki mi lo to so zu ne ve shi'.split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare typeahead search latency of the FTS5 product index against "
+        "SearchFilter's icontains lookup, on a synthetic catalog in a scratch SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Catalog size.')
+        parser.add_argument('--queries', type=int, default=200, help='Searches per backend.')
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        # A few thousand made-up words (brands, dish names) next to common dish words.
+        vocabulary = sorted({
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(5000)
+        })
+        with scratch_database():
+            self._seed(options['products'], rng, vocabulary)
+            # Typeahead prefixes: what a kiosk sends after 3-6 keystrokes of one or two words.
+            terms = []
+            for _ in range(options['queries']):
+                words = [rng.choice(vocabulary)] + rng.sample(DISHES, rng.choice((0, 1)))
+                words[-1] = words[-1][:rng.randint(3, 6)]
+                terms.append(' '.join(words))
+
+            view = ProductViewSet()
+            queryset = Product.objects.select_related('category').order_by('id')
+            page = options['page_size']
+            for label, backend in (('SearchFilter (icontains)', filters.SearchFilter()),
+                                   ('FTS5 index', ProductSearchFilter())):
+                latencies = []
+                # First pass warms the page cache for this backend's tables; time the second.
+                for term in terms + terms:
+                    request = Request(APIRequestFactory().get('/', {'search': term}))
+                    started = time.perf_counter()
+                    results = backend.filter_queryset(request, queryset, view)
+                    # What a page-number list request runs: COUNT(*) and the first page.
+                    results.count()
+                    list(results[:page])
+                    latencies.append(time.perf_counter() - started)
+                latencies = sorted(latencies[len(terms):])
+                self.stdout.write(
+                    f"{label}: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                    f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms"
+                )
+
+    def _seed(self, count, rng, vocabulary):
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {index}', description='Synthetic') for index in range(50)
+        ])
+        batch = []
+        for index in range(count):
+            name = ' '.join(rng.sample(vocabulary, 2) + rng.sample(DISHES, 1))
+            description = ' '.join(rng.sample(vocabulary, 4) + rng.sample(DISHES, 4))
+            batch.append(Product(
+                name=f'{name} {index}', description=description,
+                price=Decimal(rng.randint(300, 3000)) / 100, category=rng.choice(categories),
+                preparation_time=rng.randint(1, 30),
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        rebuild_index()
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.recommendations import count_new_orders, rank_neighbours, reset_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Count product pairs in orders placed since the last run and rebuild each product's "
+        "frequently-bought-together recommendations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help="Order ids counted per transaction (default: 5000)."
+        )
+        parser.add_argument(
+            '--top-k', type=int, default=settings.PRODUCT_RECOMMENDATIONS_TOP_K,
+            help="Recommendations stored per product (default: PRODUCT_RECOMMENDATIONS_TOP_K)."
+        )
+        parser.add_argument(
+            '--min-orders', type=int, default=settings.PRODUCT_RECOMMENDATIONS_MIN_ORDERS,
+            help="Orders a pair must appear in (default: PRODUCT_RECOMMENDATIONS_MIN_ORDERS)."
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Discard the counts and count the whole order history again."
+        )
+
+    def handle(self, *args, **options):
+        if options['full']:
+            reset_counts()
+        counted = count_new_orders(chunk_size=options['chunk_size'], stdout=self.stdout)
+        stored = rank_neighbours(options['top_k'], options['min_orders'])
+        self.stdout.write(self.style.SUCCESS(f"Counted {counted} new orders, stored {stored} recommendations"))
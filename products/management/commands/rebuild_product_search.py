@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.cache import menu_cache
+from products.search import rebuild_index, search_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text product search index from the product table, e.g. after "
+        "bulk imports or updates that bypassed Product.save()."
+    )
+
+    def handle(self, *args, **options):
+        if not search_enabled():
+            raise CommandError("The product search index is only available on SQLite.")
+        with transaction.atomic():
+            indexed = rebuild_index()
+            # Cached search responses may predate the rebuild.
+            menu_cache.bump_on_commit()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} products"))
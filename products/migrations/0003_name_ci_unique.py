@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:20
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alter_category_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='category_name_ci_unique', violation_error_message='Category with this name already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), models.F('category'), name='product_name_category_ci_unique', violation_error_message='Product with this name already exists in this category.'),
+        ),
+    ]
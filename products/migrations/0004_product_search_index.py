@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; elsewhere product search keeps using icontains lookups.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE products_product_search USING fts5("
+        "name, description, category, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    # Rank matches by bm25 with weights for name, description and category.
+    schema_editor.execute(
+        "INSERT INTO products_product_search (products_product_search, rank) "
+        "VALUES ('rank', 'bm25(10.0, 1.0, 4.0)')"
+    )
+    schema_editor.execute(
+        "INSERT INTO products_product_search (rowid, name, description, category) "
+        "SELECT p.id, p.name, p.description, c.name "
+        "FROM products_product p JOIN products_category c ON c.id = p.category_id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE products_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_name_ci_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_current_prices(apps, schema_editor):
+    # Earlier prices are only known from orders; history starts with today's menu.
+    Product = apps.get_model('products', 'Product')
+    ProductPrice = apps.get_model('products', 'ProductPrice')
+    now = django.utils.timezone.now()
+    ProductPrice.objects.bulk_create(
+        (ProductPrice(product_id=pk, price=price, effective_from=now)
+         for pk, price in Product.objects.values_list('pk', 'price').iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_stock_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='products.product')),
+            ],
+            options={
+                'ordering': ['-effective_from', '-id'],
+                'indexes': [models.Index(fields=['product', '-effective_from'], name='product_price_at_idx')],
+            },
+        ),
+        migrations.RunPython(record_current_prices, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,49 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce, Greatest, Lower, Round
+from django.utils import timezone
 from django.core.exceptions import ValidationError
+from restaurant.db import supports_update_returning
+from restaurant.softdelete import LIVE, LiveManager, SoftDeleteModel, SoftDeleteQuerySet, dead_index, live_index
+
+
+class CategoryQuerySet(SoftDeleteQuerySet):
+
+    def delete(self, when=None):
+        """
+        Soft-delete the categories and all their products: two UPDATEs,
+        however many products there are.
+        """
+        when = when or timezone.now()
+        with transaction.atomic():
+            products, _ = Product.objects.filter(category__in=self.values('pk')).delete(when=when)
+            count, _ = super().delete(when=when)
+        return count + products, {self.model._meta.label: count, Product._meta.label: products}
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 # Create your models here.
-class Category(models.Model):
+class Category(SoftDeleteModel):
     name = models.CharField(max_length=100)
     description = models.TextField()
     is_active = models.BooleanField(default=True)
 
+    objects = LiveManager.from_queryset(CategoryQuerySet)()
+
     class Meta:
         ordering = ['id']
+        constraints = [
+            # Live rows only: a deleted category's name can be used again.
+            models.UniqueConstraint(
+                Lower('name'), name='category_name_ci_unique', condition=LIVE,
+                violation_error_message="Category with this name already exists.",
+            ),
+        ]
+        indexes = [dead_index('category_deleted_idx')]
 
     def __str__(self):
         return self.name
@@ -16,25 +51,187 @@ class Category(models.Model):
     def clean(self):
         if not self.name.strip():
             raise ValidationError("Category name cannot be empty.")
-        if Category.objects.exclude(pk=self.pk).filter(name__iexact=self.name).exists():
-            raise ValidationError("Category with this name already exists.")
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
+    def save(self, *args, validate=True, **kwargs):
+        # validate=False for callers that already ran full_clean() or write trusted data.
+        if validate:
+            self.full_clean()
         super().save(*args, **kwargs)
 
 
 
-class Product(models.Model):
+class OutOfStock(Exception):
+    """Raised when an order asks for more units than a product has left."""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(f"Not enough stock for {', '.join(products)}")
+
+
+class ProductPriceQuerySet(models.QuerySet):
+
+    def in_effect(self, product_id, when):
+        """The entry whose price applied at ``when``, or None if there was none yet."""
+        return (
+            self.filter(product_id=product_id, effective_from__lte=when)
+            .order_by('-effective_from', '-id').first()
+        )
+
+
+class ProductQuerySet(SoftDeleteQuerySet):
+
+    def take_stock(self, quantities):
+        """
+        Take ``{product_id: quantity}`` units from stock-tracked products with
+        one conditional UPDATE::
+
+            UPDATE ... SET stock_quantity = stock_quantity - :qty,
+                           is_available = CASE WHEN stock_quantity = :qty THEN false ...
+            WHERE id IN (...) AND stock_quantity >= :qty
+
+        Two concurrent orders can't both take the last unit: the second one
+        re-checks ``stock_quantity >= :qty`` against the row the first one
+        wrote. Raises ``OutOfStock`` if a product is short, so the caller's
+        transaction rolls back; returns the ids of products that sold out.
+        Products whose stock turns out not to be tracked are skipped.
+        """
+        if not quantities:
+            return []
+        needed = Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=models.IntegerField(),
+        )
+        changes = {
+            'stock_quantity': F('stock_quantity') - needed,
+            'is_available': Case(When(stock_quantity=needed, then=Value(False)), default=F('is_available')),
+        }
+
+        if not supports_update_returning():
+            with transaction.atomic():
+                stocks = self.select_for_update().filter(pk__in=quantities, stock_quantity__isnull=False)
+                stocks = {pk: (name, stock) for pk, name, stock in stocks.values_list('pk', 'name', 'stock_quantity')}
+                short = [name for pk, (name, stock) in stocks.items() if stock < quantities[pk]]
+                if short:
+                    raise OutOfStock(short)
+                self.filter(pk__in=stocks).update(**changes)
+            return [pk for pk, (name, stock) in stocks.items() if stock == quantities[pk]]
+
+        sql, params = _update_sql(self.filter(pk__in=quantities, stock_quantity__gte=needed), changes)
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(f"{sql} RETURNING {quote('id')}, {quote('stock_quantity')}", params)
+            rows = cursor.fetchall()
+
+        if len(rows) < len(quantities):
+            missed = set(quantities) - {pk for pk, stock in rows}
+            short = [
+                name for pk, name, stock in self.filter(pk__in=missed, stock_quantity__isnull=False)
+                .values_list('pk', 'name', 'stock_quantity')
+                if stock < quantities[pk]
+            ]
+            if short:
+                raise OutOfStock(short)
+        return [pk for pk, stock in rows if stock == 0]
+
+    def reprice(self, percent=None, prices=None):
+        """
+        Change prices in one UPDATE and record them in one history insert.
+
+        Either scale every product of the queryset by ``percent`` (``5`` for
+        +5%, rounded to cents, never below 0.01), or set explicit
+        ``{product_id: price}``. Products whose price doesn't change are left
+        alone. Returns ``{product_id: new price}`` of the products updated.
+        """
+        if prices is not None:
+            if not prices:
+                return {}
+            new_price = Case(
+                *[When(pk=pk, then=Value(price)) for pk, price in prices.items()],
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+            queryset = self.filter(pk__in=prices)
+        else:
+            factor = Value((100 + Decimal(percent)) / 100, output_field=models.DecimalField())
+            new_price = Greatest(
+                Round(F('price') * factor, 2), Value(Decimal('0.01')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            )
+            queryset = self.all()
+        queryset = queryset.exclude(price=new_price)
+
+        now = timezone.now()
+        with transaction.atomic():
+            if supports_update_returning():
+                sql, params = _update_sql(queryset, {'price': new_price})
+                quote = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    cursor.execute(f"{sql} RETURNING {quote('id')}, {quote('price')}", params)
+                    rows = cursor.fetchall()
+            else:
+                ids = list(queryset.select_for_update().values_list('pk', flat=True))
+                self.filter(pk__in=ids).update(price=new_price)
+                rows = self.filter(pk__in=ids).values_list('pk', 'price')
+            price_field = self.model._meta.get_field('price')
+            updated = {
+                pk: price_field.to_python(price).quantize(Decimal('0.01')) for pk, price in rows
+            }
+            ProductPrice.objects.bulk_create(
+                ProductPrice(product_id=pk, price=price, effective_from=now) for pk, price in updated.items()
+            )
+        return updated
+
+    def restock(self, quantities):
+        """
+        Add ``{product_id: quantity}`` units in one UPDATE. Untracked products
+        start counting from zero, and products that had sold out become
+        available again. Returns the number of products updated.
+        """
+        if not quantities:
+            return 0
+        added = Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=models.IntegerField(),
+        )
+        return self.filter(pk__in=quantities).update(
+            stock_quantity=Coalesce('stock_quantity', 0) + added,
+            is_available=Case(When(stock_quantity=0, then=Value(True)), default=F('is_available')),
+        )
+
+
+def _update_sql(queryset, changes):
+    # Compile the ORM UPDATE so RETURNING can be appended to it.
+    query = queryset.query.chain(models.sql.UpdateQuery)
+    query.add_update_values(changes)
+    return query.get_compiler(queryset.db).as_sql()
+
+
+class Product(SoftDeleteModel):
     name = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='products')
     is_available = models.BooleanField(default=True)
     preparation_time = models.PositiveIntegerField(help_text="Time in minutes")
+    stock_quantity = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Units left; empty means stock isn't tracked"
+    )
+
+    objects = LiveManager.from_queryset(ProductQuerySet)()
 
     class Meta:
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                Lower('name'), 'category', name='product_name_category_ci_unique', condition=LIVE,
+                violation_error_message="Product with this name already exists in this category.",
+            ),
+        ]
+        indexes = [
+            # Menu pages and the category filter only ever read live products.
+            live_index(fields=['category', 'id'], name='product_live_category_idx'),
+            live_index(fields=['id'], name='product_live_available_idx', condition=models.Q(is_available=True)),
+            dead_index('product_deleted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name}-{self.category.name}"
@@ -49,13 +246,100 @@ class Product(models.Model):
             errors['preparation_time'] = "Preparation time must be at least 1 minute."
         if self.category and not self.category.is_active:
             errors['category'] = "Cannot assign product to an inactive category."
-        if Product.objects.exclude(pk=self.pk).filter(name__iexact=self.name, category=self.category).exists():
-            errors['name'] = "Product with this name already exists in this category."
         if errors:
             raise ValidationError(errors)
 
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_price = instance.__dict__.get('price')
+        return instance
+
+    def save(self, *args, validate=True, **kwargs):
+        # validate=False for callers that already ran full_clean() or write trusted data.
+        if validate:
+            self.full_clean()
+        update_fields = kwargs.get('update_fields')
+        price_changed = (self._state.adding or self.price != getattr(self, '_stored_price', None)) and (
+            update_fields is None or 'price' in update_fields
+        )
+        if not price_changed:
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            ProductPrice.objects.create(product=self, price=self.price)
+        self._stored_price = self.price
+
+
+class ProductPrice(models.Model):
+    """A product's price from ``effective_from`` until its next entry."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_from = models.DateTimeField(default=timezone.now)
+
+    objects = ProductPriceQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-effective_from', '-id']
+        indexes = [
+            # "Price at time T": seek to the product, then the first entry <= T.
+            models.Index(fields=['product', '-effective_from'], name='product_price_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.price} from {self.effective_from:%Y-%m-%d %H:%M}"
+
+
+
 
+class ProductPair(models.Model):
+    """
+    Number of orders containing both ``product`` and ``other``, stored in both
+    directions so a product's pairs are one index range. The diagonal
+    (``other == product``) counts the orders containing the product at all.
+    Counted offline from order items (products/recommendations.py).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_product_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.orders}"
+
+
+class CooccurrenceBuild(models.Model):
+    """Single row: orders up to ``last_order_id`` are in the pair counts, ``order_count`` of them."""
+    last_order_id = models.BigIntegerField(default=0)
+    order_count = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Orders counted up to {self.last_order_id}"
+
+
+class ProductRecommendation(models.Model):
+    """A product often ordered together with ``product``, ranked from 1 (strongest)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    # Orders containing both products.
+    orders = models.PositiveIntegerField()
+    # Share of the product's orders that also contain the recommended one.
+    confidence = models.FloatField()
+    # Confidence divided by the share of all orders containing the recommended one.
+    lift = models.FloatField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_product_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} (#{self.rank})"
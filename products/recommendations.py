@@ -0,0 +1,123 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from products.models import CooccurrenceBuild, ProductPair, ProductRecommendation
+from restaurant.db import upsert_increment
+
+# Orders younger than this are left for the next run: ids are taken before
+# commit, so a lower id may still become visible after a higher one.
+SETTLE = timedelta(minutes=1)
+
+
+class BuildConflict(Exception):
+    """Another build moved the watermark while this one was counting."""
+
+
+def count_new_orders(chunk_size=5000, settle=SETTLE, stdout=None):
+    """
+    Add the orders placed since the last run to the pair counts, by order id
+    windows of ``chunk_size``. Each window's counts and the watermark move in
+    one transaction, so an interrupted run resumes where it stopped and no
+    order is counted twice. Returns the number of orders counted.
+    """
+    state, _ = CooccurrenceBuild.objects.get_or_create(pk=1)
+    cutoff = timezone.now() - settle
+    settled = Order.objects.filter(id__gt=state.last_order_id, order_date__lt=cutoff)
+    archived = ArchivedOrder.objects.filter(id__gt=state.last_order_id)
+    last_id = max(
+        settled.aggregate(last=Max('id'))['last'] or 0,
+        archived.aggregate(last=Max('id'))['last'] or 0,
+    )
+
+    counted = 0
+    low = state.last_order_id
+    while low < last_id:
+        high = min(low + chunk_size, last_id)
+        baskets = defaultdict(set)
+        for item_model in (ArchivedOrderItem, OrderItem):
+            items = item_model.objects.filter(order_id__gt=low, order_id__lte=high)
+            for order_id, product_id in items.values_list('order_id', 'product_id'):
+                baskets[order_id].add(product_id)
+
+        pairs = Counter()
+        for products in baskets.values():
+            for product_id in products:
+                pairs[(product_id, product_id)] += 1
+            for first, second in combinations(products, 2):
+                pairs[(first, second)] += 1
+                pairs[(second, first)] += 1
+
+        with transaction.atomic():
+            moved = CooccurrenceBuild.objects.filter(pk=state.pk, last_order_id=low).update(
+                last_order_id=high, order_count=F('order_count') + len(baskets), updated_at=timezone.now()
+            )
+            if not moved:
+                raise BuildConflict("Another build is counting orders; run one at a time.")
+            upsert_increment(ProductPair, ['product_id', 'other_id'], ['orders'], {
+                key: (count,) for key, count in pairs.items()
+            })
+
+        counted += len(baskets)
+        low = high
+        if stdout is not None:
+            stdout.write(f"{counted} orders counted")
+    return counted
+
+
+def rank_neighbours(top_k, min_orders, chunk_size=1000):
+    """
+    Rebuild every product's recommendations from the pair counts: the
+    ``top_k`` products most often in the same order (by confidence, then
+    lift), among pairs seen in at least ``min_orders`` orders and ordered
+    together more often than chance (lift > 1). Reads only the pair table,
+    whose size depends on the menu, not on the order history. Products are
+    replaced ``chunk_size`` at a time. Returns the number of rows stored.
+    """
+    total = CooccurrenceBuild.objects.values_list('order_count', flat=True).first() or 0
+    support = dict(ProductPair.objects.filter(other=F('product')).values_list('product_id', 'orders'))
+    product_ids = sorted(support)
+
+    stored = 0
+    for start in range(0, len(product_ids), chunk_size):
+        first, last = product_ids[start], product_ids[min(start + chunk_size, len(product_ids)) - 1]
+        candidates = defaultdict(list)
+        pairs = ProductPair.objects.filter(
+            product_id__gte=first, product_id__lte=last, orders__gte=min_orders
+        ).exclude(other=F('product'))
+        for product_id, other_id, orders in pairs.values_list('product_id', 'other_id', 'orders'):
+            confidence = orders / support[product_id]
+            lift = confidence * total / support[other_id]
+            if lift > 1:
+                candidates[product_id].append((confidence, lift, other_id, orders))
+
+        rows = [
+            ProductRecommendation(
+                product_id=product_id, recommended_id=other_id, rank=rank,
+                orders=orders, confidence=confidence, lift=lift,
+            )
+            for product_id, neighbours in candidates.items()
+            for rank, (confidence, lift, other_id, orders) in enumerate(
+                sorted(neighbours, key=lambda neighbour: (-neighbour[0], -neighbour[1], neighbour[2]))[:top_k],
+                start=1,
+            )
+        ]
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(product_id__gte=first, product_id__lte=last).delete()
+            ProductRecommendation.objects.bulk_create(rows, batch_size=500)
+        stored += len(rows)
+    return stored
+
+
+def reset_counts():
+    """Forget all pair counts so the next run counts the whole history again."""
+    with transaction.atomic():
+        ProductPair.objects.all().delete()
+        CooccurrenceBuild.objects.update_or_create(
+            pk=1, defaults={'last_order_id': 0, 'order_count': 0, 'updated_at': timezone.now()}
+        )
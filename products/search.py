@@ -0,0 +1,132 @@
+import re
+
+from django.db import connection
+from rest_framework import filters
+
+TABLE = 'products_product_search'
+
+
+_INDEX_SELECT = """
+    SELECT p.id, p.name, p.description, c.name
+    FROM products_product p JOIN products_category c ON c.id = p.category_id
+    WHERE p.deleted_at IS NULL
+"""
+
+
+def search_enabled():
+    """The FTS5 index only exists on SQLite (see migration products 0004)."""
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(term):
+    """
+    Turn user input into an FTS5 query that prefix-matches every word, so
+    ``marg piz`` finds "Margherita Pizza". Returns None if nothing is left.
+    """
+    words = re.findall(r'\w+', term)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_products(product_ids):
+    if not search_enabled() or not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, name, description, category) {_INDEX_SELECT} '
+            f'AND p.id IN ({placeholders})', product_ids
+        )
+
+
+def index_category(category_id):
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, name, description, category) {_INDEX_SELECT} '
+            f'AND p.category_id = %s', [category_id]
+        )
+
+
+def remove_products(product_ids):
+    if not search_enabled() or not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+
+def remove_deleted():
+    """Drop the index rows of soft-deleted products."""
+    if not search_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN '
+            f'(SELECT id FROM products_product WHERE deleted_at IS NOT NULL)'
+        )
+
+
+def rebuild_index():
+    """Re-create every index row from the product table. Returns the row count."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(f'INSERT INTO {TABLE} (rowid, name, description, category) {_INDEX_SELECT}')
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLE}')
+        return cursor.fetchone()[0]
+
+
+def search(queryset, term):
+    """
+    Restrict a Product queryset to index matches, best match first.
+
+    The index is joined on rowid = product id, so the MATCH runs once against
+    the FTS index instead of a LIKE '%term%' scan over the product table.
+    Ordering by the index's ``rank`` column (bm25 with the name weighted over
+    category and description, configured in the migration) lets FTS5 sort the
+    matches itself.
+    """
+    expression = match_expression(term)
+    if expression is None:
+        return queryset
+    return queryset.extra(
+        select={'search_rank': f'{TABLE}.rank'},
+        tables=[TABLE],
+        where=[f'{TABLE}.rowid = products_product.id', f'{TABLE} MATCH %s'],
+        params=[expression],
+        order_by=['search_rank'],
+    )
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    ``?search=`` over product name, description and category name using the
+    FTS5 index, ranked by relevance. Falls back to SearchFilter's icontains
+    lookups on ``search_fields`` where there is no index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not search_enabled():
+            return super().filter_queryset(request, queryset, view)
+        term = request.query_params.get(self.search_param, '')
+        return search(queryset, term) if term.strip() else queryset
+
+
+def sync_product(sender, instance, **kwargs):
+    index_products([instance.pk])
+
+
+def unindex_product(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+
+def sync_category(sender, instance, created, **kwargs):
+    if not created:
+        index_category(instance.pk)
+
+
+def unindex_deleted(sender, **kwargs):
+    remove_deleted()
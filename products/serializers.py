@@ -1,34 +1,146 @@
-from .models import Category, Product
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Category, Product, ProductPrice, ProductRecommendation
 from rest_framework import serializers
-from django.core.exceptions import ValidationError
+from restaurant.fieldsets import SparseFieldsMixin
+from restaurant.serializers import ModelValidationMixin
+
 
+class CategorySerializer(SparseFieldsMixin, ModelValidationMixin, serializers.ModelSerializer):
+    deactivate_products = serializers.BooleanField(
+        write_only=True, required=False, default=False,
+        help_text="With is_active=false, also mark all products of the category unavailable.",
+    )
 
-class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name' ,'description', 'is_active']
+        fields = ['id', 'name' ,'description', 'is_active', 'deactivate_products']
 
     def validate(self, attrs):
-        category = Category(**attrs)
-        try:
-            category.clean()
-        except ValidationError as e:
-            raise serializers.ValidationError(e.message_dict)
-        return attrs
+        self._deactivate_products = attrs.pop('deactivate_products', False)
+        return super().validate(attrs)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            category = super().update(instance, validated_data)
+            if self._deactivate_products and not category.is_active:
+                category.products.filter(is_available=True).update(is_available=False)
+        return category
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, ModelValidationMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(), source='category', write_only=True
     )
     class Meta:
         model = Product
-        fields = ['id', 'name','description' , 'price', 'category', 'category_id' , 'is_available', 'preparation_time']
+        fields = ['id', 'name','description' , 'price', 'category', 'category_id' , 'is_available', 'preparation_time', 'stock_quantity']
+        expandable_fields = {'category': CategorySerializer}
+
+
+class MenuProductSerializer(ProductSerializer):
+    """
+    Products as served from the menu cache. Stock counts change with every
+    order, so they are left out here and read from ``/products/stock/``.
+    """
+
+    class Meta(ProductSerializer.Meta):
+        fields = [field for field in ProductSerializer.Meta.fields if field != 'stock_quantity']
+
+
+class ProductStockSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='id')
+
+    class Meta:
+        model = Product
+        fields = ['product', 'stock_quantity', 'is_available']
+
+
+class StockQuerySerializer(serializers.Serializer):
+    ids = serializers.RegexField(
+        r'^\d+(,\d+)*$', help_text="Comma-separated product ids, e.g. `1,2,3`.",
+    )
+
+    def validate_ids(self, value):
+        ids = {int(pk) for pk in value.split(',')}
+        if len(ids) > settings.PRODUCT_STOCK_MAX_IDS:
+            raise serializers.ValidationError(f"At most {settings.PRODUCT_STOCK_MAX_IDS} products.")
+        return ids
+
+
+class RestockItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class ProductRestockSerializer(serializers.Serializer):
+    items = RestockItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        quantities = {}
+        for item in value:
+            quantities[item['product']] = quantities.get(item['product'], 0) + item['quantity']
+        return quantities
+
+
+class ProductPriceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductPrice
+        fields = ['price', 'effective_from']
+
+
+class PriceHistoryQuerySerializer(serializers.Serializer):
+    at = serializers.DateTimeField(required=False)
+
+
+class PriceItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+
+
+class ProductRepriceSerializer(serializers.Serializer):
+    percent = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=Decimal('-99.99'), required=False,
+        help_text="Change in percent, e.g. 5 for +5% or -10 for -10%.",
+    )
+    category = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(), required=False,
+        help_text="With percent: only reprice this category.",
+    )
+    products = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, required=False,
+        help_text="With percent: only reprice these products.",
+    )
+    prices = PriceItemSerializer(many=True, allow_empty=False, required=False)
 
     def validate(self, attrs):
-        product = Product(**attrs)
-        try:
-            product.clean()
-        except ValidationError as e:
-            raise serializers.ValidationError(e.message_dict)
+        if ('percent' in attrs) == ('prices' in attrs):
+            raise serializers.ValidationError("Give either percent or prices.")
+        if 'prices' in attrs:
+            if 'category' in attrs or 'products' in attrs:
+                raise serializers.ValidationError("category and products only apply to percent.")
+            prices = {item['product']: item['price'] for item in attrs['prices']}
+            if len(prices) < len(attrs['prices']):
+                raise serializers.ValidationError({"prices": ["Each product may appear only once."]})
+            attrs['prices'] = prices
         return attrs
+
+
+class ProductRecommendationSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='recommended_id', read_only=True)
+    name = serializers.CharField(source='recommended.name', read_only=True)
+    price = serializers.DecimalField(source='recommended.price', max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = ProductRecommendation
+        fields = ['product', 'name', 'price', 'orders', 'confidence', 'lift']
+
+
+class RecommendationQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.PRODUCT_RECOMMENDATIONS_TOP_K,
+        default=settings.PRODUCT_RECOMMENDATIONS_LIMIT,
+    )
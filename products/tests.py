@@ -1,6 +1,25 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
 from rest_framework.test import APITestCase
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from products.models import Category, Product
+from django.utils import timezone
+from customers.models import Customer
+from orders.models import Order
+from orders.services import create_orders
+from products.models import Category, OutOfStock, Product, ProductPair, ProductPrice
+from products.views import CategoryViewSet, ProductViewSet
+from products.availability import ProductIndex, get_product_index
+from products.cache import MenuCache, check_version_cache, menu_cache
+from restaurant.testing import QueryBudgetMixin
 from users.models import CustomUser
 from rest_framework_simplejwt.tokens import RefreshToken
 
@@ -58,6 +77,75 @@ class CategoryTests(BaseTestCase):
         self.assertEqual(response.status_code, 403)
 
 
+class CategoryRetirementTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.manager)
+
+    def test_delete_is_soft_and_constant_queries(self):
+        for index in range(20):
+            Product.objects.create(
+                name=f"Dish {index}", description="Dish", price=7, category=self.cat2, preparation_time=5
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(reverse('category-detail', args=[self.cat2.id]))
+        self.assertEqual(response.status_code, 204)
+        # category lookup, products UPDATE, their search rows, category UPDATE
+        executed = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(executed), 4, "\n".join(executed))
+
+        self.assertEqual(self.client.get(reverse('category-detail', args=[self.cat2.id])).status_code, 404)
+        self.assertEqual(list(Product.objects.values_list('pk', flat=True)), [self.prod2.pk])
+        self.assertEqual(Product.all_objects.filter(category=self.cat2, deleted_at__isnull=False).count(), 21)
+        self.assertIsNone(get_product_index().product(self.prod1.id))
+
+    def test_deactivating_can_pull_products(self):
+        url = reverse('category-detail', args=[self.cat2.id])
+        response = self.client.put(url, {"name": "Main Course", "description": "Main dishes", "is_active": False})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('deactivate_products', response.data)
+        self.assertTrue(Product.objects.get(pk=self.prod1.pk).is_available)
+
+        response = self.client.put(url, {
+            "name": "Main Course", "description": "Main dishes", "is_active": False, "deactivate_products": True
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Product.objects.get(pk=self.prod1.pk).is_available)
+
+
+class SoftDeleteTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_deleted_product_is_hidden_but_kept(self):
+        url = reverse('product-detail', args=[self.prod1.id])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('product-list'), {"search": "burger"}).data['results'], [])
+        self.assertEqual(list(self.cat2.products.all()), [])
+        self.assertIsNotNone(Product.all_objects.get(pk=self.prod1.pk).deleted_at)
+
+        # The live-only unique constraint lets the name be used again.
+        response = self.client.post(reverse('product-list'), {
+            "name": "Burger", "description": "New burger", "price": 12,
+            "category_id": self.cat2.id, "preparation_time": 10
+        })
+        self.assertEqual(response.status_code, 201)
+
+    def test_deleted_category_cannot_take_products(self):
+        self.cat1.delete()
+        response = self.client.post(reverse('product-list'), {
+            "name": "Soup", "description": "Hot", "price": 4,
+            "category_id": self.cat1.id, "preparation_time": 5
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('category_id', response.data)
+
+
 class ProductTests(BaseTestCase):
 
     def test_list_products(self):
@@ -146,3 +234,539 @@ class ProductTests(BaseTestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.staff_token}')
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, 403)
+
+
+class QueryBudgetTests(QueryBudgetMixin, BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(6):
+            category = Category.objects.create(name=f"Category {i}", description="More dishes")
+            Product.objects.create(
+                name=f"Dish {i}", description="Dish", price=7, category=category, preparation_time=5
+            )
+
+    def test_category_endpoints_within_budget(self):
+        self.assertWithinQueryBudget(CategoryViewSet, 'list', reverse('category-list'))
+        self.assertWithinQueryBudget(
+            CategoryViewSet, 'retrieve', reverse('category-detail', args=[self.cat1.id])
+        )
+
+    def test_product_endpoints_within_budget(self):
+        response = self.assertWithinQueryBudget(ProductViewSet, 'list', reverse('product-list'))
+        self.assertIn('name', response.data['results'][0]['category'])
+        self.assertWithinQueryBudget(
+            ProductViewSet, 'retrieve', reverse('product-detail', args=[self.prod1.id])
+        )
+        self.assertWithinQueryBudget(
+            ProductViewSet, 'available_products', reverse('product-available-products')
+        )
+
+
+class MenuCacheTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        menu_cache.reset_stats()
+
+    def test_repeated_list_served_from_cache(self):
+        url = reverse('product-list')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_returns_304_without_queries(self):
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_menu_write_invalidates_cached_responses(self):
+        url = reverse('product-detail', args=[self.prod1.id])
+        etag = self.client.get(url)['ETag']
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.admin_token}')
+        response = self.client.put(url, {
+            "name": "Cheeseburger", "description": "Tasty burger", "price": 12,
+            "category_id": self.cat2.id, "preparation_time": 15
+        })
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['price'], '12.00')
+        self.assertNotEqual(response['ETag'], etag)
+
+        self.cat2.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_orders_keep_menu_cached_and_stock_current(self):
+        self.prod1.stock_quantity = 10
+        self.prod1.save()
+        url = reverse('product-detail', args=[self.prod1.id])
+        response = self.client.get(url)
+        self.assertNotIn('stock_quantity', response.data)
+        etag = response['ETag']
+        customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com", phone="0999999999", address="Damascus"
+        )
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.staff_token}')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/orders/", {
+                "customer": customer.id, "items": [{"product": self.prod1.id, "quantity": 3}]
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.credentials()
+
+        # The order didn't flush the menu; the stock endpoint reads the live count.
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-stock'), {"ids": f"{self.prod1.id},{self.prod2.id}"})
+        self.assertEqual(response.data, [
+            {"product": self.prod1.id, "stock_quantity": 7, "is_available": True},
+            {"product": self.prod2.id, "stock_quantity": None, "is_available": True},
+        ])
+        self.assertEqual(self.client.get(reverse('product-stock'), {"ids": "1,x"}).status_code, 400)
+
+    def test_versions_are_shared_between_processes(self):
+        version = menu_cache.version()
+        # Another worker has its own (empty) response cache but the same versions.
+        cache.clear()
+        other_worker = MenuCache(timeout=60)
+        self.assertEqual(other_worker.version(), version)
+        menu_cache.bump()
+        self.assertGreater(other_worker.version(), version)
+
+    def test_process_local_version_cache_fails_check(self):
+        local = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        with override_settings(CACHES={'default': local, 'versions': local}):
+            self.assertEqual([error.id for error in check_version_cache(None)], ['products.E002'])
+        with override_settings(CACHES={'default': local}):
+            self.assertEqual([error.id for error in check_version_cache(None)], ['products.E001'])
+        self.assertEqual(check_version_cache(None), [])
+
+    def test_cache_stats(self):
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        self.client.get(url)
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.staff_token}')
+        self.assertEqual(self.client.get(reverse('product-cache-stats')).status_code, 403)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.manager_token}')
+        stats = self.client.get(reverse('product-cache-stats')).data
+        self.assertEqual((stats['misses'], stats['hits'], stats['not_modified']), (1, 1, 1))
+        self.assertEqual(stats['version'], menu_cache.version())
+
+
+class ValidationQueryTests(BaseTestCase):
+    """Model validation runs once per write, and name uniqueness is left to the database."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin)
+
+    def assertWriteQueries(self, expected, method, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        # The savepoint around the write isn't a round trip outside tests' transaction.
+        executed = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(executed), expected, "\n".join(executed))
+        return response
+
+    def test_category_create_validates_once(self):
+        response = self.assertWriteQueries(1, 'post', reverse('category-list'), {"name": "Desserts", "description": "Sweet"})
+        self.assertEqual(response.status_code, 201)
+
+    def test_product_create_validates_once(self):
+        # category lookup, insert, price history row, search index row
+        response = self.assertWriteQueries(4, 'post', reverse('product-list'), {
+            "name": "Pizza", "description": "Cheese Pizza", "price": 12.5,
+            "category_id": self.cat2.id, "preparation_time": 10
+        })
+        self.assertEqual(response.status_code, 201)
+
+    def test_product_update_keeping_name(self):
+        url = reverse('product-detail', args=[self.prod1.id])
+        response = self.client.put(url, {
+            "name": "Burger", "description": "Juicy burger", "price": 11,
+            "category_id": self.cat2.id, "preparation_time": 15
+        })
+        self.assertEqual(response.status_code, 200)
+        self.prod1.refresh_from_db()
+        self.assertEqual(self.prod1.description, "Juicy burger")
+
+    def test_duplicate_names_rejected_by_constraint(self):
+        response = self.client.post(reverse('category-list'), {"name": "appetizers", "description": "Again"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['name'], ["Category with this name already exists."])
+
+        response = self.client.post(reverse('product-list'), {
+            "name": "BURGER", "description": "Again", "price": 9,
+            "category_id": self.cat2.id, "preparation_time": 10
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['name'], ["Product with this name already exists in this category."])
+        self.assertEqual(Product.objects.count(), 2)
+
+        # Same name in another category is fine.
+        response = self.client.post(reverse('product-list'), {
+            "name": "Burger", "description": "Starter burger", "price": 9,
+            "category_id": self.cat1.id, "preparation_time": 10
+        })
+        self.assertEqual(response.status_code, 201)
+
+    def test_renaming_onto_existing_name_rejected(self):
+        response = self.client.put(reverse('category-detail', args=[self.cat1.id]), {
+            "name": "MAIN COURSE", "description": "Starter dishes"
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data)
+
+    def test_model_save_still_validates(self):
+        with self.assertRaises(ValidationError):
+            Category.objects.create(name="appetizers", description="Again")
+
+    def test_internal_save_can_skip_validation(self):
+        self.prod1.price = 13
+        # update, price history row, search index row
+        with self.assertNumQueries(3):
+            self.prod1.save(validate=False)
+
+
+class ProductSearchTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pizza = Category.objects.create(name="Pizza", description="Stone oven")
+        self.margherita = Product.objects.create(
+            name="Margherita", description="Tomato and mozzarella", price=9,
+            category=self.pizza, preparation_time=12
+        )
+        self.calzone = Product.objects.create(
+            name="Calzone", description="Folded, like a margherita", price=11,
+            category=self.pizza, preparation_time=15
+        )
+
+    def search(self, term):
+        response = self.client.get(reverse('product-list'), {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_ranked_prefix_search(self):
+        # Name matches outrank description matches.
+        self.assertEqual(self.search("marg"), ["Margherita", "Calzone"])
+        self.assertEqual(self.search("marg mozz"), ["Margherita"])
+        self.assertCountEqual(self.search("pizz"), ["Margherita", "Calzone"])
+        self.assertEqual(self.search("sushi"), [])
+
+    def test_index_follows_writes(self):
+        self.margherita.name = "Marinara"
+        self.margherita.save()
+        self.assertEqual(self.search("marin"), ["Marinara"])
+        self.assertEqual(self.search("margherita"), ["Calzone"])
+
+        self.pizza.name = "Flatbread"
+        self.pizza.save()
+        self.assertCountEqual(self.search("flat"), ["Marinara", "Calzone"])
+
+        self.calzone.delete()
+        self.assertEqual(self.search("flat"), ["Marinara"])
+        self.pizza.delete()
+        self.assertEqual(self.search("marin"), [])
+
+    def test_rebuild_command(self):
+        Product.objects.filter(pk=self.calzone.pk).update(name="Stromboli")
+        self.assertEqual(self.search("stromb"), [])
+        out = StringIO()
+        call_command('rebuild_product_search', stdout=out)
+        self.assertIn("Indexed 4 products", out.getvalue())
+        self.assertEqual(self.search("stromb"), ["Stromboli"])
+
+
+class ProductIndexTests(BaseTestCase):
+
+    def test_lookups(self):
+        index = ProductIndex.load()
+        self.assertEqual(len(index), 2)
+        self.assertTrue(index.is_available(self.prod1.id))
+        self.assertEqual(str(index.price(self.prod1.id)), "10.50")
+        self.assertEqual(index.preparation_time(self.prod2.id), 5)
+        self.assertNotIn(999999, index)
+        self.assertFalse(index.is_available(999999))
+
+        product = index.product(self.prod1.id)
+        self.assertEqual((product.pk, product.name, product.category_id), (self.prod1.id, "Burger", self.cat2.id))
+        self.assertIsNone(index.product(999999))
+
+    def test_reused_until_menu_changes(self):
+        index = get_product_index()
+        with self.assertNumQueries(0):
+            self.assertIs(get_product_index(), index)
+
+        self.prod1.price = 11
+        self.prod1.is_available = False
+        self.prod1.save()
+        index = get_product_index()
+        self.assertEqual(str(index.price(self.prod1.id)), "11.00")
+        self.assertFalse(index.is_available(self.prod1.id))
+
+
+class SparseFieldsetTests(BaseTestCase):
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, " ".join(query['sql'] for query in queries.captured_queries)
+
+    def test_fields_prune_response_and_columns(self):
+        response, sql = self.get(reverse('product-list'), {'fields': 'id,name,price'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'price'})
+        self.assertNotIn('"products_product"."description"', sql)
+        self.assertNotIn('products_category', sql)
+
+    def test_related_field_is_id_unless_expanded(self):
+        response, sql = self.get(reverse('product-detail', args=[self.prod1.id]), {'fields': 'id,category'})
+        self.assertEqual(response.data, {'id': self.prod1.id, 'category': self.cat2.id})
+        self.assertNotIn('products_category', sql)
+
+        response, sql = self.get(
+            reverse('product-detail', args=[self.prod1.id]), {'fields': 'id,category', 'expand': 'category'}
+        )
+        self.assertEqual(response.data['category']['name'], "Main Course")
+        self.assertIn('INNER JOIN "products_category"', sql)
+
+    def test_default_representation_unchanged(self):
+        response = self.client.get(reverse('product-detail', args=[self.prod1.id]))
+        self.assertEqual(response.data['category']['description'], "Main dishes")
+        self.assertIn('preparation_time', response.data)
+
+    def test_unknown_fields_rejected(self):
+        response = self.client.get(reverse('category-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+        response = self.client.get(reverse('category-list'), {'expand': 'products'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductStockTests(BaseTestCase):
+
+    def test_take_stock(self):
+        for returning in (True, False):
+            with self.subTest(returning=returning), \
+                    mock.patch('products.models.supports_update_returning', return_value=returning):
+                Product.objects.filter(pk=self.prod1.pk).update(stock_quantity=5, is_available=True)
+                Product.objects.filter(pk=self.prod2.pk).update(stock_quantity=2, is_available=True)
+
+                sold_out = Product.objects.take_stock({self.prod1.pk: 3, self.prod2.pk: 2})
+                self.assertEqual(sold_out, [self.prod2.pk])
+                self.assertEqual(
+                    list(Product.objects.order_by('pk').values_list('stock_quantity', 'is_available')),
+                    [(2, True), (0, False)]
+                )
+
+                with self.assertRaisesMessage(OutOfStock, "Not enough stock for Burger"):
+                    Product.objects.take_stock({self.prod1.pk: 3})
+                self.prod1.refresh_from_db()
+                self.assertEqual(self.prod1.stock_quantity, 2)
+
+    def test_untracked_products_are_skipped(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(Product.objects.take_stock({self.prod1.pk: 100}), [])
+        self.prod1.refresh_from_db()
+        self.assertIsNone(self.prod1.stock_quantity)
+
+    def test_restock(self):
+        Product.objects.filter(pk=self.prod1.pk).update(stock_quantity=0, is_available=False)
+        url = reverse('product-list') + 'restock/'
+        payload = {"items": [
+            {"product": self.prod1.id, "quantity": 4},
+            {"product": self.prod1.id, "quantity": 1},
+            {"product": self.prod2.id, "quantity": 3},
+        ]}
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.staff_token}')
+        self.assertEqual(self.client.post(url, payload, format='json').status_code, 403)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.manager_token}')
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(p['id'], p['stock_quantity'], p['is_available']) for p in response.data],
+            [(self.prod1.id, 5, True), (self.prod2.id, 3, True)]
+        )
+        self.assertTrue(get_product_index().is_available(self.prod1.id))
+
+        response = self.client.post(url, {"items": [{"product": 999999, "quantity": 1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("999999", str(response.data))
+
+
+class ProductPriceTests(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.manager)
+        self.url = reverse('product-list') + 'reprice/'
+
+    def assertWriteQueries(self, expected, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, payload, format='json')
+        executed = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(executed), expected, "\n".join(executed))
+        return response
+
+    def test_saves_record_price_changes(self):
+        self.assertEqual(list(self.prod1.price_history.values_list('price', flat=True)), [Decimal('10.50')])
+
+        product = Product.objects.get(pk=self.prod1.pk)
+        product.description = "Bigger burger"
+        product.save()
+        self.assertEqual(product.price_history.count(), 1)
+
+        product.price = Decimal('12.00')
+        product.save()
+        self.assertEqual(
+            list(product.price_history.values_list('price', flat=True)), [Decimal('12.00'), Decimal('10.50')]
+        )
+
+    def test_reprice_by_percent(self):
+        Product.objects.create(name="Fries", description="Crispy", price=4, category=self.cat2, preparation_time=5)
+        # category lookup, UPDATE ... RETURNING, history insert
+        response = self.assertWriteQueries(3, {"percent": "5", "category": self.cat2.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'price')),
+            {"Burger": Decimal('11.03'), "Fries": Decimal('4.20'), "Salad": Decimal('5.00')}
+        )
+        self.assertEqual(ProductPrice.objects.filter(price=Decimal('11.03')).count(), 1)
+        self.assertEqual(get_product_index().price(self.prod1.id), Decimal('11.03'))
+
+    def test_reprice_explicit_prices(self):
+        for returning in (True, False):
+            with self.subTest(returning=returning), \
+                    mock.patch('products.models.supports_update_returning', return_value=returning):
+                price = Decimal('8.00') if returning else Decimal('9.00')
+                response = self.client.post(self.url, {"prices": [
+                    {"product": self.prod1.id, "price": str(price)},
+                    {"product": self.prod2.id, "price": "5.00"},
+                ]}, format='json')
+
+                self.assertEqual(response.status_code, 200)
+                # Salad already costs 5.00, so only Burger changes.
+                self.assertEqual(response.data["prices"], [{"product": self.prod1.id, "price": str(price)}])
+                self.prod1.refresh_from_db()
+                self.assertEqual(self.prod1.price, price)
+                self.assertEqual(self.prod1.price_history.first().price, price)
+
+    def test_reprice_rejects_bad_requests(self):
+        response = self.client.post(self.url, {"prices": [{"product": 999999, "price": "3.00"}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("999999", str(response.data["prices"]))
+
+        response = self.client.post(self.url, {"percent": "5", "prices": [{"product": self.prod1.id, "price": "3.00"}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.post(self.url, {"percent": "5"}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(ProductPrice.objects.count(), 2)
+
+    def test_price_at(self):
+        ProductPrice.objects.filter(product=self.prod1).update(effective_from=timezone.now() - timedelta(days=2))
+        Product.objects.filter(pk=self.prod1.pk).reprice(percent=10)
+        url = reverse('product-prices', args=[self.prod1.id])
+
+        response = self.client.get(url)
+        self.assertEqual([entry["price"] for entry in response.data], ["11.55", "10.50"])
+
+        yesterday = (timezone.now() - timedelta(days=1)).isoformat()
+        response = self.client.get(url, {"at": yesterday})
+        self.assertEqual(response.data["price"], "10.50")
+
+        response = self.client.get(url, {"at": (timezone.now() - timedelta(days=3)).isoformat()})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecommendationTests(QueryBudgetMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com", phone="0999999999", address="Damascus"
+        )
+        category = Category.objects.create(name="Menu", description="Everything")
+        for name in ("pizza", "cola", "fries", "cake", "water"):
+            product = Product.objects.create(
+                name=name.title(), description=name, price=5, category=category, preparation_time=5
+            )
+            setattr(cls, name, product)
+
+    def setUp(self):
+        self.place([[self.pizza, self.cola]] * 4 + [[self.pizza, self.fries]] * 2
+                   + [[self.cake, self.water]] * 3 + [[self.cola]])
+
+    def place(self, baskets):
+        create_orders([
+            {'customer': self.customer, 'items': [{'product': product, 'quantity': 1} for product in basket]}
+            for basket in baskets
+        ])
+        # Only orders older than a minute are counted.
+        Order.objects.update(order_date=timezone.now() - timedelta(hours=1))
+
+    def build(self, *args):
+        call_command('build_recommendations', '--min-orders=2', *args, stdout=StringIO())
+
+    def recommended(self, product, **params):
+        response = self.client.get(f"/api/products/{product.id}/recommendations/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(suggestion['name'], suggestion['orders']) for suggestion in response.data]
+
+    def test_recommendations(self):
+        self.build()
+        self.assertEqual(self.recommended(self.pizza), [("Cola", 4), ("Fries", 2)])
+        self.assertEqual(self.recommended(self.cake), [("Water", 3)])
+        self.assertEqual(self.recommended(self.pizza, limit=1), [("Cola", 4)])
+
+        get_product_index()
+        response = self.assertWithinQueryBudget(
+            ProductViewSet, 'recommendations', f"/api/products/{self.cola.id}/recommendations/"
+        )
+        suggestion = response.data[0]
+        self.assertEqual(suggestion['product'], self.pizza.id)
+        self.assertAlmostEqual(suggestion['confidence'], 4 / 5)
+        self.assertAlmostEqual(suggestion['lift'], 4 / 5 * 10 / 6)
+
+    def test_incremental_build_matches_full_build(self):
+        self.build()
+        self.place([[self.pizza, self.fries]] * 3)
+        out = StringIO()
+        call_command('build_recommendations', '--min-orders=2', stdout=out)
+        self.assertIn("Counted 3 new orders", out.getvalue())
+        self.assertEqual(self.recommended(self.pizza), [("Fries", 5), ("Cola", 4)])
+
+        incremental = sorted(ProductPair.objects.values_list('product_id', 'other_id', 'orders'))
+        self.build('--full')
+        self.assertEqual(sorted(ProductPair.objects.values_list('product_id', 'other_id', 'orders')), incremental)
+
+    def test_unavailable_and_unknown_products(self):
+        self.build()
+        self.fries.is_available = False
+        self.fries.save()
+        self.assertEqual(self.recommended(self.pizza), [("Cola", 4)])
+
+        self.cola.delete()
+        self.assertEqual(self.recommended(self.pizza), [])
+        response = self.client.get(f"/api/products/{self.cola.id}/recommendations/")
+        self.assertEqual(response.status_code, 404)
+
@@ -1,14 +1,26 @@
 from django.shortcuts import render
-from rest_framework import viewsets, filters
+from rest_framework import status, viewsets
 
-from products.models import Category, Product
-from products.serializers import CategorySerializer, ProductSerializer
+from products.availability import get_product_index
+from products.models import Category, Product, ProductPrice, ProductRecommendation
+from django.db import transaction
+from products.serializers import (
+    CategorySerializer, MenuProductSerializer, PriceHistoryQuerySerializer, ProductPriceSerializer,
+    ProductRecommendationSerializer, ProductRepriceSerializer, ProductRestockSerializer, ProductSerializer,
+    ProductStockSerializer, RecommendationQuerySerializer, StockQuerySerializer,
+)
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from users.permissions import IsAdmin, IsManager, IsAdminOrManager, IsStaff
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from products.cache import menu_cache, menu_cached
+from products.search import ProductSearchFilter
+from restaurant.fieldsets import SparseFieldsetMixin, fieldset_parameters
+from restaurant.pagination import KeysetPagination
 
 # Create your views here.
 
@@ -16,11 +28,13 @@ from drf_spectacular.utils import extend_schema, extend_schema_view
     list=extend_schema(
         summary="List all categories",
         description="Retrieve a list of all categories of our products.",
+        parameters=fieldset_parameters,
         responses={200: CategorySerializer(many=True)},
     ),
     retrieve=extend_schema(
         summary="Get category details",
         description="Retrieve details of a specific category by ID.",
+        parameters=fieldset_parameters,
     ),
     create=extend_schema(
         summary="Create a new category",
@@ -32,29 +46,46 @@ from drf_spectacular.utils import extend_schema, extend_schema_view
     ),
     destroy=extend_schema(
         summary="Delete a category",
-        description="Remove a category from the restaurant.",
+        description=(
+            "Soft-delete the category and all its products, in two set-based updates. "
+            "Rows are kept, so order history stays intact, and are hidden everywhere else."
+        ),
     ),
 )
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by('id')
     serializer_class = CategorySerializer
     http_method_names = ['get', 'post', 'put', 'delete']
+    query_budget = {'list': 2, 'retrieve': 1}
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             return [AllowAny()]
         return [IsAdminOrManager()]
 
+    @menu_cached
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @menu_cached
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 @extend_schema_view(
     list=extend_schema(
         summary="List all products",
-        description="Retrieve a list of all products of our restaurant menu.",
-        responses={200: ProductSerializer(many=True)},
+        description=(
+            "Retrieve a list of all products of our restaurant menu. Stock counts are served "
+            "by `/products/stock/`."
+        ),
+        parameters=fieldset_parameters,
+        responses={200: MenuProductSerializer(many=True)},
     ),
     retrieve=extend_schema(
         summary="Get product details",
         description="Retrieve details of a specific product by ID.",
+        parameters=fieldset_parameters,
     ),
     create=extend_schema(
         summary="Create a new product",
@@ -66,33 +97,54 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ),
     destroy=extend_schema(
         summary="Delete a product",
-        description="Remove a product from the restaurant menu.",
+        description="Remove a product from the restaurant menu. The row is kept (soft-deleted) for order history.",
     ),
 )
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by('id')
+class ProductViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.select_related('category').order_by('id')
     serializer_class = ProductSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
     http_method_names = ['get', 'post', 'put', 'delete']
+    # recommendations: products come from the in-process product index
+    query_budget = {'list': 2, 'retrieve': 1, 'available_products': 2, 'recommendations': 1, 'stock': 1}
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter]
     filterset_fields = ['category__name', 'price']
+    # Used by ProductSearchFilter only on databases without the FTS5 index.
     search_fields = ['name']
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'available_products']:
+        if self.action in ['list', 'retrieve', 'available_products', 'recommendations', 'stock']:
             return [AllowAny()]
         return [IsAdminOrManager()]
 
+    def get_serializer_class(self):
+        # Cached menu reads leave out stock counts, so orders don't invalidate them.
+        if self.action in ['list', 'retrieve', 'available_products']:
+            return MenuProductSerializer
+        return super().get_serializer_class()
+
+    @menu_cached
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @menu_cached
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @extend_schema(
         summary="List available products",
         description="Retrieve a list of products that are currently available (is_available=True).",
-        responses={200: ProductSerializer(many=True)}
+        parameters=fieldset_parameters,
+        responses={200: MenuProductSerializer(many=True)}
     )
 
     @action(detail=False, methods=['get'], url_path='available')
+    @menu_cached
     def available_products(self, request):
-        available = Product.objects.filter(is_available=True)
+        available = self.get_queryset().filter(is_available=True)
         page = self.paginate_queryset(available)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -100,5 +152,146 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(available, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="Product stock",
+        description=(
+            "Current stock of the given products (`stock_quantity` is null when not tracked). "
+            "Never cached: menu responses leave stock out so that orders don't invalidate them."
+        ),
+        parameters=[StockQuerySerializer],
+        responses={200: ProductStockSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'], url_path='stock')
+    def stock(self, request):
+        query = StockQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        products = Product.objects.filter(pk__in=query.validated_data['ids']).order_by('id')
+        return Response(ProductStockSerializer(products.only('id', 'stock_quantity', 'is_available'), many=True).data)
+
+    @extend_schema(
+        summary="Restock products",
+        description=(
+            "Add units to the stock of several products in one statement. Products "
+            "whose stock wasn't tracked start counting from zero; sold-out products "
+            "become available again."
+        ),
+        request=ProductRestockSerializer,
+        responses={200: ProductSerializer(many=True)},
+    )
+    @action(detail=False, methods=['post'], url_path='restock')
+    def restock(self, request):
+        serializer = ProductRestockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantities = serializer.validated_data['items']
 
+        with transaction.atomic():
+            if Product.objects.restock(quantities) != len(quantities):
+                found = set(Product.objects.filter(pk__in=quantities).values_list('pk', flat=True))
+                missing = sorted(set(quantities) - found)
+                raise ValidationError({"items": [f"Unknown products: {', '.join(map(str, missing))}"]})
+            menu_cache.bump_on_commit()
+        products = self.get_queryset().filter(pk__in=quantities)
+        return Response(ProductSerializer(products, many=True).data, status=status.HTTP_200_OK)
 
+    @extend_schema(
+        summary="Reprice products",
+        description=(
+            "Change many prices in one transaction: either `percent` (e.g. 5 for +5%, "
+            "optionally limited to a `category` and/or `products`) or explicit `prices`. "
+            "Applied as one UPDATE plus one price history insert; returns the new prices "
+            "of the products that changed."
+        ),
+        request=ProductRepriceSerializer,
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=['post'], url_path='reprice')
+    def reprice(self, request):
+        serializer = ProductRepriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        products = Product.objects.all()
+        ids = data.get('products') or data.get('prices')
+        if ids:
+            missing = set(ids) - set(Product.objects.filter(pk__in=ids).values_list('pk', flat=True))
+            if missing:
+                raise ValidationError({
+                    "prices" if 'prices' in data else "products":
+                        [f"Unknown products: {', '.join(map(str, sorted(missing)))}"]
+                })
+            products = products.filter(pk__in=ids)
+        if 'category' in data:
+            products = products.filter(category=data['category'])
+
+        updated = products.reprice(percent=data.get('percent'), prices=data.get('prices'))
+        if updated:
+            menu_cache.bump_on_commit()
+        return Response(
+            {
+                "updated": len(updated),
+                "prices": [{"product": pk, "price": str(price)} for pk, price in sorted(updated.items())],
+            },
+            status=status.HTTP_200_OK
+        )
+
+    @extend_schema(
+        summary="Product price history",
+        description=(
+            "Prices of a product with the time each took effect, newest first. With "
+            "`?at=` only the price in effect at that time is returned."
+        ),
+        parameters=[OpenApiParameter('at', OpenApiTypes.DATETIME, OpenApiParameter.QUERY)],
+        responses={200: ProductPriceSerializer(many=True)},
+    )
+    @action(detail=True, methods=['get'], url_path='prices')
+    def prices(self, request, pk=None):
+        query = PriceHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        product = self.get_object()
+        if 'at' in query.validated_data:
+            entry = ProductPrice.objects.in_effect(product.pk, query.validated_data['at'])
+            if entry is None:
+                raise NotFound("No price at that time.")
+            return Response(ProductPriceSerializer(entry).data)
+        history = ProductPrice.objects.filter(product=product)
+        return Response(ProductPriceSerializer(history, many=True).data)
+
+    @extend_schema(
+        summary="Frequently bought together",
+        description=(
+            "Available products most often ordered together with this one, strongest first: "
+            "`confidence` is the share of this product's orders that contained the suggestion, "
+            "`lift` how much likelier that is than for an average order. Read from the table "
+            "`python manage.py build_recommendations` maintains; empty until it has run."
+        ),
+        parameters=[RecommendationQuerySerializer],
+        responses={200: ProductRecommendationSerializer(many=True)},
+    )
+    @action(detail=True, methods=['get'], url_path='recommendations')
+    def recommendations(self, request, pk=None):
+        query = RecommendationQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        index = get_product_index()
+        if not pk.isdigit() or int(pk) not in index:
+            raise NotFound()
+
+        suggestions = []
+        for recommendation in ProductRecommendation.objects.filter(product_id=int(pk)).order_by('rank'):
+            # Deleted products are missing from the index, unavailable ones flagged.
+            if index.is_available(recommendation.recommended_id):
+                recommendation.recommended = index.product(recommendation.recommended_id)
+                suggestions.append(recommendation)
+        limit = query.validated_data['limit']
+        return Response(ProductRecommendationSerializer(suggestions[:limit], many=True).data)
+
+    @extend_schema(
+        summary="Menu cache statistics",
+        description=(
+            "Hits, misses and 304 responses of the menu cache in this process since "
+            "start-up, and the current menu version."
+        ),
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(menu_cache.stats())
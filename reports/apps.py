@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class ReportsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'reports'
+
+    def ready(self):
+        from orders.signals import orders_created
+        from reports.rollups import update_rollups
+
+        orders_created.connect(update_rollups, dispatch_uid='reports-update-rollups')
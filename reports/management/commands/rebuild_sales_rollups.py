@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from reports.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly sales rollups (totals, per product, per category) from the order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help="Number of orders aggregated per transaction (default: 5000)."
+        )
+
+    def handle(self, *args, **options):
+        processed = rebuild_rollups(chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups from {processed} orders"))
@@ -0,0 +1,54 @@
+from django.db import models
+from products.models import Category, Product
+
+
+class SalesRollup(models.Model):
+    """Revenue, units sold and number of orders for one hour (UTC)."""
+    hour = models.DateTimeField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveBigIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class HourlySales(SalesRollup):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour'], name='unique_hourly_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} - {self.revenue}"
+
+
+class ProductHourlySales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='hourly_sales')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'hour'], name='unique_product_hourly_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='product_sales_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.hour:%Y-%m-%d %H:00} - {self.revenue}"
+
+
+class CategoryHourlySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='hourly_sales')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'hour'], name='unique_category_hourly_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='category_sales_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id} @ {self.hour:%Y-%m-%d %H:00} - {self.revenue}"
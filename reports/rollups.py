@@ -0,0 +1,124 @@
+from collections import defaultdict
+from datetime import timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import TruncHour
+
+from orders.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+from reports.models import CategoryHourlySales, HourlySales, ProductHourlySales
+from restaurant.db import upsert_increment
+
+COUNTERS = ['revenue', 'units', 'order_count']
+
+
+def hour_of(moment):
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def record_orders(orders, items):
+    """Add freshly created orders to the hourly, product and category rollups."""
+    hours = {order.id: hour_of(order.order_date) for order in orders}
+
+    hourly = defaultdict(lambda: [Decimal(0), 0, set()])
+    by_product = defaultdict(lambda: [Decimal(0), 0, set()])
+    by_category = defaultdict(lambda: [Decimal(0), 0, set()])
+
+    for order in orders:
+        totals = hourly[(hours[order.id],)]
+        totals[0] += order.total_amount
+        totals[2].add(order.id)
+
+    for item in items:
+        hour = hours[item.order_id]
+        revenue = item.price_at_order * item.quantity
+        hourly[(hour,)][1] += item.quantity
+        for totals in (by_product[(item.product_id, hour)],
+                       by_category[(item.product.category_id, hour)]):
+            totals[0] += revenue
+            totals[1] += item.quantity
+            totals[2].add(item.order_id)
+
+    _apply(HourlySales, ['hour'], hourly)
+    _apply(ProductHourlySales, ['product_id', 'hour'], by_product)
+    _apply(CategoryHourlySales, ['category_id', 'hour'], by_category)
+
+
+def _apply(model, key_fields, totals):
+    upsert_increment(model, key_fields, COUNTERS, {
+        key: (revenue, units, len(orders)) for key, (revenue, units, orders) in totals.items()
+    })
+
+
+def update_rollups(sender, orders, items, **kwargs):
+    # Runs inside the transaction that created the orders.
+    record_orders(orders, items)
+
+
+def rebuild_rollups(chunk_size=5000, stdout=None):
+    """
+    Recompute every rollup from the order history (live and archived orders),
+    ``chunk_size`` orders per transaction. Orders created while this runs are
+    counted by the live update path: the reset and the snapshot of the last
+    order id happen in the same transaction.
+    """
+    with transaction.atomic():
+        for model in (HourlySales, ProductHourlySales, CategoryHourlySales):
+            model.objects.all().delete()
+        last_archived_id = ArchivedOrder.objects.aggregate(last=Max('id'))['last'] or 0
+        last_id = Order.objects.aggregate(last=Max('id'))['last'] or 0
+
+    processed = _rebuild_from(ArchivedOrder, ArchivedOrderItem, last_archived_id, chunk_size, stdout, 0)
+    return _rebuild_from(Order, OrderItem, last_id, chunk_size, stdout, processed)
+
+
+def _rebuild_from(order_model, item_model, last_id, chunk_size, stdout, processed):
+    revenue = ExpressionWrapper(
+        F('price_at_order') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    low = 0
+    while low < last_id:
+        ids = list(
+            order_model.objects.filter(id__gt=low, id__lte=last_id)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        high = ids[-1]
+        orders = order_model.objects.filter(id__gt=low, id__lte=high)
+        items = item_model.objects.filter(order_id__gt=low, order_id__lte=high).annotate(
+            hour=TruncHour('order__order_date', tzinfo=timezone.utc)
+        )
+
+        hourly = {}
+        for row in orders.annotate(hour=TruncHour('order_date', tzinfo=timezone.utc)).values('hour').annotate(
+            revenue=Sum('total_amount'), order_count=Count('id')
+        ):
+            hourly[(row['hour'],)] = [row['revenue'], 0, row['order_count']]
+        for row in items.values('hour').annotate(units=Sum('quantity')):
+            hourly[(row['hour'],)][1] = row['units']
+
+        by_product = {
+            (row['product_id'], row['hour']): (row['revenue'], row['units'], row['order_count'])
+            for row in items.values('product_id', 'hour').annotate(
+                revenue=Sum(revenue), units=Sum('quantity'), order_count=Count('order_id', distinct=True)
+            )
+        }
+        by_category = {
+            (row['product__category_id'], row['hour']): (row['revenue'], row['units'], row['order_count'])
+            for row in items.values('product__category_id', 'hour').annotate(
+                revenue=Sum(revenue), units=Sum('quantity'), order_count=Count('order_id', distinct=True)
+            )
+        }
+
+        with transaction.atomic():
+            upsert_increment(HourlySales, ['hour'], COUNTERS, {k: tuple(v) for k, v in hourly.items()})
+            upsert_increment(ProductHourlySales, ['product_id', 'hour'], COUNTERS, by_product)
+            upsert_increment(CategoryHourlySales, ['category_id', 'hour'], COUNTERS, by_category)
+
+        processed += len(ids)
+        low = high
+        if stdout is not None:
+            stdout.write(f"{processed} orders rolled up")
+    return processed
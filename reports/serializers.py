@@ -0,0 +1,41 @@
+from datetime import datetime, time, timedelta, timezone
+
+from rest_framework import serializers
+
+
+class ReportRangeSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    by = serializers.ChoiceField(choices=['revenue', 'units', 'order_count'], default='revenue')
+
+    def validate(self, attrs):
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({"end": "End date must not be before start date."})
+        # Inclusive day range as a half-open UTC interval over the rollup hours.
+        attrs['since'] = datetime.combine(attrs['start'], time.min, tzinfo=timezone.utc)
+        attrs['until'] = datetime.combine(attrs['end'] + timedelta(days=1), time.min, tzinfo=timezone.utc)
+        return attrs
+
+
+class DailySalesSerializer(serializers.Serializer):
+    day = serializers.DateField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+    order_count = serializers.IntegerField()
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    product = serializers.IntegerField(source='product_id')
+    product_name = serializers.CharField(source='product__name')
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+    order_count = serializers.IntegerField()
+
+
+class CategorySalesSerializer(serializers.Serializer):
+    category = serializers.IntegerField(source='category_id')
+    category_name = serializers.CharField(source='category__name')
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+    order_count = serializers.IntegerField()
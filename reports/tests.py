@@ -0,0 +1,146 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from customers.models import Customer
+from orders.models import Order
+from products.models import Category, Product
+from reports.models import CategoryHourlySales, HourlySales, ProductHourlySales
+
+User = get_user_model()
+
+
+class SalesRollupTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager', password='manager123', role='manager')
+        cls.staff = User.objects.create_user(username='staff', password='staff123', role='staff')
+        cls.customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com",
+            phone="0999999999", address="Damascus"
+        )
+        cls.pizza = Category.objects.create(name="Pizza", description="Pizza category")
+        cls.drinks = Category.objects.create(name="Drinks", description="Cold drinks")
+        cls.margherita = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10, category=cls.pizza, preparation_time=15
+        )
+        cls.pepperoni = Product.objects.create(
+            name="Pepperoni", description="Pepperoni pizza", price=15, category=cls.pizza, preparation_time=20
+        )
+        cls.cola = Product.objects.create(
+            name="Cola", description="Cold cola", price=2, category=cls.drinks, preparation_time=1
+        )
+
+    def _place_orders(self):
+        self.client.force_authenticate(user=self.staff)
+        orders = [
+            {"customer": self.customer.id, "items": [
+                {"product": self.margherita.id, "quantity": 2},
+                {"product": self.cola.id, "quantity": 1},
+            ]},
+            {"customer": self.customer.id, "items": [
+                {"product": self.margherita.id, "quantity": 1},
+                {"product": self.pepperoni.id, "quantity": 1},
+            ]},
+        ]
+        response = self.client.post("/api/orders/batch/", {"orders": orders}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post("/api/orders/", orders[0], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def _snapshot(self):
+        return {
+            model.__name__: sorted(
+                model.objects.values_list(*keys, 'revenue', 'units', 'order_count')
+            )
+            for model, keys in (
+                (HourlySales, ['hour']),
+                (ProductHourlySales, ['product_id', 'hour']),
+                (CategoryHourlySales, ['category_id', 'hour']),
+            )
+        }
+
+    def test_order_creation_updates_rollups(self):
+        self._place_orders()
+
+        hourly = HourlySales.objects.get()
+        self.assertEqual(hourly.revenue, Decimal('69.00'))
+        self.assertEqual(hourly.units, 8)
+        self.assertEqual(hourly.order_count, 3)
+
+        margherita = ProductHourlySales.objects.get(product=self.margherita)
+        self.assertEqual(margherita.revenue, Decimal('50.00'))
+        self.assertEqual(margherita.units, 5)
+        self.assertEqual(margherita.order_count, 3)
+
+        pizza = CategoryHourlySales.objects.get(category=self.pizza)
+        self.assertEqual(pizza.revenue, Decimal('65.00'))
+        self.assertEqual(pizza.order_count, 3)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self._place_orders()
+        incremental = self._snapshot()
+
+        HourlySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(self._snapshot(), incremental)
+
+    def test_rebuild_includes_archived_orders(self):
+        self._place_orders()
+        Order.objects.update(status='Delivered', order_date=timezone.now() - timedelta(days=60))
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        before = self._snapshot()
+
+        call_command('archive_orders', older_than_days=30, stdout=StringIO())
+        self.assertFalse(Order.objects.exists())
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+        self.assertEqual(self._snapshot(), before)
+
+    def test_reports_read_rollups_only(self):
+        self._place_orders()
+        self.client.force_authenticate(user=self.manager)
+        today = timezone.now().date()
+        params = f"start={today - timedelta(days=1)}&end={today}"
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/reports/daily/?{params}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {"day": str(today), "revenue": "69.00", "units": 8, "order_count": 3}
+        ])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/reports/top-sellers/?{params}&limit=2")
+        self.assertEqual(
+            [row['product_name'] for row in response.data], ["Margherita", "Pepperoni"]
+        )
+
+        response = self.client.get(f"/api/reports/top-sellers/?{params}&by=units&limit=1")
+        self.assertEqual(response.data[0]['units'], 5)
+
+        response = self.client.get(f"/api/reports/categories/?{params}")
+        self.assertEqual(
+            [(row['category_name'], row['revenue']) for row in response.data],
+            [("Pizza", "65.00"), ("Drinks", "4.00")]
+        )
+
+    def test_report_range_validation(self):
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get("/api/reports/daily/?start=2026-02-01&end=2026-01-01")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/reports/daily/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_cannot_read_reports(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get("/api/reports/daily/?start=2026-01-01&end=2026-01-02")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,85 @@
+from datetime import timezone
+
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from drf_spectacular.utils import extend_schema
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from reports.models import CategoryHourlySales, HourlySales, ProductHourlySales
+from reports.serializers import (
+    CategorySalesSerializer, DailySalesSerializer, ProductSalesSerializer, ReportRangeSerializer,
+)
+from users.permissions import IsAdminOrManager
+
+TOTALS = {'revenue': Sum('revenue'), 'units': Sum('units'), 'order_count': Sum('order_count')}
+
+
+class ReportViewSet(viewsets.ViewSet):
+    """
+    Sales reports. Every endpoint reads only the hourly rollup tables, so the
+    cost depends on the number of hours in the range, not on order volume.
+    Dates are UTC days; ``start`` and ``end`` are inclusive.
+    """
+    permission_classes = [IsAdminOrManager]
+
+    def _range(self, request):
+        serializer = ReportRangeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @extend_schema(
+        summary="Daily sales totals",
+        description="Revenue, units and orders per day between `start` and `end`.",
+        parameters=[ReportRangeSerializer],
+        responses={200: DailySalesSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        params = self._range(request)
+        rows = (
+            HourlySales.objects
+            .filter(hour__gte=params['since'], hour__lt=params['until'])
+            .annotate(day=TruncDate('hour', tzinfo=timezone.utc))
+            .values('day')
+            .annotate(**TOTALS)
+            .order_by('day')
+        )
+        return Response(DailySalesSerializer(rows, many=True).data)
+
+    @extend_schema(
+        summary="Top selling products",
+        description="Best selling products between `start` and `end`, ranked by `by`.",
+        parameters=[ReportRangeSerializer],
+        responses={200: ProductSalesSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'], url_path='top-sellers')
+    def top_sellers(self, request):
+        params = self._range(request)
+        rows = (
+            ProductHourlySales.objects
+            .filter(hour__gte=params['since'], hour__lt=params['until'])
+            .values('product_id', 'product__name')
+            .annotate(**TOTALS)
+            .order_by(f"-{params['by']}", 'product_id')[:params['limit']]
+        )
+        return Response(ProductSalesSerializer(rows, many=True).data)
+
+    @extend_schema(
+        summary="Sales per category",
+        description="Category totals between `start` and `end`, ranked by `by`.",
+        parameters=[ReportRangeSerializer],
+        responses={200: CategorySalesSerializer(many=True)},
+    )
+    @action(detail=False, methods=['get'])
+    def categories(self, request):
+        params = self._range(request)
+        rows = (
+            CategoryHourlySales.objects
+            .filter(hour__gte=params['since'], hour__lt=params['until'])
+            .values('category_id', 'category__name')
+            .annotate(**TOTALS)
+            .order_by(f"-{params['by']}", 'category_id')[:params['limit']]
+        )
+        return Response(CategorySalesSerializer(rows, many=True).data)
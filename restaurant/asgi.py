@@ -3,6 +3,11 @@ ASGI config for restaurant project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this module (e.g. ``uvicorn restaurant.asgi:application``)
+to use the live order stream at ``/api/orders/stream/``: its listeners are
+coroutines, so thousands of idle kitchen screens don't each hold a worker
+thread as they would under WSGI.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
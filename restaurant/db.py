@@ -0,0 +1,98 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.db import connection, connections
+
+
+def supports_update_returning():
+    """Whether the database accepts ``UPDATE ... RETURNING`` (SQLite 3.35+, PostgreSQL)."""
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite' and connection.features.can_return_rows_from_bulk_insert
+    )
+
+
+def upsert_increment(model, key_fields, counter_fields, totals, latest_fields=()):
+    """
+    Add counters onto rows identified by a unique key, inserting missing rows.
+
+    ``totals`` maps a key tuple (values for ``key_fields``) to a tuple of
+    values for ``counter_fields``, already summed per key, followed by values
+    for ``latest_fields``, which keep the greater of the stored and new value
+    (e.g. a last-seen timestamp). Each batch becomes one statement::
+
+        INSERT INTO t (k, c) VALUES (%s, %s), (%s, %s)
+        ON CONFLICT (k) DO UPDATE SET c = t.c + excluded.c
+
+    ``key_fields`` must match a unique constraint of ``model``. Foreign keys
+    are given by attname (``product_id``). Supported on SQLite and PostgreSQL.
+    """
+    if not totals:
+        return
+
+    opts = model._meta
+    quote = connection.ops.quote_name
+    keys = [opts.get_field(name) for name in key_fields]
+    counters = [opts.get_field(name) for name in counter_fields]
+    latest = [opts.get_field(name) for name in latest_fields]
+    fields = keys + counters + latest
+    table = quote(opts.db_table)
+    columns = ', '.join(quote(field.column) for field in fields)
+    conflict = ', '.join(quote(field.column) for field in keys)
+    updates = ', '.join(
+        [
+            f"{quote(field.column)} = {table}.{quote(field.column)} + excluded.{quote(field.column)}"
+            for field in counters
+        ] + [
+            f"{quote(field.column)} = CASE WHEN {table}.{quote(field.column)} IS NULL "
+            f"OR excluded.{quote(field.column)} > {table}.{quote(field.column)} "
+            f"THEN excluded.{quote(field.column)} ELSE {table}.{quote(field.column)} END"
+            for field in latest
+        ]
+    )
+    row_sql = f"({', '.join(['%s'] * len(fields))})"
+
+    rows = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, key + values)]
+        for key, values in totals.items()
+    ]
+    max_params = connection.features.max_query_params or len(rows) * len(fields)
+    batch_size = max(1, max_params // len(fields))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {', '.join([row_sql] * len(batch))} "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}",
+                [value for row in batch for value in row]
+            )
+
+
+@contextmanager
+def scratch_database():
+    """
+    Point the default database at a fresh, migrated SQLite file for the
+    duration of the block (benchmarks), then delete it. Threads opened inside
+    the block connect to the scratch file too.
+    """
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    settings_dict = connections.settings['default']
+    original = settings_dict['ENGINE'], settings_dict['NAME']
+    _reset_default_connection()
+    settings_dict['ENGINE'], settings_dict['NAME'] = 'django.db.backends.sqlite3', path
+    try:
+        call_command('migrate', verbosity=0)
+        yield path
+    finally:
+        _reset_default_connection()
+        settings_dict['ENGINE'], settings_dict['NAME'] = original
+        os.remove(path)
+
+
+def _reset_default_connection():
+    # Drop this thread's wrapper so the next query connects with the current settings.
+    connections['default'].close()
+    del connections['default']
@@ -0,0 +1,165 @@
+from django.core.exceptions import FieldDoesNotExist
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+fieldset_parameters = [
+    OpenApiParameter(
+        FIELDS_PARAM, OpenApiTypes.STR, OpenApiParameter.QUERY,
+        description="Comma-separated fields to return, e.g. `id,name,price`. Related objects "
+                    "are returned as ids unless also listed in `expand`.",
+    ),
+    OpenApiParameter(
+        EXPAND_PARAM, OpenApiTypes.STR, OpenApiParameter.QUERY,
+        description="Comma-separated related fields to return as nested objects.",
+    ),
+]
+
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin for ``?fields=`` / ``?expand=`` (read through the
+    ``fieldset`` context entry that ``SparseFieldsetMixin`` views set on GET).
+
+    ``Meta.expandable_fields`` maps relation fields to the serializer used
+    when they are expanded. Without ``fields`` the representation is the
+    default one, plus any ``expand``-ed relations. With ``fields``, only those
+    fields are returned and expandable relations are plain ids unless
+    expanded. Nested serializers are never pruned.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None or not self._is_root():
+            return fields
+
+        requested, expand = fieldset
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        if requested is not None:
+            for name in list(fields):
+                if name not in requested:
+                    del fields[name]
+        for name, expanded_class in expandable.items():
+            if name not in fields:
+                continue
+            source = fields[name].source
+            kwargs = {'source': source} if source and source != name else {}
+            if name in expand:
+                fields[name] = expanded_class(read_only=True, **kwargs)
+            elif requested is not None:
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **kwargs)
+        return fields
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin that applies ``?fields=`` / ``?expand=`` to GET requests.
+
+    The serializer (a ``SparseFieldsMixin``) drops unrequested fields, and the
+    queryset is narrowed to match: ``only()`` the columns the remaining fields
+    read, ``select_related`` just the expanded foreign keys, and only the
+    prefetches in ``sparse_prefetches`` (serializer field name -> Prefetch)
+    whose field is still returned. ``expand_permissions`` (field name ->
+    permission classes) keeps users who can't read a related resource from
+    expanding it; they get 403.
+    """
+    sparse_prefetches = {}
+    expand_permissions = {}
+
+    def get_fieldset(self):
+        """Return ``(fields or None, expand)`` for this request, or None."""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = self._parse_fieldset()
+        return self._fieldset
+
+    def _parse_fieldset(self):
+        if self.request is None or self.request.method != 'GET':
+            return None
+        params = self.request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return None
+        requested = _split(params[FIELDS_PARAM]) if FIELDS_PARAM in params else None
+        expand = _split(params.get(EXPAND_PARAM, ''))
+
+        serializer_class = self.get_serializer_class()
+        readable = {
+            name for name, field in serializer_class().fields.items() if not field.write_only
+        }
+        expandable = set(getattr(serializer_class.Meta, 'expandable_fields', {}))
+        errors = {}
+        if requested is not None and (not requested or requested - readable):
+            errors[FIELDS_PARAM] = [f"Choose from: {', '.join(sorted(readable))}"]
+        if expand - expandable:
+            errors[EXPAND_PARAM] = [
+                f"Choose from: {', '.join(sorted(expandable))}" if expandable else "Nothing to expand here."
+            ]
+        if errors:
+            raise ValidationError(errors)
+        for name in expand:
+            for permission_class in self.expand_permissions.get(name, ()):
+                if not permission_class().has_permission(self.request, self):
+                    raise PermissionDenied(f"You do not have permission to expand {name}.")
+        return requested, expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            context['fieldset'] = fieldset
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.get_fieldset() is None:
+            return queryset
+        return self.narrow_queryset(queryset, self.get_serializer().fields)
+
+    def narrow_queryset(self, queryset, fields):
+        opts = queryset.model._meta
+        columns = {opts.pk.name}
+        columns.update(field.lstrip('-') for field in getattr(self, 'keyset_ordering', ()))
+        related = []
+        prefetches = []
+        whole_rows = False
+
+        for name, field in fields.items():
+            if field.write_only:
+                continue
+            if name in self.sparse_prefetches:
+                prefetches.append(self.sparse_prefetches[name])
+                continue
+            root = field.source.split('.')[0]
+            try:
+                model_field = opts.get_field(root)
+            except FieldDoesNotExist:
+                # Method fields and properties may read anything.
+                whole_rows = True
+                continue
+            if model_field.concrete:
+                columns.add(root)
+                if model_field.is_relation and ('.' in field.source or isinstance(field, serializers.BaseSerializer)):
+                    related.append(root)
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if not whole_rows:
+            queryset = queryset.only(*columns)
+        return queryset
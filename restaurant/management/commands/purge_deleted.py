@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from customers.models import Customer
+from products.models import Category, Product
+from restaurant.softdelete import purge_deleted
+
+# Products before categories: a category is kept while any of its products exist.
+MODELS = [Product, Category, Customer]
+
+
+class Command(BaseCommand):
+    help = (
+        "Permanently remove products, categories and customers soft-deleted long ago. "
+        "Rows still referenced by orders are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.SOFT_DELETE_PURGE_AFTER_DAYS,
+            help="Purge rows deleted more than this many days ago "
+                 "(default: SOFT_DELETE_PURGE_AFTER_DAYS)."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Rows removed per transaction (default: 1000)."
+        )
+
+    def handle(self, *args, **options):
+        for model in MODELS:
+            purged = purge_deleted(
+                model, options['older_than_days'], batch_size=options['batch_size'], stdout=self.stdout
+            )
+            self.stdout.write(self.style.SUCCESS(f"Purged {purged} {model._meta.verbose_name_plural}"))
@@ -0,0 +1,103 @@
+import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
+
+
+class ModelValidationMixin:
+    """
+    ModelSerializer mixin that runs the model's ``full_clean()`` exactly once.
+
+    ``validate()`` applies the validated data to a copy of the instance (or a
+    new one) and cleans it, so ``clean()``, field validators and uniqueness
+    checks run against the row that will actually be saved, primary key
+    included. ``create()``/``update()`` then save that same object with
+    ``save(validate=False)`` instead of letting the model clean it again.
+
+    Uniqueness is left to ``full_clean()``: DRF's generated ``UniqueValidator``
+    and ``UniqueTogetherValidator`` are dropped so the same query isn't run
+    twice, and related fields the serializer already resolved to an object
+    are not looked up again.
+
+    ``Meta.constraints`` are not probed at all: the database enforces them on
+    write, and an ``IntegrityError`` naming one of them is turned back into a
+    field error (the first field the constraint covers) carrying the
+    constraint's ``violation_error_message``. Any other ``IntegrityError``
+    (e.g. a write racing the uniqueness check) is a 400 as well.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for field in fields.values():
+            field.validators = [v for v in field.validators if not isinstance(v, UniqueValidator)]
+        return fields
+
+    def get_validators(self):
+        return [v for v in super().get_validators() if not isinstance(v, UniqueTogetherValidator)]
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        model = self.Meta.model
+        candidate = copy.copy(self.instance) if self.instance is not None else model()
+        for name, value in attrs.items():
+            setattr(candidate, name, value)
+
+        resolved = [
+            field.name for field in model._meta.concrete_fields
+            if field.is_relation and field.name in attrs
+        ]
+        try:
+            candidate.full_clean(exclude=resolved, validate_constraints=False)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+        self._cleaned_instance = candidate
+        return attrs
+
+    def create(self, validated_data):
+        return self._save_cleaned(validated_data)
+
+    def update(self, instance, validated_data):
+        return self._save_cleaned(validated_data)
+
+    def _save_cleaned(self, validated_data):
+        instance = self._cleaned_instance
+        # Values passed to serializer.save(**kwargs) are set as-is, like DRF does.
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        try:
+            if connection.in_atomic_block:
+                # Savepoint, so a violation doesn't break the enclosing transaction.
+                with transaction.atomic():
+                    instance.save(validate=False)
+            else:
+                instance.save(validate=False)
+        except IntegrityError as exc:
+            raise serializers.ValidationError(_integrity_error(instance, exc))
+        return instance
+
+
+def _integrity_error(instance, exc):
+    message = str(exc)
+    opts = instance._meta
+    for constraint in opts.constraints:
+        if constraint.name in message:
+            return {_constraint_field(constraint): [constraint.get_violation_error_message()]}
+    for field in opts.concrete_fields:
+        # SQLite names "table.column", PostgreSQL "Key (column)=...".
+        if field.unique and not field.primary_key and (
+            f'{opts.db_table}.{field.column}' in message or f'({field.column})' in message
+        ):
+            return {field.name: instance.unique_error_message(type(instance), [field.name]).messages}
+    return {api_settings.NON_FIELD_ERRORS_KEY: ["Conflicts with an existing record."]}
+
+
+def _constraint_field(constraint):
+    fields = list(getattr(constraint, 'fields', ()))
+    for expression in getattr(constraint, 'expressions', ()):
+        nodes = [expression] if isinstance(expression, F) else expression.flatten()
+        fields.extend(node.name for node in nodes if isinstance(node, F))
+    return fields[0] if fields else api_settings.NON_FIELD_ERRORS_KEY
@@ -43,6 +43,9 @@ INSTALLED_APPS = [
     'customers',
     'orders',
     'users',
+    'reports',
+    # Cross-app maintenance commands (purge_deleted)
+    'restaurant',
     'django_filters',
     'drf_spectacular',
     'drf_spectacular_sidecar',
@@ -142,6 +145,70 @@ REST_FRAMEWORK = {
 
 }
 
+# Upper bound on the number of orders accepted by POST /api/orders/batch/
+ORDER_BATCH_MAX_SIZE = 500
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'restaurant',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Menu version (products/cache.py). Every worker process must see the
+    # same one, so this can't be LocMemCache; FileBasedCache covers
+    # workers on one host, use Redis or Memcached across hosts.
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'versions',
+    },
+}
+
+# GET /api/customers/search/ (typeahead): default and maximum number of results
+CUSTOMER_TYPEAHEAD_LIMIT = 10
+CUSTOMER_TYPEAHEAD_MAX_LIMIT = 50
+
+# POST /api/customers/import/: rows per request and rows per upsert transaction
+CUSTOMER_IMPORT_MAX_ROWS = 10000
+CUSTOMER_IMPORT_BATCH_SIZE = 1000
+
+# Serialized category/product responses; invalidated on every menu write
+MENU_CACHE_TIMEOUT = 24 * 60 * 60
+
+# GET /api/products/stock/: product ids per request
+PRODUCT_STOCK_MAX_IDS = 100
+
+# Order intake: 'direct' commits each POST /api/orders/ in its own transaction,
+# 'group_commit' hands validated orders to one writer thread that commits them
+# in groups (see orders/writer.py)
+ORDER_INTAKE_MODE = 'direct'
+ORDER_GROUP_COMMIT_MAX_BATCH = 100     # orders per transaction at most
+ORDER_GROUP_COMMIT_MAX_WAIT = 0.005    # seconds the writer waits to fill a group
+ORDER_GROUP_COMMIT_TIMEOUT = 30        # seconds a request waits for its group to commit
+
+# Idempotency-Key support on order writes (per process)
+IDEMPOTENCY_MAX_ENTRIES = 10000   # responses kept before least recently used keys are evicted
+IDEMPOTENCY_TTL = 24 * 60 * 60    # seconds a stored response can be replayed
+IDEMPOTENCY_WAIT_TIMEOUT = 30     # seconds a duplicate waits for the first request to finish
+
+# Delivered orders older than this are moved to the archive tables by
+# `python manage.py archive_orders`
+ORDER_ARCHIVE_AFTER_DAYS = 30
+
+# Soft-deleted products, categories and customers older than this are removed
+# by `python manage.py purge_deleted` (unless orders still reference them)
+SOFT_DELETE_PURGE_AFTER_DAYS = 90
+
+# Frequently-bought-together suggestions, built by `python manage.py build_recommendations`
+PRODUCT_RECOMMENDATIONS_TOP_K = 10        # neighbours stored per product
+PRODUCT_RECOMMENDATIONS_MIN_ORDERS = 3    # orders a pair must appear in to be suggested
+PRODUCT_RECOMMENDATIONS_LIMIT = 5         # default results of GET /api/products/{id}/recommendations/
+
+# Server-sent order events (GET /api/orders/stream/, ASGI only)
+ORDER_EVENTS_QUEUE_SIZE = 100     # buffered frames per listener before it is dropped
+ORDER_EVENTS_HEARTBEAT = 15       # seconds between keep-alive comments
+ORDER_EVENTS_RETRY_MS = 3000      # reconnect delay suggested to EventSource clients
+ORDER_EVENTS_TOKEN_TTL = 5 * 60   # seconds a ?token= from POST /api/orders/stream-token/ can open a stream
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -0,0 +1,102 @@
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+# Sent with ``sender=<model>`` after rows were soft-deleted in bulk; post_delete
+# isn't, since nothing is actually deleted.
+soft_deleted = Signal()
+
+LIVE = Q(deleted_at__isnull=True)
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+
+    def delete(self, when=None):
+        """
+        Mark the rows deleted with one UPDATE instead of deleting them, so
+        rows referencing them (order history) stay intact. Returns the same
+        ``(count, {label: count})`` shape as ``QuerySet.delete()``.
+        """
+        # Querysets of this class come from LiveManager, so dead rows are already excluded.
+        count = self.update(deleted_at=when or timezone.now())
+        if count:
+            soft_deleted.send(sender=self.model)
+        return count, {self.model._meta.label: count}
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class LiveManager(models.Manager):
+    """Default manager of soft-deletable models: deleted rows are hidden."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(LIVE)
+
+
+class SoftDeleteModel(models.Model):
+    """
+    Abstract base for rows that are soft-deleted: ``delete()`` sets
+    ``deleted_at``, ``objects`` (and reverse relations) only see live rows,
+    and ``all_objects`` sees everything. Foreign keys pointing at a deleted
+    row still resolve, because Django follows them with the base manager.
+    Dead rows are removed for good by ``purge_deleted()``.
+    """
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager.from_queryset(SoftDeleteQuerySet)()
+    all_objects = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, using=None, keep_parents=False):
+        now = timezone.now()
+        result = type(self).objects.filter(pk=self.pk).delete(when=now)
+        self.deleted_at = now
+        return result
+
+
+def live_index(*expressions, name, fields=(), condition=None):
+    """Partial index over live rows only, so it doesn't grow with dead ones."""
+    return models.Index(
+        *expressions, fields=fields, name=name, condition=LIVE & condition if condition else LIVE
+    )
+
+
+def dead_index(name):
+    """Partial index that lets ``purge_deleted()`` find dead rows without a scan."""
+    return models.Index(fields=['deleted_at'], name=name, condition=Q(deleted_at__isnull=False))
+
+
+def purge_deleted(model, older_than_days, batch_size=1000, max_batches=None, stdout=None):
+    """
+    Hard-delete rows of ``model`` soft-deleted more than ``older_than_days``
+    ago, ``batch_size`` rows per transaction. Rows still referenced through a
+    PROTECT foreign key (a product with order history) are kept. Returns the
+    number of rows removed.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    dead = model.all_objects.filter(deleted_at__lt=cutoff)
+    for relation in model._meta.related_objects:
+        if relation.on_delete is models.PROTECT:
+            referencing = relation.related_model._base_manager.filter(**{relation.field.name: OuterRef('pk')})
+            dead = dead.exclude(Exists(referencing))
+
+    purged = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            ids = list(dead.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            model.all_objects.filter(pk__in=ids).delete()
+
+        purged += len(ids)
+        batches += 1
+        if stdout is not None:
+            stdout.write(f"{purged} {model._meta.verbose_name_plural} purged")
+    return purged
@@ -0,0 +1,33 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Test case mixin that enforces the per-action query budgets viewsets declare.
+
+    A viewset lists the maximum number of queries each action may run::
+
+        class OrderViewSet(viewsets.ModelViewSet):
+            query_budget = {'list': 3, 'retrieve': 2}
+
+    and its tests call ``assertWithinQueryBudget(OrderViewSet, 'list', url)``
+    after seeding enough rows (several pages, several nested items) that an
+    N+1 regression would blow the budget. Budgets exclude authentication, so
+    requests should be made with ``force_authenticate`` or anonymously.
+    """
+
+    def assertWithinQueryBudget(self, viewset, action, url, method='get', **kwargs):
+        budget = getattr(viewset, 'query_budget', {}).get(action)
+        if budget is None:
+            self.fail(f"{viewset.__name__} declares no query budget for '{action}'")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+
+        executed = "\n".join(query['sql'] for query in queries.captured_queries)
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{viewset.__name__}.{action} ran {len(queries)} queries, budget is {budget}:\n{executed}"
+        )
+        return response
@@ -0,0 +1,48 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from customers.models import Customer
+from orders.models import OrderItem
+from orders.services import create_orders
+from products.models import Category, Product
+
+
+class PurgeDeletedTest(TestCase):
+
+    def test_purge_keeps_rows_with_order_history(self):
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        ordered = Product.objects.create(
+            name="Margherita", description="Cheese pizza", price=10, category=category, preparation_time=15
+        )
+        unordered = Product.objects.create(
+            name="Calzone", description="Folded pizza", price=11, category=category, preparation_time=15
+        )
+        empty = Category.objects.create(name="Soups", description="Soups")
+        customer = Customer.objects.create(
+            first_name="Sara", last_name="Ali", email="sara@test.com", phone="0999999999", address="Damascus"
+        )
+        create_orders([{"customer": customer, "items": [{"product": ordered, "quantity": 1}]}])
+        Customer.objects.create(
+            first_name="Omar", last_name="Kassem", email="omar@test.com", phone="0988888888", address="Homs"
+        ).delete()
+        category.delete()
+        empty.delete()
+        customer.delete()
+
+        out = StringIO()
+        call_command('purge_deleted', '--older-than-days=0', '--batch-size=1', stdout=out)
+
+        self.assertIn("Purged 1 products", out.getvalue())
+        self.assertEqual(list(Product.all_objects.values_list('pk', flat=True)), [ordered.pk])
+        self.assertFalse(Product.all_objects.filter(pk=unordered.pk).exists())
+        self.assertEqual(list(Category.all_objects.values_list('pk', flat=True)), [category.pk])
+        self.assertEqual(list(Customer.all_objects.values_list('pk', flat=True)), [customer.pk])
+        self.assertEqual(OrderItem.objects.get().product_id, ordered.pk)
+
+    def test_recently_deleted_rows_are_kept(self):
+        category = Category.objects.create(name="Pizza", description="Pizza category")
+        category.delete()
+        call_command('purge_deleted', stdout=StringIO())
+        self.assertTrue(Category.all_objects.filter(pk=category.pk).exists())
@@ -16,6 +16,7 @@ urlpatterns = [
     path('api/orders/', include('orders.urls')),
     path('api/customers/', include('customers.urls')),
     path('api/users/', include('users.urls')),
+    path('api/reports/', include('reports.urls')),
 
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),